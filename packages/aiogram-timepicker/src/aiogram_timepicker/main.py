@@ -1,5 +1,6 @@
 import datetime
-from typing import Annotated
+from functools import lru_cache
+from typing import Annotated, Self
 
 import pytz
 from aiogram import F
@@ -10,14 +11,37 @@ from pydantic import BaseModel, Field
 
 Hour = Annotated[int, Field(ge=0, le=23)]
 Minute = Annotated[int, Field(ge=0, le=59)]
+# a step in minutes of an extra row of buttons, less than a day
+Step = Annotated[int, Field(gt=0, lt=24 * 60)]
 
+# a picker has 24 * 60 states, each with the rows of a keyboard and two
+# callback strings (with and without ok) parsed when a button is pressed
+KEYBOARD_CACHE_SIZE = 4096
+UNPACK_CACHE_SIZE = 8192
 
-class TimeQuery(CallbackData, prefix="time"):
+# a row of buttons of a keyboard, the text and the callback data of each
+type Row = tuple[tuple[str, str], ...]
+
+
+class TimeQuery(CallbackData, prefix="time", frozen=True):
     name: str
     hour: Hour
     minute: Minute
     ok: bool = Field(default=False)
 
+    @classmethod
+    def unpack(cls, value: str) -> Self:
+        """parse the callback data string, the queries are cached and shared
+        between the callbacks with the same data
+
+        Args:
+            value (str): callback data from telegram
+
+        Returns:
+            Self: parsed time query
+        """
+        return _unpack(cls, value)
+
     def get_datetime_today_utc(self, timezone: str = "UTC") -> datetime.datetime:
         """get the datetime from the selected hour and minute converted
         from the sepcified timezone into UTC
@@ -40,12 +64,16 @@ class TimeQuery(CallbackData, prefix="time"):
 class TimePicker(BaseModel, frozen=True):
     """
     This is a timepicker generator class with a local (timezone specific) hour
-    and minute
+    and minute. Besides the hour and minute arrows it can have a row of buttons
+    moving the time back and forth by each of the `steps` (in minutes) and a row
+    of `presets` times to jump to
     """
 
     name: str
     hour: Hour
     minute: Minute
+    steps: tuple[Step, ...] = ()
+    presets: tuple[datetime.time, ...] = ()
 
     def _no_action(self) -> TimeQuery:
         return TimeQuery(name=self.name, hour=self.hour, minute=self.minute)
@@ -78,47 +106,76 @@ class TimePicker(BaseModel, frozen=True):
             minute=self.minute - 1 if self.minute > 0 else 59,
         )
 
+    def _shift(self, minutes: int) -> TimeQuery:
+        total = (self.hour * 60 + self.minute + minutes) % (24 * 60)
+        return TimeQuery(name=self.name, hour=total // 60, minute=total % 60)
+
+    def _preset(self, time: datetime.time) -> TimeQuery:
+        return TimeQuery(name=self.name, hour=time.hour, minute=time.minute)
+
     def get_keyboard(self) -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text="↑", callback_data=self._increase_hour().pack()
-                    ),
-                    InlineKeyboardButton(
-                        text="↑", callback_data=self._increase_minute().pack()
-                    ),
-                ],
-                [
-                    InlineKeyboardButton(
-                        text=str(self.hour), callback_data=self._no_action().pack()
-                    ),
-                    InlineKeyboardButton(
-                        text=str(self.minute), callback_data=self._no_action().pack()
-                    ),
-                ],
-                [
-                    InlineKeyboardButton(
-                        text="↓", callback_data=self._decrease_hour().pack()
-                    ),
-                    InlineKeyboardButton(
-                        text="↓", callback_data=self._decrease_minute().pack()
-                    ),
-                ],
-                [
-                    InlineKeyboardButton(
-                        text="Ok",
-                        callback_data=TimeQuery(
-                            name=self.name, hour=self.hour, minute=self.minute, ok=True
-                        ).pack(),
-                    )
-                ],
-            ]
+        """get the keyboard of the picker. The buttons are cached and shared
+        between the pickers with the same fields as immutable rows, every call
+        gets its own keyboard built from them
+
+        Returns:
+            InlineKeyboardMarkup: keyboard with the time and the arrow buttons
+        """
+        return _markup(
+            _rows(self.name, self.hour, self.minute, self.steps, self.presets)
+        )
+
+    def _build_keyboard(self) -> InlineKeyboardMarkup:
+        return _markup(self._build_rows())
+
+    def _build_rows(self) -> tuple[Row, ...]:
+        step_rows = tuple(
+            (
+                (f"-{_format_step(step)}", self._shift(-step).pack()),
+                (f"+{_format_step(step)}", self._shift(step).pack()),
+            )
+            for step in self.steps
+        )
+        preset_rows = (
+            (
+                tuple(
+                    (preset.strftime("%H:%M"), self._preset(preset).pack())
+                    for preset in self.presets
+                ),
+            )
+            if self.presets
+            else ()
+        )
+        return (
+            (
+                ("↑", self._increase_hour().pack()),
+                ("↑", self._increase_minute().pack()),
+            ),
+            (
+                (str(self.hour), self._no_action().pack()),
+                (str(self.minute), self._no_action().pack()),
+            ),
+            (
+                ("↓", self._decrease_hour().pack()),
+                ("↓", self._decrease_minute().pack()),
+            ),
+            *step_rows,
+            *preset_rows,
+            (
+                (
+                    "Ok",
+                    TimeQuery(
+                        name=self.name, hour=self.hour, minute=self.minute, ok=True
+                    ).pack(),
+                ),
+            ),
         )
 
 
 class TimePickerBuilder(BaseModel):
     name: str
+    steps: tuple[Step, ...] = ()
+    presets: tuple[datetime.time, ...] = ()
 
     def filter(self, rule: MagicFilter | None = None) -> CallbackQueryFilter:
         final_rule: MagicFilter = F.name == self.name
@@ -138,9 +195,72 @@ class TimePickerBuilder(BaseModel):
         Returns:
             TimePicker: TimePicker with the hour and minute from the timestamp
         """
-        return TimePicker(name=self.name, hour=timestamp.hour, minute=timestamp.minute)
+        return TimePicker(
+            name=self.name,
+            hour=timestamp.hour,
+            minute=timestamp.minute,
+            steps=self.steps,
+            presets=self.presets,
+        )
 
     def build_from_callback(self, callback_data: TimeQuery) -> TimePicker:
-        return TimePicker(
-            name=self.name, hour=callback_data.hour, minute=callback_data.minute
+        # the hour and minute of the callback data are already validated
+        return TimePicker.model_construct(
+            name=self.name,
+            hour=callback_data.hour,
+            minute=callback_data.minute,
+            steps=self.steps,
+            presets=self.presets,
         )
+
+
+def _format_step(minutes: int) -> str:
+    if minutes % 60 == 0:
+        return f"{minutes // 60}h"
+    if minutes > 60:
+        return f"{minutes // 60}h{minutes % 60}m"
+    return f"{minutes}m"
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _rows(
+    name: str,
+    hour: int,
+    minute: int,
+    steps: tuple[int, ...],
+    presets: tuple[datetime.time, ...],
+) -> tuple[Row, ...]:
+    picker = TimePicker.model_construct(
+        name=name, hour=hour, minute=minute, steps=steps, presets=presets
+    )
+    return picker._build_rows()
+
+
+def _markup(rows: tuple[Row, ...]) -> InlineKeyboardMarkup:
+    # aiogram models are mutable, a shared keyboard changed by one handler
+    # would change it for every user
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=text, callback_data=data) for text, data in row]
+            for row in rows
+        ]
+    )
+
+
+@lru_cache(maxsize=UNPACK_CACHE_SIZE)
+def _unpack[T: TimeQuery](cls: type[T], value: str) -> T:
+    prefix, *parts = value.split(cls.__separator__)
+    if prefix == cls.__prefix__ and len(parts) == 4:
+        name, hour, minute, ok = parts
+        # the canonical form written by `pack` skips the validation
+        if (
+            hour.isdecimal()
+            and minute.isdecimal()
+            and int(hour) <= 23
+            and int(minute) <= 59
+            and ok in ("0", "1")
+        ):
+            return cls.model_construct(
+                name=name, hour=int(hour), minute=int(minute), ok=ok == "1"
+            )
+    return super(TimeQuery, cls).unpack(value)
@@ -0,0 +1,73 @@
+"""Keyboards and callback parses per second of the time picker.
+
+Compares the cached `TimePicker.get_keyboard` and `TimeQuery.unpack` with
+building every keyboard and validating every callback data again, over the
+presses of random arrow buttons.
+
+Run with `python tests/bench_keyboard.py` from the package directory.
+"""
+
+import random
+import timeit
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram_timepicker import TimePicker, TimePickerBuilder, TimeQuery
+
+NUMBER = 20_000
+
+builder = TimePickerBuilder(name="stats")
+random.seed(0)
+# what an arrow press sends: the callback data of a random state
+presses = [
+    TimeQuery(name="stats", hour=random.randrange(24), minute=random.randrange(60))
+    for _ in range(NUMBER)
+]
+callbacks = [query.pack() for query in presses]
+
+
+def build_uncached(query: TimeQuery) -> None:
+    picker = TimePicker(name=builder.name, hour=query.hour, minute=query.minute)
+    picker._build_keyboard()
+
+
+def unpack_uncached(value: str) -> None:
+    CallbackData.unpack.__func__(TimeQuery, value)  # type: ignore[attr-defined]
+
+
+def run(name: str, fn, args: list) -> None:
+    # the first pass fills the caches, the best of the others is reported
+    seconds = min(timeit.repeat(lambda: [fn(arg) for arg in args], number=1, repeat=4))
+    print(f"  {name:<28} {len(args) / seconds:>10,.0f}/s")
+
+
+def main() -> None:
+    print(f"{NUMBER} arrow presses over {len(set(callbacks))} states")
+    print("keyboards:")
+    run("uncached", build_uncached, presses)
+    run(
+        "get_keyboard",
+        lambda query: builder.build_from_callback(query).get_keyboard(),
+        presses,
+    )
+    print("callback parses:")
+    run("CallbackData.unpack", unpack_uncached, callbacks)
+    run("TimeQuery.unpack", TimeQuery.unpack, callbacks)
+    print("press (parse and keyboard):")
+    run(
+        "uncached",
+        lambda value: build_uncached(
+            CallbackData.unpack.__func__(TimeQuery, value)  # type: ignore[attr-defined]
+        ),
+        callbacks,
+    )
+    run(
+        "cached",
+        lambda value: builder.build_from_callback(
+            TimeQuery.unpack(value)
+        ).get_keyboard(),
+        callbacks,
+    )
+
+
+if __name__ == "__main__":
+    main()
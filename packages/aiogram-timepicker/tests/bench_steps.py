@@ -0,0 +1,108 @@
+"""Callbacks needed to pick a time with the different picker layouts.
+
+Simulates users picking random target times: every state of a picker is a
+node, every button moving the time is an edge, and the shortest path from the
+start time to the target is the number of keyboard edits (callback round trips
+with an `edit_message_reply_markup`) the user needs. A record takes one more
+callback for "Ok", a typed "HH:MM" takes a single message and no callbacks.
+With a tolerance any time that close to the target is good enough.
+
+Run with `python tests/bench_steps.py` from the package directory.
+"""
+
+import datetime
+import random
+from collections import deque
+from itertools import product
+
+from aiogram_timepicker import TimePickerBuilder, TimeQuery
+
+RECORDS = 10_000
+DAY = 24 * 60
+TOLERANCES = (0, 2)
+PRESETS = tuple(datetime.time(hour) for hour in (7, 9, 13, 19, 22))
+LAYOUTS = {
+    "arrows": TimePickerBuilder(name="stats"),
+    "steps 15m/5m": TimePickerBuilder(name="stats", steps=(15, 5)),
+    "steps 3h/15m/5m": TimePickerBuilder(name="stats", steps=(180, 15, 5)),
+    "steps 15m/5m, presets": TimePickerBuilder(
+        name="stats", steps=(15, 5), presets=PRESETS
+    ),
+    "steps 3h/15m/5m, presets": TimePickerBuilder(
+        name="stats", steps=(180, 15, 5), presets=PRESETS
+    ),
+}
+
+
+def edges(builder: TimePickerBuilder) -> list[set[int]]:
+    """the times every time of the picker moves to with one button"""
+    result = []
+    for time in range(DAY):
+        query = TimeQuery(name=builder.name, hour=time // 60, minute=time % 60)
+        keyboard = builder.build_from_callback(query).get_keyboard()
+        moves = set()
+        for row in keyboard.inline_keyboard:
+            for button in row:
+                target = TimeQuery.unpack(button.callback_data or "")
+                if not target.ok:
+                    moves.add(target.hour * 60 + target.minute)
+        moves.discard(time)
+        result.append(moves)
+    return result
+
+
+def distances(graph: list[set[int]], start: int) -> list[int]:
+    result = [-1] * DAY
+    result[start] = 0
+    queue = deque([start])
+    while queue:
+        time = queue.popleft()
+        for target in graph[time]:
+            if result[target] < 0:
+                result[target] = result[time] + 1
+                queue.append(target)
+    return result
+
+
+def simulate(
+    graph: list[set[int]], records: list[tuple[int, int]], tolerance: int
+) -> list[int]:
+    cache: dict[int, list[int]] = {}
+    edits = []
+    for start, target in records:
+        if start not in cache:
+            cache[start] = distances(graph, start)
+        edits.append(
+            min(
+                cache[start][(target + delta) % DAY]
+                for delta in range(-tolerance, tolerance + 1)
+            )
+        )
+    return sorted(edits)
+
+
+def main() -> None:
+    rng = random.Random(0)
+    starts = [rng.randrange(DAY) for _ in range(RECORDS)]
+    scenarios = {
+        # the picker starts at the current time
+        "any time of the day": [(start, rng.randrange(DAY)) for start in starts],
+        "up to 3h earlier": [
+            (start, (start - rng.randrange(180)) % DAY) for start in starts
+        ],
+    }
+    graphs = {name: edges(builder) for name, builder in LAYOUTS.items()}
+    for (scenario, records), tolerance in product(scenarios.items(), TOLERANCES):
+        print(f"{scenario}, {RECORDS} records, within {tolerance} minutes:")
+        for name, graph in graphs.items():
+            edits = simulate(graph, records, tolerance)
+            mean = sum(edits) / len(edits)
+            print(
+                f"  {name:<26} {mean:5.1f} edits, {mean + 1:5.1f} callbacks"
+                f" per record (p90 {edits[int(len(edits) * 0.9)]} edits)"
+            )
+        print(f"  {'typed HH:MM':<26} {0:5.1f} edits, {0:5.1f} callbacks per record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+from aiogram.filters.callback_data import CallbackData
+from aiogram_timepicker import TimePicker, TimePickerBuilder, TimeQuery
+
+
+@pytest.fixture(scope="function")
+def builder() -> TimePickerBuilder:
+    return TimePickerBuilder(name="stats")
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        TimeQuery(name="stats", hour=0, minute=0),
+        TimeQuery(name="stats", hour=23, minute=59, ok=True),
+        TimeQuery(name="other", hour=8, minute=5),
+    ],
+)
+def test_unpack(query):
+    unpacked = TimeQuery.unpack(query.pack())
+    assert unpacked == query
+    assert unpacked == CallbackData.unpack.__func__(TimeQuery, query.pack())
+    assert TimeQuery.unpack(query.pack()) is unpacked
+
+
+@pytest.mark.parametrize(
+    "value,error",
+    [
+        ("time:stats:24:0:0", ValueError),
+        ("time:stats:8:60:0", ValueError),
+        ("time:stats:a:0:0", ValueError),
+        ("time:stats:8:0:maybe", ValueError),
+        ("date:stats:8:0:0", ValueError),
+        ("time:stats:8:0", TypeError),
+    ],
+)
+def test_unpack_invalid(value, error):
+    with pytest.raises(error):
+        TimeQuery.unpack(value)
+
+
+def test_unpack_not_canonical():
+    assert TimeQuery.unpack("time:stats:08:05:") == TimeQuery(
+        name="stats", hour=8, minute=5
+    )
+
+
+def test_query_is_frozen():
+    query = TimeQuery.unpack("time:stats:8:0:0")
+    with pytest.raises(ValueError):
+        query.hour = 9
+
+
+@pytest.mark.parametrize(
+    "hour,minute,buttons",
+    [
+        (8, 30, ["9:30", "8:31", "8:30", "8:30", "7:30", "8:29"]),
+        (23, 59, ["0:59", "23:0", "23:59", "23:59", "22:59", "23:58"]),
+        (0, 0, ["1:0", "0:1", "0:0", "0:0", "23:0", "0:59"]),
+    ],
+)
+def test_keyboard(builder, hour, minute, buttons):
+    keyboard = builder.build_from_callback(
+        TimeQuery(name="stats", hour=hour, minute=minute)
+    ).get_keyboard()
+    rows = keyboard.inline_keyboard
+    assert [button.text for button in rows[1]] == [str(hour), str(minute)]
+    data = [
+        button.callback_data
+        for row in rows[:3]
+        for button in row
+        if button.callback_data is not None
+    ]
+    assert data == [f"time:stats:{button}:0" for button in buttons]
+    assert rows[3][0].callback_data == f"time:stats:{hour}:{minute}:1"
+
+
+def test_keyboard_rows_are_shared(builder):
+    query = TimeQuery(name="stats", hour=8, minute=30)
+    keyboard = builder.build_from_callback(query).get_keyboard()
+    again = builder.build_from_callback(query).get_keyboard()
+    assert again == keyboard and again is not keyboard
+    picker = TimePicker(name="stats", hour=8, minute=30)
+    assert picker.get_keyboard() == keyboard == picker._build_keyboard()
+    other = TimePicker(name="other", hour=8, minute=30).get_keyboard()
+    assert other != keyboard
+    # a changed keyboard does not change the cached rows
+    keyboard.inline_keyboard[0][0].text = "changed"
+    keyboard.inline_keyboard.pop()
+    assert picker.get_keyboard() == picker._build_keyboard()
+
+
+def test_steps_and_presets():
+    builder = TimePickerBuilder(
+        name="stats",
+        steps=(60, 15, 5),
+        presets=(datetime.time(7, 0), datetime.time(21, 30)),
+    )
+    keyboard = builder.build_from_callback(
+        TimeQuery(name="stats", hour=23, minute=50)
+    ).get_keyboard()
+    rows = [
+        [(button.text, button.callback_data) for button in row]
+        for row in keyboard.inline_keyboard[3:]
+    ]
+    assert rows == [
+        [("-1h", "time:stats:22:50:0"), ("+1h", "time:stats:0:50:0")],
+        [("-15m", "time:stats:23:35:0"), ("+15m", "time:stats:0:5:0")],
+        [("-5m", "time:stats:23:45:0"), ("+5m", "time:stats:23:55:0")],
+        [("07:00", "time:stats:7:0:0"), ("21:30", "time:stats:21:30:0")],
+        [("Ok", "time:stats:23:50:1")],
+    ]
+    # the plain picker of the same name and time has its own keyboard
+    plain = TimePicker(name="stats", hour=23, minute=50).get_keyboard()
+    assert len(plain.inline_keyboard) == 4
+
+
+def test_invalid_step():
+    with pytest.raises(ValueError):
+        TimePickerBuilder(name="stats", steps=(0,))
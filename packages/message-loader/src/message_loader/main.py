@@ -35,6 +35,12 @@ class MissingTemplateVariables(Exception):
 
 
 class MessageLoader:
+    """
+    Loads jinja message templates from a json file. Every template is compiled
+    once on construction together with the set of variables it requires, so
+    rendering a message does not lex, parse or compile it again
+    """
+
     def __init__(self, messages_file: str | Path):
         self._messages_file_path: Path = (
             messages_file if isinstance(messages_file, Path) else Path(messages_file)
@@ -45,14 +51,36 @@ class MessageLoader:
             raise MessagesFileExtensionError
         with self._messages_file_path.open(encoding="utf-8") as f:
             self._message_dict: dict[str, str] = json.loads(f.read())
-        self._env = Environment()
+        self._env = Environment(undefined=StrictUndefined)
+        self._templates: dict[str, tuple[Template, frozenset[str]]] = {
+            msg_id: self._compile(msg) for msg_id, msg in self._message_dict.items()
+        }
+
+    def _compile(self, msg: str) -> tuple[Template, frozenset[str]]:
+        ast = self._env.parse(msg)
+        return (
+            self._env.from_string(ast),
+            frozenset(meta.find_undeclared_variables(ast)),
+        )
+
+    def get_vars(self, msg_id: str) -> frozenset[str]:
+        """get the variables required by the message template
+
+        Args:
+            msg_id (str): message id
+
+        Returns:
+            frozenset[str]: names of the template variables
+        """
+        if msg_id not in self._templates:
+            raise MessageIdNotFoundError(msg_id)
+        return self._templates[msg_id][1]
 
     def render_msg(self, msg_id: str, **kwargs) -> str:
-        if msg_id not in self._message_dict:
+        if msg_id not in self._templates:
             raise MessageIdNotFoundError(msg_id)
-        msg: str = self._message_dict[msg_id]
-        vars = meta.find_undeclared_variables(self._env.parse(msg))
-        missing_vars: set[str] = vars.difference(kwargs.keys())
+        template, vars = self._templates[msg_id]
+        missing_vars: frozenset[str] = vars.difference(kwargs.keys())
         if len(missing_vars) > 0:
             raise MissingTemplateVariables(list(missing_vars))
-        return Template(msg, undefined=StrictUndefined).render(kwargs)
+        return template.render(kwargs)
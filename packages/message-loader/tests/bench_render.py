@@ -0,0 +1,70 @@
+"""Renders per second of `MessageLoader.render_msg` against the uncached path.
+
+Run with `python tests/bench_render.py` from the package directory.
+"""
+
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+from jinja2 import Environment, StrictUndefined, Template, meta
+from message_loader import MessageLoader
+
+MESSAGES = {
+    "plain": "Please enter your weight in kg",
+    "one_var": "Welcome, {{name}}!",
+    "filters": (
+        "Weight should be between {{min_weight|round(1)}} "
+        "and {{ max_weight|round(1) }} kg"
+    ),
+}
+KWARGS = {
+    "plain": {},
+    "one_var": {"name": "John Smith"},
+    "filters": {"min_weight": 1.0, "max_weight": 500.0},
+}
+NUMBER = 20_000
+
+
+def render_uncached(env: Environment, messages: dict[str, str], msg_id: str, **kwargs):
+    """the pre-cache implementation of `MessageLoader.render_msg`"""
+    msg = messages[msg_id]
+    vars = meta.find_undeclared_variables(env.parse(msg))
+    missing_vars = vars.difference(kwargs.keys())
+    if len(missing_vars) > 0:
+        raise ValueError(missing_vars)
+    return Template(msg, undefined=StrictUndefined).render(kwargs)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        messages_file = Path(tmp) / "messages.json"
+        messages_file.write_text(json.dumps(MESSAGES), encoding="utf-8")
+        loader = MessageLoader(messages_file)
+    env = Environment()
+
+    print(f"{'message':<10} {'uncached, r/s':>15} {'cached, r/s':>15} {'speedup':>8}")
+    for msg_id, kwargs in KWARGS.items():
+        assert render_uncached(env, MESSAGES, msg_id, **kwargs) == loader.render_msg(
+            msg_id, **kwargs
+        )
+        before = timeit.timeit(
+            lambda: render_uncached(env, MESSAGES, msg_id, **kwargs),  # noqa: B023
+            number=NUMBER // 10,
+        ) / (NUMBER // 10)
+        after = (
+            timeit.timeit(
+                lambda: loader.render_msg(msg_id, **kwargs),  # noqa: B023
+                number=NUMBER,
+            )
+            / NUMBER
+        )
+        print(
+            f"{msg_id:<10} {1 / before:>15,.0f} {1 / after:>15,.0f} "
+            f"{before / after:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -53,3 +53,21 @@ def test_message_missing_variable(file_example):
 def test_message_loader(file_example):
     message_loader = MessageLoader(file_example)
     assert message_loader.render_msg("id_1", user="user") == "Hello, user"
+
+
+def test_message_loader_renders_from_cache(file_example, monkeypatch):
+    message_loader = MessageLoader(file_example)
+
+    def parse(*args, **kwargs):
+        raise AssertionError("template was parsed again")
+
+    monkeypatch.setattr(message_loader._env, "parse", parse)
+    assert message_loader.render_msg("id_1", user="user") == "Hello, user"
+    assert message_loader.render_msg("id_1", user="other") == "Hello, other"
+
+
+def test_message_loader_get_vars(file_example):
+    message_loader = MessageLoader(file_example)
+    assert message_loader.get_vars("id_2") == {"another_user"}
+    with pytest.raises(MessageIdNotFoundError):
+        message_loader.get_vars("msg_3")
@@ -1,4 +1,7 @@
+from .charts import router as charts_router
+from .exports import router as exports_router
 from .general import router as general_router
+from .imports import router as imports_router
 from .start import router as start_router
 from .stats import router as stats_router
 from .test import router as test_router
@@ -0,0 +1,42 @@
+from aiogram import Bot, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.methods import SendMessage
+from aiogram.types import BufferedInputFile, Message
+from message_loader.main import MessageLoader
+
+from ...middleware.user import RegisteredUserMiddleware
+from ...models.user import User
+from ...services.charts import CHART_WINDOWS, ChartRenderer
+
+router = Router(name=__name__)
+router.message.middleware(RegisteredUserMiddleware())
+
+
+@router.message(Command("chart"), flags={"chat_action": "upload_photo"})
+async def chart(
+    message: Message,
+    command: CommandObject,
+    bot: Bot,
+    user: User,
+    chart_renderer: ChartRenderer,
+    message_loader: MessageLoader,
+) -> SendMessage | None:
+    window = (command.args or "month").strip().lower()
+    if window not in CHART_WINDOWS:
+        return message.answer(
+            message_loader.render_msg("chart_unknown_window", windows=CHART_WINDOWS)
+        )
+    result = await chart_renderer.get(user, window)
+    if result is None:
+        return message.answer(message_loader.render_msg("chart_no_records"))
+    caption = message_loader.render_msg("chart_caption", window=window)
+    if isinstance(result.photo, str):
+        # uploaded before, telegram sends it again by its file id
+        await bot.send_photo(message.chat.id, result.photo, caption=caption)
+        return None
+    sent = await bot.send_photo(
+        message.chat.id, BufferedInputFile(result.photo, "chart.png"), caption=caption
+    )
+    if sent.photo:
+        chart_renderer.remember(result.key, sent.photo[-1].file_id)
+    return None
@@ -0,0 +1,44 @@
+from logging import Logger
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.methods import SendDocument, SendMessage
+from aiogram.types import Message
+from message_loader.main import MessageLoader
+
+from ...config import config
+from ...db.session import SessionMaker
+from ...middleware.user import RegisteredUserMiddleware
+from ...models.user import User
+from ...services.exports import RecordExport
+from ...services.stats import get_records
+
+router = Router(name=__name__)
+router.message.middleware(RegisteredUserMiddleware())
+
+
+@router.message(Command("export"))
+async def export(
+    message: Message,
+    command: CommandObject,
+    user: User,
+    session_maker: SessionMaker,
+    logger: Logger,
+    message_loader: MessageLoader,
+) -> SendDocument | SendMessage:
+    assert user.id is not None
+    export_format = (command.args or "csv").strip().lower()
+    if export_format == "json":
+        export_format = "ndjson"
+    if export_format not in ("csv", "ndjson"):
+        return message.answer(message_loader.render_msg("export_unknown_format"))
+    if not await get_records(session_maker, user.id, limit=1):
+        return message.answer(message_loader.render_msg("export_empty"))
+    logger.info(f"exporting the records of user {user.id} as {export_format}")
+    # the records are read and encoded while the document is uploaded
+    return message.answer_document(
+        RecordExport(
+            session_maker, user, export_format, chunk_size=config.export_chunk_size
+        ),
+        caption=message_loader.render_msg("export_caption"),
+    )
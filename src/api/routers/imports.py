@@ -0,0 +1,85 @@
+from logging import Logger
+
+from aiogram import Bot, F, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.methods import SendMessage
+from aiogram.types import Message
+from message_loader.main import MessageLoader
+
+from ...config import config
+from ...db.session import SessionMaker
+from ...middleware.user import RegisteredUserMiddleware
+from ...models.user import User
+from ...services.imports import RecordParser, UnknownFormatError, import_records
+
+router = Router(name=__name__)
+router.message.middleware(RegisteredUserMiddleware())
+
+
+class ImportForm(StatesGroup):
+    upload = State()
+
+
+@router.message(Command("import"))
+async def start_import(
+    message: Message, state: FSMContext, message_loader: MessageLoader
+) -> SendMessage:
+    await state.set_state(ImportForm.upload)
+    return message.answer(message_loader.render_msg("import_upload"))
+
+
+@router.message(ImportForm.upload, F.document)
+async def upload(
+    message: Message,
+    state: FSMContext,
+    bot: Bot,
+    user: User,
+    session_maker: SessionMaker,
+    logger: Logger,
+    message_loader: MessageLoader,
+) -> SendMessage:
+    document = message.document
+    assert document is not None and user.id is not None
+    if document.file_size and document.file_size > config.import_max_file_size:
+        return message.answer(
+            message_loader.render_msg(
+                "import_too_large", max_size=config.import_max_file_size // 2**20
+            )
+        )
+    file = await bot.get_file(document.file_id)
+    if not file.file_path:
+        raise ValueError("no file path")
+    # the file is read as it is downloaded, never as a whole
+    chunks = bot.session.stream_content(
+        url=bot.session.api.file_url(bot.token, file.file_path),
+        chunk_size=config.import_chunk_size,
+    )
+    parser = RecordParser(user.id, user.height, user.timezone)
+    try:
+        result = await import_records(
+            session_maker, chunks, parser, batch_size=config.import_batch_size
+        )
+    except UnknownFormatError as e:
+        logger.info(f"unknown import format of user {user.id}: {e.header!r}")
+        return message.answer(message_loader.render_msg("import_unknown_format"))
+    await state.clear()
+    logger.info(
+        f"user {user.id} imported {result.accepted} records, rejected {result.rejected}"
+    )
+    return message.answer(
+        message_loader.render_msg(
+            "import_done",
+            accepted=result.accepted,
+            rejected=result.rejected,
+            errors=result.errors,
+        )
+    )
+
+
+@router.message(ImportForm.upload)
+async def upload_no_document(
+    message: Message, message_loader: MessageLoader
+) -> SendMessage:
+    return message.answer(message_loader.render_msg("import_upload"))
@@ -14,13 +14,15 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
 )
+from aiogram.types import User as TelegramUser
 from message_loader.main import MessageLoader
 
 from ...config import config
 from ...db.session import SessionMaker
-from ...models.user import User
-from ...services.user import create_user, get_telegram_user, get_user_if_exists
-from ...utils.time import TimezoneApiError, get_timezone_from_location
+from ...models.user import User, UserAlreadyExistsError
+from ...services.timezone import TimezoneResolver
+from ...services.user import UserCache, create_user, get_telegram_user
+from ...utils.time import TimezoneApiError
 
 router = Router(name=__name__)
 
@@ -33,12 +35,11 @@ class StartStates(StatesGroup):
 @router.message(CommandStart())
 async def start(
     message: Message,
-    session_maker: SessionMaker,
+    user: User | None,
     state: FSMContext,
     message_loader: MessageLoader,
 ) -> SendMessage:
     telegram_user = get_telegram_user(message)
-    user: User | None = await get_user_if_exists(telegram_user, session_maker)
     if not user:
         await state.clear()
         await state.update_data(telegram_user=telegram_user)
@@ -80,6 +81,56 @@ def incorrect_height(message: Message, message_loader: MessageLoader) -> SendMes
     return message.answer(message_loader.render_msg("start_height_incorrect_format"))
 
 
+async def register(
+    message: Message,
+    data: dict[str, Any],
+    timezone: str,
+    session_maker: SessionMaker,
+    logger: Logger,
+    message_loader: MessageLoader,
+    user_cache: UserCache,
+) -> SendMessage:
+    """create the user from the registration data and welcome them, a user
+    registered in the meantime is greeted back instead
+
+    Args:
+        message (Message): last message of the registration
+        data (dict[str, Any]): registration data of the fsm
+        timezone (str): timezone of the user
+        session_maker (SessionMaker): session maker
+        logger (Logger): logger
+        message_loader (MessageLoader): message loader
+        user_cache (UserCache): user cache
+
+    Returns:
+        SendMessage: welcome message
+    """
+    try:
+        user = await create_user(
+            # the fsm storage may keep the telegram user serialized
+            TelegramUser.model_validate(data["telegram_user"]),
+            session_maker,
+            logger,
+            data["height"],
+            timezone,
+        )
+    except UserAlreadyExistsError as e:
+        # registered meanwhile, by another /start of the same user
+        if e.user is None:
+            raise
+        user_cache.set(e.user)
+        return message.answer(
+            message_loader.render_msg("hello_user", name=e.user.full_name),
+            reply_markup=ReplyKeyboardRemove(),
+        )
+    user_cache.set(user)
+    logger.info(f"created new user for telegram id {user.telegram_id}")
+    return message.answer(
+        message_loader.render_msg("start_welcome", name=user.full_name),
+        reply_markup=ReplyKeyboardRemove(),
+    )
+
+
 @router.message(StartStates.EnterTimezone, F.text.regexp(r"^[\+-]\d{1,2}$").as_("gmt"))
 async def timezone_from_gmt(
     message: Message,
@@ -88,19 +139,15 @@ async def timezone_from_gmt(
     logger: Logger,
     gmt: Match[str],
     message_loader: MessageLoader,
+    user_cache: UserCache,
 ) -> SendMessage:
     if abs(int(gmt.string)) > 12:
         return message.answer(message_loader.render_msg("start_gmt_incorrect"))
     timezone: str = "Etc/GMT" + gmt.string
     data: dict[str, Any] = await state.get_data()
     await state.clear()
-    user = await create_user(
-        data["telegram_user"], session_maker, logger, data["height"], timezone
-    )
-    logger.info(f"created new user for telegram id {user.telegram_id}")
-    return message.answer(
-        message_loader.render_msg("start_welcome", name=user.full_name),
-        reply_markup=ReplyKeyboardRemove(),
+    return await register(
+        message, data, timezone, session_maker, logger, message_loader, user_cache
     )
 
 
@@ -112,26 +159,23 @@ async def timezone_from_location(
     logger: Logger,
     location: Location,
     message_loader: MessageLoader,
+    timezone_resolver: TimezoneResolver,
+    user_cache: UserCache,
 ) -> SendMessage:
     timezone: str
     try:
-        timezone = get_timezone_from_location(location)
+        timezone = await timezone_resolver.resolve(location)
     except TimezoneApiError as e:
         logger.error(f"timezone api error: {e}")
         return message.answer(
-            message_loader.render_msg("start_timezone_erroe"),
+            message_loader.render_msg("start_timezone_error"),
             reply_markup=ReplyKeyboardRemove(),
         )
     data: dict[str, Any] = await state.get_data()
     await state.clear()
     logger.debug(f"{location.latitude = }; {location.longitude = }")
-    user = await create_user(
-        data["telegram_user"], session_maker, logger, data["height"], timezone
-    )
-    logger.info(f"created new user for telegram id {user.telegram_id}")
-    return message.answer(
-        message_loader.render_msg("start_welcome", name=user.full_name),
-        reply_markup=ReplyKeyboardRemove(),
+    return await register(
+        message, data, timezone, session_maker, logger, message_loader, user_cache
     )
 
 
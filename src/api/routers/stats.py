@@ -1,3 +1,4 @@
+import datetime
 from logging import Logger
 from re import Match
 from typing import Any
@@ -6,22 +7,32 @@ from aiogram import Bot, F, Router
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.methods import SendMessage
+from aiogram.methods import AnswerCallbackQuery, SendMessage
 from aiogram.types import CallbackQuery, Message
 from aiogram_timepicker.main import TimePickerBuilder, TimeQuery
 from message_loader.main import MessageLoader
 
 from ...config import config
 from ...db.session import SessionMaker
+from ...middleware.user import RegisteredUserMiddleware
 from ...models.stats import ParamRecord
 from ...models.user import User
-from ...services.stats import save_record
-from ...services.user import get_user
+from ...services.edits import EditCoalescer
+from ...services.records import RecordWriter
+from ...services.stats import get_summary
+from ...services.trends import DAY, compute_trend, fetch_series
 from ...utils.time import current_timestamp_utc
 
 router = Router(name=__name__)
+router.message.middleware(RegisteredUserMiddleware())
+router.callback_query.middleware(RegisteredUserMiddleware())
 
-time_picker_builder = TimePickerBuilder(name="stats")
+# a typed local time of the record, like 08:30 or 21.45
+TIME_FORMAT = r"^\s*([01]?\d|2[0-3])[:.]([0-5]\d)\s*$"
+
+time_picker_builder = TimePickerBuilder(
+    name="stats", steps=config.time_picker_steps, presets=config.time_picker_presets
+)
 
 
 class RecordForm(StatesGroup):
@@ -35,10 +46,9 @@ class RecordForm(StatesGroup):
 async def add_record(
     message: Message,
     state: FSMContext,
-    session_maker: SessionMaker,
+    user: User,
     message_loader: MessageLoader,
 ) -> SendMessage:
-    user: User = await get_user(message, session_maker)
     await state.clear()
     await state.update_data(user_id=user.id, height=user.height, timezone=user.timezone)
     await state.set_state(RecordForm.enter_time)
@@ -50,6 +60,23 @@ async def add_record(
     )
 
 
+async def set_record_time(state: FSMContext, time: TimeQuery) -> datetime.datetime:
+    """save the picked or typed local time of the record and move on to the weight
+
+    Args:
+        state (FSMContext): state of the record form
+        time (TimeQuery): local time of the measurement
+
+    Returns:
+        datetime.datetime: time of the measurement in UTC
+    """
+    timezone = (await state.get_data())["timezone"]
+    measured_at = time.get_datetime_today_utc(timezone)
+    await state.update_data(measured_at=measured_at)
+    await state.set_state(RecordForm.enter_weight)
+    return measured_at
+
+
 @router.callback_query(RecordForm.enter_time, time_picker_builder.ok_filter())
 async def ok_time(
     query: CallbackQuery,
@@ -60,23 +87,57 @@ async def ok_time(
 ) -> SendMessage:
     if not query.message:
         raise ValueError("no message")
-    timezone = (await state.get_data())["timezone"]
-    logger.debug(f"{callback_data.get_datetime_today_utc(timezone)}")
-    await state.update_data(measured_at=callback_data.get_datetime_today_utc(timezone))
-    await state.set_state(RecordForm.enter_weight)
+    measured_at = await set_record_time(state, callback_data)
+    logger.debug(f"{measured_at}")
     return query.message.answer(message_loader.render_msg("stats_weight"))
 
 
+@router.message(
+    RecordForm.enter_time,
+    F.text.regexp(TIME_FORMAT).as_("time_m"),
+)
+async def enter_time(
+    message: Message,
+    state: FSMContext,
+    time_m: Match[str],
+    message_loader: MessageLoader,
+) -> SendMessage:
+    await set_record_time(
+        state,
+        TimeQuery(
+            name=time_picker_builder.name,
+            hour=int(time_m[1]),
+            minute=int(time_m[2]),
+            ok=True,
+        ),
+    )
+    return message.answer(message_loader.render_msg("stats_weight"))
+
+
+@router.message(RecordForm.enter_time)
+async def enter_time_incorrect_format(
+    message: Message, message_loader: MessageLoader
+) -> SendMessage:
+    return message.answer(message_loader.render_msg("stats_time_incorrect_format"))
+
+
 @router.callback_query(RecordForm.enter_time, time_picker_builder.filter())
-async def switch_time(query: CallbackQuery, callback_data: TimeQuery, bot: Bot) -> None:
+async def switch_time(
+    query: CallbackQuery,
+    callback_data: TimeQuery,
+    bot: Bot,
+    edit_coalescer: EditCoalescer,
+) -> AnswerCallbackQuery:
     time_picker = time_picker_builder.build_from_callback(callback_data)
-    if not query.message:
-        return
-    await bot.edit_message_reply_markup(
-        chat_id=query.message.chat.id,
-        message_id=query.message.message_id,
-        reply_markup=time_picker.get_keyboard(),
-    )
+    if isinstance(query.message, Message):
+        edit_coalescer.submit(
+            bot,
+            query.message.chat.id,
+            query.message.message_id,
+            time_picker.get_keyboard(),
+            current=query.message.reply_markup,
+        )
+    return query.answer()
 
 
 @router.message(
@@ -147,13 +208,13 @@ async def record_fat_p_incorrect_format(
 async def skip_muscle_p(
     message: Message,
     state: FSMContext,
-    session_maker: SessionMaker,
+    record_writer: RecordWriter,
     message_loader: MessageLoader,
 ) -> SendMessage:
     data = await state.update_data(muscle_percent=None)
     await state.clear()
     result = ParamRecord.model_validate(data)
-    record = await save_record(session_maker, result)
+    record = await record_writer.save(result)
     return message.answer(
         message_loader.render_msg("stats_record_save", record_data=str(record))
     )
@@ -167,7 +228,7 @@ async def record_muscle_p(
     message: Message,
     state: FSMContext,
     muscle_p_m: Match[str],
-    session_maker: SessionMaker,
+    record_writer: RecordWriter,
     message_loader: MessageLoader,
 ) -> SendMessage:
     muscle_p: float = float(muscle_p_m.string)
@@ -175,7 +236,7 @@ async def record_muscle_p(
     data: dict[str, Any] = await state.update_data(muscle_percent=muscle_p)
     await state.clear()
     result = ParamRecord.model_validate(data)
-    record = await save_record(session_maker, result)
+    record = await record_writer.save(result)
     return message.answer(
         message_loader.render_msg("stats_record_save", record_data=str(record))
     )
@@ -186,3 +247,53 @@ async def record_muscle_p_incorrect_format(
     message: Message, message_loader: MessageLoader
 ) -> SendMessage:
     return message.answer(message_loader.render_msg("stats_muscle_incorrect_format"))
+
+
+@router.message(Command("trend"))
+async def trend(
+    message: Message,
+    user: User,
+    session_maker: SessionMaker,
+    message_loader: MessageLoader,
+) -> SendMessage:
+    assert user.id is not None
+    result = compute_trend(
+        await fetch_series(session_maker, user.id),
+        window=config.trend_window_days * DAY,
+        tau=config.trend_smoothing_days * DAY,
+        rate_window=config.trend_rate_days * DAY,
+    )
+    if result is None:
+        return message.answer(message_loader.render_msg("stats_trend_no_records"))
+    return message.answer(
+        message_loader.render_msg(
+            "stats_trend",
+            points=result.points,
+            window=config.trend_window_days,
+            weight=result.weight,
+            fat_weight=result.fat_weight,
+            muscle_weight=result.muscle_weight,
+        )
+    )
+
+
+@router.message(Command("stats"))
+async def stats(
+    message: Message,
+    user: User,
+    session_maker: SessionMaker,
+    message_loader: MessageLoader,
+) -> SendMessage:
+    assert user.id is not None
+    summary = await get_summary(
+        session_maker, user.id, windows=config.summary_average_days
+    )
+    if summary is None:
+        return message.answer(message_loader.render_msg("stats_summary_no_records"))
+    return message.answer(
+        message_loader.render_msg(
+            "stats_summary",
+            summary=summary,
+            last=user.timestamp_in_users_timezone(summary.last),
+        )
+    )
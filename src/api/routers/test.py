@@ -2,10 +2,12 @@ import datetime
 
 from aiogram import Bot, Router
 from aiogram.filters import Command
-from aiogram.methods import SendMessage
+from aiogram.methods import AnswerCallbackQuery, SendMessage
 from aiogram.types import CallbackQuery, Message
 from aiogram_timepicker import TimePickerBuilder, TimeQuery
 
+from ...services.edits import EditCoalescer
+
 router = Router(name=__name__)
 
 time_picker_builder = TimePickerBuilder(name="test")
@@ -30,13 +32,19 @@ def test_time_ok(query: CallbackQuery, callback_data: TimeQuery) -> SendMessage:
 
 @router.callback_query(time_picker_builder.filter())
 async def test_time_callback(
-    query: CallbackQuery, callback_data: TimeQuery, bot: Bot
-) -> None:
-    if query.message is None:
+    query: CallbackQuery,
+    callback_data: TimeQuery,
+    bot: Bot,
+    edit_coalescer: EditCoalescer,
+) -> AnswerCallbackQuery:
+    if not isinstance(query.message, Message):
         raise ValueError("no message")
     time_picker = time_picker_builder.build_from_callback(callback_data)
-    await bot.edit_message_reply_markup(
-        chat_id=query.message.chat.id,
-        message_id=query.message.message_id,
-        reply_markup=time_picker.get_keyboard(),
+    edit_coalescer.submit(
+        bot,
+        query.message.chat.id,
+        query.message.message_id,
+        time_picker.get_keyboard(),
+        current=query.message.reply_markup,
     )
+    return query.answer()
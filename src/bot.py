@@ -1,39 +1,140 @@
+from pathlib import Path
+
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.filters import ExceptionTypeFilter
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import DisabledEventIsolation, MemoryStorage
 from aiogram.utils.chat_action import ChatActionMiddleware
 from message_loader.main import MessageLoader
 
-from .api.routers import general_router, start_router, stats_router, test_router
+from .api.routers import (
+    charts_router,
+    exports_router,
+    general_router,
+    imports_router,
+    start_router,
+    stats_router,
+    test_router,
+)
 from .config import config
 from .db.session import async_engine, db_startup, session_maker
+from .db.storage import PostgresStorage
 from .logger import get_logger, setup_logging
+from .middleware.fsm import TransactionalFSMContextMiddleware
 from .middleware.general import other_exceptions
-from .middleware.user import no_user_error, user_not_registered_error
+from .middleware.user import (
+    UserMiddleware,
+    no_user_error,
+    user_not_registered_error,
+)
 from .models.user import NoUserError, UserNotRegisteredError
+from .services.charts import ChartRenderer
+from .services.edits import EditCoalescer
+from .services.records import RecordWriter
+from .services.timezone import TimezoneResolver
+from .services.user import UserCache
+from .utils.tz_index import TimezoneIndex
 
 
 async def startup_event(dispatcher: Dispatcher) -> None:
     dispatcher["log_listener"] = setup_logging()
     dispatcher["logger"] = get_logger()
     dispatcher["session_maker"] = session_maker
+    dispatcher["user_cache"] = UserCache(
+        session_maker,
+        maxsize=config.user_cache_size,
+        ttl=config.user_cache_ttl,
+        negative_ttl=config.user_cache_negative_ttl,
+    )
+    dispatcher["record_writer"] = RecordWriter(
+        session_maker,
+        dispatcher["logger"],
+        batch_size=config.record_batch_size,
+        delay=config.record_batch_delay,
+        maxsize=config.record_queue_size,
+    )
+    dispatcher["chart_renderer"] = ChartRenderer(
+        session_maker,
+        workers=config.chart_workers,
+        cache_size=config.chart_cache_size,
+        cache_ttl=config.chart_cache_ttl,
+        points=config.chart_points,
+    )
     dispatcher["message_loader"] = MessageLoader("static/messages/messages.json")
+    dispatcher["edit_coalescer"] = EditCoalescer(
+        dispatcher["logger"], window=config.edit_coalesce_window
+    )
+    timezone_index: TimezoneIndex | None = None
+    if Path(config.timezone_index_path).exists():
+        timezone_index = TimezoneIndex(config.timezone_index_path)
+    else:
+        dispatcher["logger"].warning(
+            f"timezone index {config.timezone_index_path} not found, "
+            "timezones will be resolved with the api only"
+        )
+    dispatcher["timezone_resolver"] = TimezoneResolver(
+        api_key=config.google_timezone_api_key,
+        api_url=config.timezone_api_url,
+        timeout=config.timezone_api_timeout,
+        retries=config.timezone_api_retries,
+        cache_size=config.timezone_cache_size,
+        cache_ttl=config.timezone_cache_ttl,
+        precision=config.timezone_cache_precision,
+        index=timezone_index,
+        api_fallback=config.timezone_api_fallback,
+    )
     await db_startup()
+    await dispatcher["chart_renderer"].start()
+    if isinstance(dispatcher.storage, PostgresStorage):
+        dispatcher.storage.start_expiry(config.fsm_expiry_interval)
     dispatcher["logger"].info("startup completed")
 
 
 async def shutdown_event(dispatcher: Dispatcher) -> None:
-    dispatcher["log_listener"].stop()
+    await dispatcher["edit_coalescer"].close()
+    await dispatcher["record_writer"].close()
+    await dispatcher["chart_renderer"].close()
+    await dispatcher["timezone_resolver"].close()
+    await dispatcher.storage.close()
     await async_engine.dispose()
+    dispatcher["logger"].info(f"user cache: {dispatcher['user_cache'].stats()}")
+    dispatcher["logger"].info(f"records: {dispatcher['record_writer'].stats()}")
+    dispatcher["logger"].info(f"charts: {dispatcher['chart_renderer'].stats()}")
+    dispatcher["logger"].info(f"keyboard edits: {dispatcher['edit_coalescer'].stats()}")
     dispatcher["logger"].info("shutown completed")
+    dispatcher["log_listener"].stop()
+
+
+def get_storage() -> BaseStorage:
+    if config.fsm_storage == "memory":
+        return MemoryStorage()
+    return PostgresStorage(
+        async_engine,
+        state_ttl=config.fsm_state_ttl,
+        cache_size=config.fsm_cache_size,
+        cache_ttl=config.fsm_cache_ttl,
+    )
 
 
 def setup() -> tuple[Dispatcher, Bot]:
-    dp = Dispatcher()
+    storage = get_storage()
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    # handlers' state changes are written once, after the handler returns
+    dp.fsm = TransactionalFSMContextMiddleware(storage, DisabledEventIsolation())
+    dp.update.outer_middleware(dp.fsm)
     dp.startup.register(startup_event)
     dp.shutdown.register(shutdown_event)
-    dp.include_routers(general_router, start_router, stats_router, test_router)
+    dp.include_routers(
+        general_router,
+        start_router,
+        stats_router,
+        imports_router,
+        exports_router,
+        charts_router,
+        test_router,
+    )
     dp.error.register(
         no_user_error,
         ExceptionTypeFilter(NoUserError),
@@ -45,6 +146,8 @@ def setup() -> tuple[Dispatcher, Bot]:
         F.update.message,
     )
     dp.error.register(other_exceptions)
+    dp.message.outer_middleware(UserMiddleware())
+    dp.callback_query.outer_middleware(UserMiddleware())
     dp.message.middleware(ChatActionMiddleware())
     bot = Bot(
         token=config.bot_api_key,
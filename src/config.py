@@ -1,3 +1,6 @@
+import datetime
+from typing import Literal
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -10,17 +13,91 @@ class Config(BaseSettings):
     db_user: str = ""
     db_password: str = ""
     db_database: str = ""
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # a round trip on every checkout, the recycle already drops old connections
+    db_pool_pre_ping: bool = False
+    db_pool_warmup: bool = True
+    # apply the migrations at startup instead of only checking the schema
+    # version, otherwise run `python -m src.db.migrations upgrade` on deploy
+    db_auto_migrate: bool = False
+    # prepared statements cached per connection, 0 behind pgbouncer in
+    # transaction mode
+    db_statement_cache_size: int = 100
 
     weight_upper_limit: float = 500.0
     weight_lower_limit: float = 1.0
     height_upper_limit: float = 300.0
     height_lower_limit: float = 1.0
 
+    # extra rows of the time picker moving the time by minutes and the times
+    # to jump to, the hour and minute arrows are always there
+    time_picker_steps: tuple[int, ...] = (180, 15, 5)
+    time_picker_presets: tuple[datetime.time, ...] = tuple(
+        datetime.time(hour) for hour in (7, 9, 13, 19, 22)
+    )
+    # a message's keyboard is edited at most once per window
+    edit_coalesce_window: float = 0.5
+
+    # /trend: moving average window, time constant of the smoothed weight and
+    # the latest days the weekly rates are fitted to
+    trend_window_days: float = 7.0
+    trend_smoothing_days: float = 10.0
+    trend_rate_days: float = 28.0
+    # /stats: the average weights of these numbers of days
+    summary_average_days: tuple[int, ...] = (7, 30)
+
+    # records saved with more than one per batch are queued and inserted
+    # together, once a batch is full or the delay after its first record is over
+    record_batch_size: int = 1
+    record_batch_delay: float = 0.05
+    record_queue_size: int = 10000
+
+    # uploaded measurements files, telegram bots download files up to 20 MB
+    import_max_file_size: int = 20 * 2**20
+    import_chunk_size: int = 2**16
+    import_batch_size: int = 5000
+    # rows of an export read from the database and encoded at a time
+    export_chunk_size: int = 5000
+    # /chart: worker processes rendering the charts, the cached charts (a file
+    # id once sent) and how long they are kept, the points a line is reduced to
+    chart_workers: int = 2
+    chart_cache_size: int = 1000
+    chart_cache_ttl: float = 86400.0
+    chart_points: int = 500
+
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 300.0
+    # unregistered users, short: a user registered by another process of the
+    # bot is not registered for this one until it expires
+    user_cache_negative_ttl: float = 1.0
+
+    fsm_storage: Literal["memory", "postgres"] = "postgres"
+    fsm_state_ttl: float = 604800.0
+    fsm_expiry_interval: float = 3600.0
+    fsm_cache_size: int = 10000
+    fsm_cache_ttl: float = 0.0
+
     google_timezone_api_key: str = ""
+    timezone_api_url: str = "https://maps.googleapis.com/maps/api/timezone/json"
+    timezone_api_timeout: float = 3.0
+    timezone_api_retries: int = 2
+    timezone_cache_size: int = 4096
+    timezone_cache_ttl: float = 86400.0
+    timezone_cache_precision: int = 2
+    timezone_index_path: str = "static/timezones/tz_index.bin"
+    timezone_api_fallback: bool = True
 
     web_url: str = ""
     webhook_path: str = "/bot"
     webhook_secret: str = ""
+    webhook_queue: bool = False
+    webhook_workers: int = 32
+    webhook_queue_size: int = 1000
+    webhook_drain_timeout: float = 30.0
 
     @property
     def webhook_url(self) -> str:
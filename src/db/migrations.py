@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from ..config import config
+from .rollups import REBUILD, ROLLUP_FUNCTIONS
+
+# key of the advisory lock held while migrations are applied
+MIGRATION_LOCK = 7_146_354_915
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Statements bringing the schema from the previous version to `version`"""
+
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+# the schema `SQLModel.metadata.create_all` created before the migrations, the
+# statements are skipped where a database already has it
+INITIAL_SCHEMA = Migration(
+    1,
+    "initial schema",
+    (
+        """
+        CREATE TABLE IF NOT EXISTS "user" (
+            id SERIAL NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            username VARCHAR,
+            first_name VARCHAR NOT NULL,
+            last_name VARCHAR,
+            height FLOAT NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            timezone VARCHAR NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            modified_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            deleted_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (id)
+        )
+        """,
+        'CREATE INDEX IF NOT EXISTS ix_user_telegram_id ON "user" (telegram_id)',
+        """
+        CREATE TABLE IF NOT EXISTS paramrecord (
+            id SERIAL NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            measured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            modified_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            deleted_at TIMESTAMP WITH TIME ZONE,
+            weight FLOAT NOT NULL,
+            height FLOAT NOT NULL,
+            fat_percent FLOAT,
+            muscle_percent FLOAT,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE RESTRICT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            bot_id BIGINT NOT NULL,
+            chat_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            thread_id BIGINT DEFAULT '0' NOT NULL,
+            business_connection_id VARCHAR DEFAULT '' NOT NULL,
+            destiny VARCHAR NOT NULL,
+            state VARCHAR,
+            data JSONB DEFAULT '{}' NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+            PRIMARY KEY (
+                bot_id, chat_id, user_id, thread_id, business_connection_id, destiny
+            )
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_fsm_state_updated_at
+        ON fsm_state (updated_at)
+        """,
+    ),
+)
+
+MIGRATIONS: tuple[Migration, ...] = (
+    INITIAL_SCHEMA,
+    Migration(
+        2,
+        "unique active telegram id, records by user and time",
+        (
+            # nothing kept two active users of one telegram id apart before,
+            # only the first registration stays active
+            """
+            UPDATE "user" SET is_active = false, deleted_at = now()
+            WHERE is_active AND id NOT IN (
+                SELECT min(id) FROM "user" WHERE is_active GROUP BY telegram_id
+            )
+            """,
+            "DROP INDEX IF EXISTS ix_user_telegram_id",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_user_telegram_id_active
+            ON "user" (telegram_id) WHERE is_active
+            """,
+            # the pages of `get_records` in index order, the included values
+            # serve the aggregates of a user's history without the table
+            """
+            CREATE INDEX IF NOT EXISTS ix_paramrecord_user_id_measured_at
+            ON paramrecord (user_id, measured_at DESC, id DESC)
+            INCLUDE (weight, fat_percent, muscle_percent)
+            WHERE deleted_at IS NULL
+            """,
+        ),
+    ),
+    Migration(
+        3,
+        "rollups of the records by user and day",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS dailyrollup (
+                records INTEGER NOT NULL,
+                weight_sum FLOAT NOT NULL,
+                weight_min FLOAT NOT NULL,
+                weight_max FLOAT NOT NULL,
+                first_measured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                first_id INTEGER NOT NULL,
+                first_weight FLOAT NOT NULL,
+                last_measured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                last_id INTEGER NOT NULL,
+                last_weight FLOAT NOT NULL,
+                user_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                PRIMARY KEY (user_id, day),
+                FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS usersummary (
+                records INTEGER NOT NULL,
+                weight_sum FLOAT NOT NULL,
+                weight_min FLOAT NOT NULL,
+                weight_max FLOAT NOT NULL,
+                first_measured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                first_id INTEGER NOT NULL,
+                first_weight FLOAT NOT NULL,
+                last_measured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                last_id INTEGER NOT NULL,
+                last_weight FLOAT NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id),
+                FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE
+            )
+            """,
+            *ROLLUP_FUNCTIONS,
+            # the rollups of the existing records, of all users
+            *(statement.replace(":user_id", "NULL") for statement in REBUILD),
+        ),
+    ),
+    Migration(
+        4,
+        "records by user and latest change",
+        (
+            """
+            CREATE INDEX IF NOT EXISTS ix_paramrecord_user_id_modified_at
+            ON paramrecord (user_id, modified_at)
+            """,
+        ),
+    ),
+    Migration(
+        5,
+        "records by user and id",
+        (
+            # `modified_at` is set by the bot, not in the order of the commits,
+            # the cached charts are keyed by ids instead
+            "DROP INDEX IF EXISTS ix_paramrecord_user_id_modified_at",
+            """
+            CREATE INDEX IF NOT EXISTS ix_paramrecord_user_id_id
+            ON paramrecord (user_id, id)
+            """,
+        ),
+    ),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+)
+"""
+
+
+class SchemaVersionError(Exception):
+    def __init__(self, version: int, expected: int) -> None:
+        self.version: int = version
+        self.expected: int = expected
+        super().__init__(
+            f"database schema version {version} is older than {expected},"
+            " run `python -m src.db.migrations upgrade`"
+        )
+
+
+async def get_schema_version(conn: AsyncConnection) -> int:
+    """get the version of the database schema
+
+    Args:
+        conn (AsyncConnection): connection to the database
+
+    Returns:
+        int: latest applied migration or 0 for a database without migrations
+    """
+    if await conn.scalar(text("SELECT to_regclass('schema_version')")) is None:
+        return 0
+    return await conn.scalar(
+        text("SELECT coalesce(max(version), 0) FROM schema_version")
+    )
+
+
+async def upgrade(
+    engine: AsyncEngine, migrations: tuple[Migration, ...] = MIGRATIONS
+) -> list[Migration]:
+    """apply the migrations the database does not have yet, all of them in one
+    transaction. Concurrent upgrades wait for each other on an advisory lock, the
+    ones that get it later find the migrations applied
+
+    Args:
+        engine (AsyncEngine): engine of the database
+        migrations (tuple[Migration, ...], optional): migrations ordered by
+        version. Defaults to MIGRATIONS.
+
+    Returns:
+        list[Migration]: applied migrations
+    """
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK}
+        )
+        await conn.execute(text(SCHEMA_VERSION_TABLE))
+        version = await get_schema_version(conn)
+        pending = [m for m in migrations if m.version > version]
+        for migration in pending:
+            for statement in migration.statements:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_version (version, name) VALUES (:v, :n)"),
+                {"v": migration.version, "n": migration.name},
+            )
+    return pending
+
+
+async def check_schema_version(
+    engine: AsyncEngine, expected: int = LATEST_VERSION
+) -> int:
+    """check that the database has the migrations the code needs with a single
+    query, the boot path of the bot instead of applying them
+
+    Args:
+        engine (AsyncEngine): engine of the database
+        expected (int, optional): version the code needs. Defaults to
+        LATEST_VERSION.
+
+    Raises:
+        SchemaVersionError: the database has no migrations or older ones
+
+    Returns:
+        int: version of the database, newer ones are accepted
+    """
+    try:
+        async with engine.connect() as conn:
+            version = await conn.scalar(text("SELECT max(version) FROM schema_version"))
+    except ProgrammingError as e:
+        # no schema_version table
+        raise SchemaVersionError(0, expected) from e
+    if version is None or version < expected:
+        raise SchemaVersionError(version or 0, expected)
+    return version
+
+
+async def _run(command: str) -> None:
+    engine = create_async_engine(config.db_url)
+    try:
+        if command == "upgrade":
+            for migration in await upgrade(engine):
+                print(f"applied {migration.version}: {migration.name}")
+        async with engine.connect() as conn:
+            print(f"schema version {await get_schema_version(conn)}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="database schema migrations")
+    parser.add_argument(
+        "command",
+        choices=["upgrade", "version"],
+        help="apply the pending migrations or show the schema version",
+    )
+    args = parser.parse_args()
+    asyncio.run(_run(args.command))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from ..config import config
+
+# the rollups of `dailyrollup` (per user and UTC day) and `usersummary` (per
+# user) are kept by triggers on `paramrecord`: an insert merges the new records
+# into them, an update or delete computes the touched days again from their
+# records and the touched users' summaries from their days
+
+# the UTC day of a record
+DAY = "(measured_at AT TIME ZONE 'UTC')::date"
+
+# the columns of both rollups aggregated from records
+RECORD_AGGREGATES = """
+    count(*),
+    sum(weight),
+    min(weight),
+    max(weight),
+    (array_agg(measured_at ORDER BY measured_at, id))[1],
+    (array_agg(id ORDER BY measured_at, id))[1],
+    (array_agg(weight ORDER BY measured_at, id))[1],
+    (array_agg(measured_at ORDER BY measured_at DESC, id DESC))[1],
+    (array_agg(id ORDER BY measured_at DESC, id DESC))[1],
+    (array_agg(weight ORDER BY measured_at DESC, id DESC))[1]
+"""
+
+# the columns of a user's summary aggregated from the user's days
+DAY_AGGREGATES = """
+    sum(records),
+    sum(weight_sum),
+    min(weight_min),
+    max(weight_max),
+    (array_agg(first_measured_at ORDER BY first_measured_at, first_id))[1],
+    (array_agg(first_id ORDER BY first_measured_at, first_id))[1],
+    (array_agg(first_weight ORDER BY first_measured_at, first_id))[1],
+    (array_agg(last_measured_at ORDER BY last_measured_at DESC, last_id DESC))[1],
+    (array_agg(last_id ORDER BY last_measured_at DESC, last_id DESC))[1],
+    (array_agg(last_weight ORDER BY last_measured_at DESC, last_id DESC))[1]
+"""
+
+COLUMNS = """
+    records, weight_sum, weight_min, weight_max,
+    first_measured_at, first_id, first_weight,
+    last_measured_at, last_id, last_weight
+"""
+
+
+EDGE_COLUMNS = ("measured_at", "id", "weight")
+
+
+def _first_or_last(column: str, edge: str, newer: str) -> str:
+    # the record of the new ones wins if it is measured before the first (or
+    # after the last) one, the id breaks the ties like in the aggregates
+    return (
+        f"{edge}_{column} = CASE"
+        f" WHEN (excluded.{edge}_measured_at, excluded.{edge}_id)"
+        f" {newer} (r.{edge}_measured_at, r.{edge}_id)"
+        f" THEN excluded.{edge}_{column} ELSE r.{edge}_{column} END"
+    )
+
+
+# merges the aggregates of new records into an existing rollup `r`
+MERGE = ",\n    ".join(
+    [
+        "records = r.records + excluded.records",
+        "weight_sum = r.weight_sum + excluded.weight_sum",
+        "weight_min = least(r.weight_min, excluded.weight_min)",
+        "weight_max = greatest(r.weight_max, excluded.weight_max)",
+        *(_first_or_last(column, "first", "<") for column in EDGE_COLUMNS),
+        *(_first_or_last(column, "last", ">") for column in EDGE_COLUMNS),
+    ]
+)
+
+ROLLUP_FUNCTIONS: tuple[str, ...] = (
+    f"""
+    CREATE OR REPLACE FUNCTION paramrecord_rollup_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO dailyrollup AS r (user_id, day, {COLUMNS})
+        SELECT user_id, {DAY}, {RECORD_AGGREGATES}
+        FROM new_records WHERE deleted_at IS NULL
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, day) DO UPDATE SET {MERGE};
+        INSERT INTO usersummary AS r (user_id, {COLUMNS})
+        SELECT user_id, {RECORD_AGGREGATES}
+        FROM new_records WHERE deleted_at IS NULL
+        GROUP BY 1
+        ON CONFLICT (user_id) DO UPDATE SET {MERGE};
+        RETURN NULL;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION rollup_days(users integer[], days date[])
+    RETURNS void LANGUAGE sql AS $$
+        DELETE FROM dailyrollup r USING unnest(users, days) AS k(user_id, day)
+        WHERE r.user_id = k.user_id AND r.day = k.day;
+        INSERT INTO dailyrollup (user_id, day, {COLUMNS})
+        SELECT p.user_id, k.day, {RECORD_AGGREGATES}
+        FROM paramrecord p
+        JOIN unnest(users, days) AS k(user_id, day) ON p.user_id = k.user_id
+            AND p.measured_at >= k.day::timestamp AT TIME ZONE 'UTC'
+            AND p.measured_at < (k.day + 1)::timestamp AT TIME ZONE 'UTC'
+        WHERE p.deleted_at IS NULL
+        GROUP BY 1, 2;
+        DELETE FROM usersummary WHERE user_id = ANY(users);
+        INSERT INTO usersummary (user_id, {COLUMNS})
+        SELECT user_id, {DAY_AGGREGATES}
+        FROM dailyrollup WHERE user_id = ANY(users)
+        GROUP BY 1;
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION paramrecord_rollup_change() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        users integer[];
+        days date[];
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            SELECT array_agg(user_id), array_agg(day) INTO users, days FROM (
+                SELECT user_id, {DAY} AS day FROM old_records
+                UNION SELECT user_id, {DAY} FROM new_records
+            ) touched;
+        ELSE
+            SELECT array_agg(user_id), array_agg(day) INTO users, days FROM (
+                SELECT DISTINCT user_id, {DAY} AS day FROM old_records
+            ) touched;
+        END IF;
+        IF users IS NOT NULL THEN
+            PERFORM rollup_days(users, days);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS paramrecord_rollup_insert ON paramrecord",
+    """
+    CREATE TRIGGER paramrecord_rollup_insert AFTER INSERT ON paramrecord
+    REFERENCING NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION paramrecord_rollup_insert()
+    """,
+    "DROP TRIGGER IF EXISTS paramrecord_rollup_update ON paramrecord",
+    """
+    CREATE TRIGGER paramrecord_rollup_update AFTER UPDATE ON paramrecord
+    REFERENCING OLD TABLE AS old_records NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION paramrecord_rollup_change()
+    """,
+    "DROP TRIGGER IF EXISTS paramrecord_rollup_delete ON paramrecord",
+    """
+    CREATE TRIGGER paramrecord_rollup_delete AFTER DELETE ON paramrecord
+    REFERENCING OLD TABLE AS old_records
+    FOR EACH STATEMENT EXECUTE FUNCTION paramrecord_rollup_change()
+    """,
+)
+
+# all the rollups or the ones of a user
+USER = "(CAST(:user_id AS integer) IS NULL OR user_id = :user_id)"
+
+REBUILD: tuple[str, ...] = (
+    f"DELETE FROM dailyrollup WHERE {USER}",
+    f"""
+    INSERT INTO dailyrollup (user_id, day, {COLUMNS})
+    SELECT user_id, {DAY}, {RECORD_AGGREGATES}
+    FROM paramrecord
+    WHERE deleted_at IS NULL AND {USER}
+    GROUP BY 1, 2
+    """,
+    f"DELETE FROM usersummary WHERE {USER}",
+    f"""
+    INSERT INTO usersummary (user_id, {COLUMNS})
+    SELECT user_id, {DAY_AGGREGATES}
+    FROM dailyrollup WHERE {USER}
+    GROUP BY 1
+    """,
+)
+
+
+async def rebuild_rollups(conn: AsyncConnection, user_id: int | None = None) -> int:
+    """compute the rollups again from the records, the changes of the records
+    made meanwhile wait for the lock of the tables
+
+    Args:
+        conn (AsyncConnection): connection in a transaction
+        user_id (int | None, optional): rebuild only this user's rollups.
+        Defaults to None, all of them.
+
+    Returns:
+        int: number of the rebuilt summaries
+    """
+    await conn.execute(
+        text("LOCK TABLE paramrecord, dailyrollup, usersummary IN EXCLUSIVE MODE")
+    )
+    rebuilt = 0
+    for statement in REBUILD:
+        res = await conn.execute(text(statement), {"user_id": user_id})
+        rebuilt = res.rowcount
+    return rebuilt
+
+
+async def _run(user_id: int | None) -> None:
+    engine = create_async_engine(config.db_url)
+    try:
+        async with engine.begin() as conn:
+            rebuilt = await rebuild_rollups(conn, user_id)
+        print(f"rebuilt the summaries of {rebuilt} users")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="rollups of the records")
+    parser.add_argument(
+        "command",
+        choices=["rebuild"],
+        help="compute the rollups again from the records",
+    )
+    parser.add_argument(
+        "--user-id", type=int, help="rebuild only the rollups of this user"
+    )
+    args = parser.parse_args()
+    asyncio.run(_run(args.user_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,96 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlmodel import SQLModel
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 from ..config import config
+from .migrations import check_schema_version, upgrade
 
 type SessionMaker = async_sessionmaker[AsyncSession]
 
-async_engine = create_async_engine(config.db_url, echo=True)
+async_engine = create_async_engine(
+    config.db_url,
+    echo=config.db_echo,
+    pool_size=config.db_pool_size,
+    max_overflow=config.db_max_overflow,
+    pool_timeout=config.db_pool_timeout,
+    pool_recycle=config.db_pool_recycle,
+    pool_pre_ping=config.db_pool_pre_ping,
+    connect_args={
+        # sqlalchemy's cache of prepared statements and asyncpg's own one
+        "prepared_statement_cache_size": config.db_statement_cache_size,
+        "statement_cache_size": config.db_statement_cache_size,
+    },
+)
 session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
 async def db_startup() -> None:
-    async with async_engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    if config.db_auto_migrate:
+        await upgrade(async_engine)
+    else:
+        await check_schema_version(async_engine)
+    if config.db_pool_warmup:
+        await warm_pool(async_engine, config.db_pool_size)
+
+
+async def warm_pool(engine: AsyncEngine, size: int) -> None:
+    """open `size` connections at once and return them to the pool, so the first
+    requests do not wait for new connections
+
+    Args:
+        engine (AsyncEngine): engine of the pool
+        size (int): number of connections to open
+    """
+
+    # every connection is held until all of them are open
+    barrier = asyncio.Barrier(size)
+
+    async def connect() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await barrier.wait()
+
+    async with asyncio.TaskGroup() as group:
+        for _ in range(size):
+            group.create_task(connect())
+
+
+def pool_status(engine: AsyncEngine) -> dict[str, int]:
+    """get the connection counts of the engine's pool
+
+    Args:
+        engine (AsyncEngine): engine of the pool
+
+    Returns:
+        dict[str, int]: size of the pool, connections checked out and idle ones,
+        and the overflow beyond the size (negative while the pool is not full)
+    """
+    pool = engine.pool
+    return {
+        "size": pool.size(),  # type: ignore[attr-defined]
+        "checked_out": pool.checkedout(),  # type: ignore[attr-defined]
+        "idle": pool.checkedin(),  # type: ignore[attr-defined]
+        "overflow": pool.overflow(),  # type: ignore[attr-defined]
+    }
+
+
+async def ping(engine: AsyncEngine) -> float:
+    """run a trivial query
+
+    Args:
+        engine (AsyncEngine): engine to check
+
+    Returns:
+        float: round trip of the query in seconds
+    """
+    start = time.perf_counter()
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return time.perf_counter() - start
@@ -0,0 +1,239 @@
+import asyncio
+import copy
+import datetime
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from pydantic_core import to_jsonable_python
+from sqlalchemy import delete, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+
+from ..logger import get_logger
+from ..models.fsm import FSMRecord
+from ..utils.cache import TTLCache
+
+type StateRecord = tuple[str | None, dict[str, Any]]
+
+MISSING = object()
+
+KEY_COLUMNS = (
+    "bot_id",
+    "chat_id",
+    "user_id",
+    "thread_id",
+    "business_connection_id",
+    "destiny",
+)
+
+
+def _key_columns(key: StorageKey) -> dict[str, Any]:
+    return {
+        "bot_id": key.bot_id,
+        "chat_id": key.chat_id,
+        "user_id": key.user_id,
+        "thread_id": key.thread_id or 0,
+        "business_connection_id": key.business_connection_id or "",
+        "destiny": key.destiny,
+    }
+
+
+def _key_clause(key: StorageKey) -> list[Any]:
+    return [
+        getattr(FSMRecord, name) == value for name, value in _key_columns(key).items()
+    ]
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM storage in the `fsm_state` table, shared by every process that uses
+    the same database.
+
+    Every key is one row with its state and data (jsonb), each write is a single
+    upsert and `update_data` is merged by the database, so concurrent updates of
+    different fields are not lost. Data is stored as JSON: values such as
+    datetimes and pydantic models are read back as strings and dicts.
+
+    Reads go through an in-process cache if `cache_ttl` is set. Writes made by
+    other processes are seen only after the cached entry expires, so keep it
+    short or off unless updates of a chat always reach the same process.
+
+    Keys that were not written for `state_ttl` seconds and cleared keys are
+    deleted in bulk by `delete_expired`, periodically after `start_expiry`
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        state_ttl: float = 604800.0,
+        cache_size: int = 10000,
+        cache_ttl: float = 0.0,
+    ) -> None:
+        # every statement is a single round trip, no explicit transaction needed
+        self.engine: AsyncEngine = engine.execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        self.state_ttl: float = state_ttl
+        self.cache: TTLCache[StorageKey, StateRecord] | None = (
+            TTLCache(cache_size, cache_ttl) if cache_ttl > 0 else None
+        )
+        self._expiry_task: asyncio.Task | None = None
+
+    async def _upsert(self, key: StorageKey, merge: bool = False, **values: Any) -> Any:
+        query = insert(FSMRecord).values(**_key_columns(key), **values)
+        set_ = {name: query.excluded[name] for name in values}
+        if merge:
+            # shallow merge like dict.update
+            set_["data"] = col(FSMRecord.data).op("||", return_type=JSONB)(
+                query.excluded.data
+            )
+        query = query.on_conflict_do_update(
+            index_elements=KEY_COLUMNS, set_={**set_, "updated_at": func.now()}
+        ).returning(FSMRecord.data)
+        async with self.engine.connect() as conn:
+            return (await conn.execute(query)).scalar_one()
+
+    def _update_cache(
+        self, key: StorageKey, state: Any = MISSING, data: Any = MISSING
+    ) -> None:
+        if self.cache is None or key not in self.cache:
+            return
+        cached_state, cached_data = self.cache.get(key)
+        self.cache.set(
+            key,
+            (
+                cached_state if state is MISSING else state,
+                cached_data if data is MISSING else copy.deepcopy(data),
+            ),
+        )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._upsert(key, state=value)
+        self._update_cache(key, state=value)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        value = to_jsonable_python(data)
+        await self._upsert(key, data=value)
+        self._update_cache(key, data=value)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return copy.deepcopy((await self._get(key))[1])
+
+    async def update_data(
+        self, key: StorageKey, data: Mapping[str, Any]
+    ) -> dict[str, Any]:
+        new_data = await self._upsert(key, merge=True, data=to_jsonable_python(data))
+        self._update_cache(key, data=new_data)
+        return new_data
+
+    async def get_record(self, key: StorageKey) -> StateRecord:
+        """get the state and the data of the key with a single query
+
+        Args:
+            key (StorageKey): storage key
+
+        Returns:
+            StateRecord: state and a copy of the data
+        """
+        state, data = await self._get(key)
+        return state, copy.deepcopy(data)
+
+    async def set_record(
+        self,
+        key: StorageKey,
+        state: StateType | object = MISSING,
+        data: Mapping[str, Any] | None = None,
+        merge: bool = False,
+    ) -> None:
+        """write the state and the data of the key with a single statement, a
+        cleared key is deleted
+
+        Args:
+            key (StorageKey): storage key
+            state (StateType | object, optional): new state. Defaults to MISSING,
+            the state is not changed.
+            data (Mapping[str, Any] | None, optional): new data. Defaults to None,
+            the data is not changed.
+            merge (bool, optional): merge `data` into the stored data like
+            `update_data` instead of replacing it. Defaults to False.
+        """
+        values: dict[str, Any] = {}
+        if state is not MISSING:
+            values["state"] = state.state if isinstance(state, State) else state
+        if data is not None:
+            values["data"] = to_jsonable_python(data)
+        if not values:
+            return
+        if values == {"state": None, "data": {}} and not merge:
+            async with self.engine.connect() as conn:
+                await conn.execute(delete(FSMRecord).where(*_key_clause(key)))
+            if self.cache is not None:
+                self.cache.set(key, (None, {}))
+            return
+        new_data = await self._upsert(key, merge=merge, **values)
+        self._update_cache(key, state=values.get("state", MISSING), data=new_data)
+
+    async def _get(self, key: StorageKey) -> StateRecord:
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        query = select(FSMRecord.state, FSMRecord.data).where(*_key_clause(key))
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(query)).one_or_none()
+        record: StateRecord = (row.state, row.data) if row else (None, {})
+        if self.cache is not None:
+            self.cache.set(key, record)
+        return record
+
+    async def delete_expired(self) -> int:
+        """delete the keys that were not written for `state_ttl` seconds and the
+        cleared keys (no state and no data)
+
+        Returns:
+            int: number of deleted keys
+        """
+        query = delete(FSMRecord).where(
+            or_(
+                col(FSMRecord.updated_at)
+                < func.now() - datetime.timedelta(seconds=self.state_ttl),
+                col(FSMRecord.state).is_(None)
+                & (col(FSMRecord.data) == literal({}, JSONB)),
+            )
+        )
+        async with self.engine.connect() as conn:
+            res = await conn.execute(query)
+        return res.rowcount
+
+    def start_expiry(self, interval: float) -> None:
+        """run `delete_expired` every `interval` seconds until the storage is closed
+
+        Args:
+            interval (float): seconds between runs
+        """
+        if self._expiry_task is None or self._expiry_task.done():
+            self._expiry_task = asyncio.create_task(self._expire(interval))
+
+    async def _expire(self, interval: float) -> None:
+        logger = get_logger()
+        while True:
+            try:
+                deleted = await self.delete_expired()
+                logger.info(f"deleted {deleted} expired fsm states")
+            except Exception:
+                logger.exception("failed to delete expired fsm states")
+            await asyncio.sleep(interval)
+
+    async def close(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+        if self.cache is not None:
+            self.cache.clear()
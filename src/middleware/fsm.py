@@ -0,0 +1,146 @@
+import copy
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, StateType
+from aiogram.types import TelegramObject
+
+from ..db.storage import MISSING, PostgresStorage
+
+
+class TransactionalFSMContext(FSMContext):
+    """
+    FSM context that reads the state and the data of its key at most once and
+    keeps every change in memory until `flush` writes them all together.
+
+    With a `PostgresStorage` the read is a single query and the flush a single
+    statement, other storages are used through the regular storage methods
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._state: str | None = None
+        self._data: dict[str, Any] = {}
+        self._state_loaded: bool = False
+        self._data_loaded: bool = False
+        self._state_changed: bool = False
+        # data written with set_data or clear, it replaces the stored data
+        self._data_replaced: bool = False
+        # data written with update_data only, it is merged into the stored data
+        self._updates: dict[str, Any] = {}
+
+    @property
+    def changed(self) -> bool:
+        return self._state_changed or self._data_replaced or bool(self._updates)
+
+    async def _load(self, data: bool = False) -> None:
+        if isinstance(self.storage, PostgresStorage):
+            if not self._state_loaded or (data and not self._data_loaded):
+                state, stored_data = await self.storage.get_record(self.key)
+                if not self._state_loaded:
+                    self._state, self._state_loaded = state, True
+                if not self._data_loaded:
+                    self._data, self._data_loaded = stored_data, True
+            return
+        if not self._state_loaded:
+            self._state = await self.storage.get_state(self.key)
+            self._state_loaded = True
+        if data and not self._data_loaded:
+            self._data = await self.storage.get_data(self.key)
+            self._data_loaded = True
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+        self._state_loaded = self._state_changed = True
+
+    async def get_state(self) -> str | None:
+        await self._load()
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        self._data = copy.deepcopy(dict(data))
+        self._data_loaded = self._data_replaced = True
+        self._updates = {}
+
+    async def get_data(self) -> dict[str, Any]:
+        await self._load(data=True)
+        return copy.deepcopy(self._data)
+
+    async def get_value(self, key: str, default: Any | None = None) -> Any | None:
+        return (await self.get_data()).get(key, default)
+
+    async def update_data(
+        self,
+        data: Mapping[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        await self._load(data=True)
+        self._data.update(copy.deepcopy(kwargs))
+        if not self._data_replaced:
+            self._updates.update(kwargs)
+        return copy.deepcopy(self._data)
+
+    async def flush(self) -> None:
+        """write the buffered changes to the storage"""
+        if not self.changed:
+            return
+        if isinstance(self.storage, PostgresStorage):
+            state = self._state if self._state_changed else MISSING
+            if self._data_replaced:
+                await self.storage.set_record(self.key, state, self._data)
+            else:
+                await self.storage.set_record(
+                    self.key, state, self._updates or None, merge=bool(self._updates)
+                )
+        else:
+            if self._state_changed:
+                await self.storage.set_state(self.key, self._state)
+            if self._data_replaced:
+                await self.storage.set_data(self.key, self._data)
+            elif self._updates:
+                await self.storage.update_data(self.key, self._updates)
+        self._state_changed = self._data_replaced = False
+        self._updates = {}
+
+
+class TransactionalFSMContextMiddleware(FSMContextMiddleware):
+    """
+    FSM middleware that gives handlers a `TransactionalFSMContext` and flushes
+    it after the handler returns. If the handler raises, its state changes are
+    discarded
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async def handle_and_flush(event: TelegramObject, data: dict[str, Any]) -> Any:
+            result = await handler(event, data)
+            context = data.get("state")
+            if isinstance(context, TransactionalFSMContext):
+                await context.flush()
+            return result
+
+        return await super().__call__(handle_and_flush, event, data)
+
+    def get_context(
+        self,
+        bot: Bot,
+        chat_id: int,
+        user_id: int,
+        thread_id: int | None = None,
+        business_connection_id: str | None = None,
+        destiny: str = DEFAULT_DESTINY,
+    ) -> FSMContext:
+        context = super().get_context(
+            bot, chat_id, user_id, thread_id, business_connection_id, destiny
+        )
+        return TransactionalFSMContext(storage=self.storage, key=context.key)
@@ -1,10 +1,51 @@
+from collections.abc import Awaitable, Callable
 from logging import Logger
+from typing import Any
 
+from aiogram import BaseMiddleware
 from aiogram.methods.send_message import SendMessage
-from aiogram.types import ErrorEvent
+from aiogram.types import ErrorEvent, TelegramObject
 from message_loader.main import MessageLoader
 
-from ..models.user import UserNotRegisteredError
+from ..models.user import NoUserError, TUser, UserNotRegisteredError
+from ..services.user import UserCache
+
+
+class UserMiddleware(BaseMiddleware):
+    """
+    Outer middleware that injects the registered `user` (or None) of the event
+    sender into handler data from the `user_cache`
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        telegram_user: TUser | None = data.get("event_from_user")
+        user_cache: UserCache = data["user_cache"]
+        data["user"] = await user_cache.get(telegram_user) if telegram_user else None
+        return await handler(event, data)
+
+
+class RegisteredUserMiddleware(BaseMiddleware):
+    """
+    Inner middleware for routers whose handlers need a registered `user`
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        telegram_user: TUser | None = data.get("event_from_user")
+        if not telegram_user:
+            raise NoUserError
+        if data.get("user") is None:
+            raise UserNotRegisteredError(telegram_user.id)
+        return await handler(event, data)
 
 
 async def no_user_error(
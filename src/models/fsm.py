@@ -0,0 +1,41 @@
+import datetime
+from typing import Any
+
+from sqlalchemy import BigInteger, Column, DateTime, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+from ..utils.time import current_timestamp_utc
+
+
+class FSMRecord(SQLModel, table=True):
+    """FSM state and data of one storage key"""
+
+    __tablename__ = "fsm_state"
+
+    bot_id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    chat_id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    user_id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    # the key parts aiogram leaves unset are stored as 0 and "" to keep them in
+    # the primary key
+    thread_id: int = Field(
+        default=0, sa_column=Column(BigInteger, primary_key=True, server_default="0")
+    )
+    business_connection_id: str = Field(
+        default="", sa_column=Column(String, primary_key=True, server_default="")
+    )
+    destiny: str = Field(sa_column=Column(String, primary_key=True))
+    state: str | None = None
+    data: dict[str, Any] = Field(
+        default_factory=dict,
+        sa_column=Column(JSONB, nullable=False, server_default="{}"),
+    )
+    updated_at: datetime.datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+            index=True,
+        ),
+        default_factory=current_timestamp_utc,
+    )
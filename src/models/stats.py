@@ -1,10 +1,11 @@
 import datetime
 from typing import Annotated
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import DDL, Column, Date, DateTime, Index, event, text
 from sqlmodel import Field, SQLModel
 
 from ..config import config
+from ..db.rollups import ROLLUP_FUNCTIONS
 from ..utils.time import current_timestamp_utc
 
 Weight = Annotated[
@@ -34,6 +35,22 @@ Height = Annotated[
 
 
 class ParamRecord(SQLModel, table=True):
+    # a user's records that are not deleted in the order of `get_records`, with
+    # the values the aggregates of the history read
+    __table_args__ = (
+        Index(
+            "ix_paramrecord_user_id_measured_at",
+            "user_id",
+            text("measured_at DESC"),
+            text("id DESC"),
+            postgresql_where=text("deleted_at IS NULL"),
+            postgresql_include=["weight", "fat_percent", "muscle_percent"],
+        ),
+        # the highest id of a user's records, deleted ones too, keys the cached
+        # charts
+        Index("ix_paramrecord_user_id_id", "user_id", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", ondelete="RESTRICT")
     created_at: datetime.datetime = Field(
@@ -76,3 +93,36 @@ class ParamRecord(SQLModel, table=True):
                 else ""
             )
         )
+
+
+class RecordRollup(SQLModel):
+    """Aggregates of the records that are not deleted"""
+
+    records: int
+    weight_sum: float
+    weight_min: float
+    weight_max: float
+    # the first and the last record by `measured_at`, then by `id`
+    first_measured_at: datetime.datetime = Field(sa_type=DateTime(timezone=True))
+    first_id: int
+    first_weight: float
+    last_measured_at: datetime.datetime = Field(sa_type=DateTime(timezone=True))
+    last_id: int
+    last_weight: float
+
+
+class DailyRollup(RecordRollup, table=True):
+    # kept by the triggers of `paramrecord`, see `src.db.rollups`
+    user_id: int = Field(foreign_key="user.id", ondelete="CASCADE", primary_key=True)
+    # UTC day of `measured_at`
+    day: datetime.date = Field(sa_column=Column(Date, primary_key=True))
+
+
+class UserSummary(RecordRollup, table=True):
+    # kept by the triggers of `paramrecord`, see `src.db.rollups`
+    user_id: int = Field(foreign_key="user.id", ondelete="CASCADE", primary_key=True)
+
+
+# the tables created from the metadata get the triggers too
+for statement in ROLLUP_FUNCTIONS:
+    event.listen(SQLModel.metadata, "after_create", DDL(statement))
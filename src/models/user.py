@@ -4,7 +4,7 @@ from typing import Annotated
 import pytz
 from aiogram.types import User as TelegramUser
 from pydantic import field_validator
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, Index, text
 from sqlmodel import Column, Field, Relationship, SQLModel
 
 from ..models.stats import Height, ParamRecord
@@ -32,12 +32,27 @@ class UserError(Exception):
 class UserNotRegisteredError(UserError): ...
 
 
-class UserAlreadyExistsError(UserError): ...
+class UserAlreadyExistsError(UserError):
+    def __init__(self, telegram_id: int, user: "User | None" = None) -> None:
+        # the active user that already has the telegram id
+        self.user: User | None = user
+        super().__init__(telegram_id)
 
 
 class User(SQLModel, table=True):
+    # a telegram id has at most one active user, the lookups by telegram id
+    # filter on `is_active` to use it
+    __table_args__ = (
+        Index(
+            "ix_user_telegram_id_active",
+            "telegram_id",
+            unique=True,
+            postgresql_where=text("is_active"),
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    telegram_id: TelegramId = Field(index=True)
+    telegram_id: TelegramId
     username: str | None
     first_name: str
     last_name: str | None
@@ -58,9 +73,9 @@ class User(SQLModel, table=True):
         sa_column=Column(DateTime(timezone=True), nullable=True), default=None
     )
 
-    records: list[ParamRecord] = Relationship(
-        sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    # the whole measurement history, never loaded implicitly: use
+    # `selectinload(User.records)` or the paginated `services.stats.get_records`
+    records: list[ParamRecord] = Relationship(sa_relationship_kwargs={"lazy": "raise"})
 
     @property
     def full_name(self) -> str:
@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from ..db.session import SessionMaker
+from ..models.stats import ParamRecord, UserSummary
+from ..models.user import User
+from ..utils.cache import SingleFlight, TTLCache
+from ..utils.charts import render_chart, warm_up
+from .downsampling import downsample
+from .trends import fetch_series
+
+# days of the charts before the latest record, None for the whole history
+CHART_WINDOWS: dict[str, int | None] = {
+    "week": 7,
+    "month": 30,
+    "year": 365,
+    "all": None,
+}
+
+# user id, window, timezone and the version of the user's records: their number,
+# the id of the latest one and the highest id of the user's records, deleted
+# ones too
+type ChartKey = tuple[int, str, str, int, int, int]
+
+
+@dataclass(frozen=True)
+class Chart:
+    key: ChartKey
+    # file id of the uploaded chart, the PNG until it is uploaded
+    photo: str | bytes
+
+
+class ChartRenderer:
+    """
+    Renders the charts of users' records in a process pool and caches them.
+
+    The lines of a chart are reduced to at most `points` each before they are
+    rendered, a long history costs about as much as a short one.
+
+    A chart is cached by the user, the window, the timezone and values of the
+    user's records the database assigns as they are committed: the number of
+    records and the id of the latest one from the summary kept by the triggers
+    and the highest id. A new or deleted record makes a new chart, in whatever
+    order the processes of the bot commit them.
+    Concurrent requests of one chart share a single render. Call `remember`
+    after a chart is sent, the file id of the upload is cached instead of the
+    PNG and the chart is not uploaded again
+    """
+
+    def __init__(
+        self,
+        session_maker: SessionMaker,
+        workers: int = 2,
+        cache_size: int = 1000,
+        cache_ttl: float = 86400.0,
+        points: int = 500,
+    ) -> None:
+        self.session_maker: SessionMaker = session_maker
+        self.workers: int = workers
+        self.points: int = points
+        self.cache: TTLCache[ChartKey, str | bytes] = TTLCache(cache_size, cache_ttl)
+        # spawned workers, a fork would copy the event loop and the connections
+        self._executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+        self._single_flight: SingleFlight[ChartKey, bytes | None] = SingleFlight()
+        self.renders: int = 0
+        self.render_time: float = 0.0
+        self.uploads: int = 0
+
+    async def start(self) -> None:
+        """start the worker processes and load matplotlib in them, otherwise the
+        first charts wait for it"""
+        loop = asyncio.get_running_loop()
+        # no worker is idle yet, every call spawns one
+        await asyncio.gather(
+            *(loop.run_in_executor(self._executor, int) for _ in range(self.workers))
+        )
+
+    async def _latest(
+        self, user_id: int
+    ) -> tuple[tuple[int, int, int], datetime.datetime] | None:
+        # the summary row and a single probe of an index of the user's records
+        last_id = (
+            select(func.max(ParamRecord.id))
+            .where(ParamRecord.user_id == user_id)
+            .scalar_subquery()
+        )
+        statement = select(
+            UserSummary.records,
+            UserSummary.last_id,
+            last_id,
+            UserSummary.last_measured_at,
+        ).where(UserSummary.user_id == user_id)
+        async with self.session_maker() as session:
+            row = (await session.execute(statement)).one_or_none()
+        if row is None:
+            return None
+        records, latest_id, highest_id, measured_at = row
+        return (records, latest_id, highest_id), measured_at
+
+    async def get(self, user: User, window: str) -> Chart | None:
+        """get the chart of the user's records from the cache or render it
+
+        Args:
+            user (User): user
+            window (str): one of `CHART_WINDOWS`
+
+        Returns:
+            Chart | None: chart, None without records
+        """
+        assert user.id is not None
+        latest = await self._latest(user.id)
+        if latest is None:
+            return None
+        version, last_measured = latest
+        key = (user.id, window, user.timezone, *version)
+        photo = self.cache.get(key)
+        if photo is None:
+            photo = await self._single_flight.do(
+                key, lambda: self._render(key, user, window, last_measured)
+            )
+            if photo is None:
+                return None
+        return Chart(key, photo)
+
+    async def _render(
+        self, key: ChartKey, user: User, window: str, last: datetime.datetime
+    ) -> bytes | None:
+        days = CHART_WINDOWS[window]
+        since = None if days is None else last - datetime.timedelta(days=days)
+        # every record, next to the database one ordered index scan is faster
+        # than bucketing them there (`fetch_downsampled`)
+        series = await fetch_series(self.session_maker, key[0], since=since)
+        if not len(series):
+            return None
+        lines = downsample(series, self.points)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        png = await loop.run_in_executor(
+            self._executor,
+            render_chart,
+            lines.weight,
+            lines.fat_weight,
+            lines.muscle_weight,
+            user.timezone,
+            "All time" if days is None else f"Last {days} days",
+        )
+        self.renders += 1
+        self.render_time += loop.time() - start
+        # an uploaded chart has its file id cached already
+        if key not in self.cache:
+            self.cache.set(key, png)
+        return png
+
+    def remember(self, key: ChartKey, file_id: str) -> None:
+        """cache the file id of the sent chart instead of its PNG
+
+        Args:
+            key (ChartKey): key of the chart
+            file_id (str): file id of the uploaded photo
+        """
+        self.uploads += 1
+        self.cache.set(key, file_id)
+
+    async def close(self) -> None:
+        """wait for the renders and stop the worker processes"""
+        await asyncio.to_thread(self._executor.shutdown)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            **self.cache.stats(),
+            "renders": self.renders,
+            "render_time": round(self.render_time, 3),
+            "uploads": self.uploads,
+        }
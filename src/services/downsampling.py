@@ -0,0 +1,256 @@
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import case, func, or_, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlmodel import col, select
+
+from ..db.session import SessionMaker
+from ..models.stats import ParamRecord
+from .trends import FloatArray, Series
+
+type IndexArray = npt.NDArray[np.intp]
+# times and values of a line, oldest first, like the lines of `render_chart`
+type Line = tuple[FloatArray, FloatArray]
+
+
+@dataclass(frozen=True)
+class Lines:
+    """Reduced weight and fat and muscle masses of a user's records"""
+
+    weight: Line
+    # empty without records having the mass
+    fat_weight: Line
+    muscle_weight: Line
+
+
+# time buckets of the database per point of a reduced series, the reducer picks
+# the points from their extremes
+BUCKETS_PER_POINT = 4
+
+
+async def fetch_bucketed(
+    session_maker: SessionMaker,
+    user_id: int,
+    buckets: int,
+    since: datetime.datetime | None = None,
+) -> Series:
+    """fetch the user's records that are not deleted reduced by the database:
+    the history is split into `buckets` intervals of the same length and only
+    the first and the last records of every interval and the ones with its
+    lowest and highest weight, fat and muscle mass are kept
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        buckets (int): number of the intervals
+        since (datetime.datetime | None, optional): only records measured at or
+        after this time. Defaults to None.
+
+    Returns:
+        Series: columns of the kept records ordered by `measured_at`, at most
+        8 records per interval without ties
+    """
+    conditions = [
+        ParamRecord.user_id == user_id,
+        col(ParamRecord.deleted_at).is_(None),
+    ]
+    if since is not None:
+        conditions.append(ParamRecord.measured_at >= since)
+    # the first and the last time from the index, not from every record
+    limits = (
+        select(
+            func.date_part("epoch", func.min(ParamRecord.measured_at)).label("lo"),
+            func.date_part("epoch", func.max(ParamRecord.measured_at)).label("hi"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    t = func.date_part("epoch", ParamRecord.measured_at)
+    lo, hi = limits.c.lo, limits.c.hi
+    # a history of a single time is one interval
+    interval = func.floor((t - lo) / func.nullif(hi - lo, 0) * buckets)
+    w = col(ParamRecord.weight)
+    fat, muscle = col(ParamRecord.fat_percent), col(ParamRecord.muscle_percent)
+    records = (
+        select(
+            col(ParamRecord.id).label("id"),
+            t.label("t"),
+            w.label("weight"),
+            fat.label("fat_percent"),
+            muscle.label("muscle_percent"),
+            # the masses of `Series`, NULL where the record has none
+            case((fat > 0, w * fat)).label("fat_weight"),
+            case((muscle > 0, w * muscle)).label("muscle_weight"),
+            func.least(func.coalesce(interval, 0), buckets - 1).label("bucket"),
+        )
+        .join(limits, true())
+        .where(*conditions)
+        .cte("records")
+    )
+    extremes = ("t", "weight", "fat_weight", "muscle_weight")
+    # hashed by bucket, no sort of the records by their bucket
+    bounds = (
+        select(
+            records.c.bucket,
+            *(
+                getattr(func, extreme)(records.c[name]).label(f"{extreme}_{name}")
+                for name in extremes
+                for extreme in ("min", "max")
+            ),
+        )
+        .group_by(records.c.bucket)
+        .subquery()
+    )
+    keep = or_(
+        *(
+            records.c[name] == bounds.c[f"{extreme}_{name}"]
+            for name in extremes
+            for extreme in ("min", "max")
+        )
+    )
+    order = (records.c.t, records.c.id)
+    query = (
+        select(
+            *(
+                func.array_agg(aggregate_order_by(records.c[name], *order))
+                for name in ("t", "weight", "fat_percent", "muscle_percent")
+            )
+        )
+        .select_from(records.join(bounds, records.c.bucket == bounds.c.bucket))
+        .where(keep)
+    )
+    async with session_maker() as session:
+        columns = (await session.execute(query)).one()
+    t, weight, fat_percent, muscle_percent = (
+        np.array(column or (), dtype=np.float64) for column in columns
+    )
+    return Series(t, weight, fat_percent, muscle_percent)
+
+
+def _edges(n: int, points: int) -> IndexArray:
+    # the first index of every bucket of `lttb` and the end of the last one.
+    # Integer edges, a float spacing truncates the last one short. The spacing
+    # is at least 1, no bucket is empty
+    return np.arange(points - 1) * (n - 2) // (points - 2) + 1
+
+
+def lttb(t: FloatArray, values: FloatArray, points: int) -> IndexArray:
+    """largest triangle three buckets: pick the points that keep the shape of a
+    line. The first and the last point are kept, the others are split into
+    `points - 2` buckets of the same count and from every bucket the point
+    making the largest triangle with the point picked before and the average of
+    the next bucket is picked
+
+    Args:
+        t (FloatArray): sorted times
+        values (FloatArray): values at the times, without nan
+        points (int): number of the points to pick, at least 3
+
+    Returns:
+        IndexArray: sorted indices of the picked points, all of them when there
+        are not more than `points`
+    """
+    n = len(t)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        raise ValueError(f"at least 3 points are picked, not {points}")
+    edges = _edges(n, points)
+    counts = np.diff(edges)
+    # the average of the bucket after every bucket, the last point after the
+    # last one
+    next_t, next_v = (
+        np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])[1:]
+        for x in (t, values)
+    )
+    picked = np.empty(points, dtype=np.intp)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # twice the area, the factor does not change the largest
+        area = np.abs(
+            (t[a] - next_t[i]) * (values[start:stop] - values[a])
+            - (t[a] - t[start:stop]) * (next_v[i] - values[a])
+        )
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def _line(t: FloatArray, values: FloatArray, points: int) -> Line:
+    measured = ~np.isnan(values)
+    t, values = t[measured], values[measured]
+    picked = lttb(t, values, points)
+    if len(picked) < len(t):
+        # a single lowest or highest record can lose to a larger triangle, it
+        # replaces the pick of its bucket. Both in one bucket, the later one
+        # replaces the pick of the next bucket, or the earlier one the pick of
+        # the previous bucket in the last one, so the picks stay sorted
+        edges = _edges(len(t), points)
+        extremes = sorted(
+            {int(np.argmin(values)), int(np.argmax(values))} - {0, len(t) - 1}
+        )
+        slots = np.searchsorted(edges, extremes, side="right")
+        if len(slots) == 2 and slots[0] == slots[1]:
+            if slots[1] < points - 2:
+                slots[1] += 1
+            elif slots[0] > 1:
+                slots[0] -= 1
+            else:
+                # a single bucket, the line gets a point more
+                picked = np.insert(picked, 1, extremes[0])
+                slots[1] += 1
+        picked[slots] = extremes
+    return t[picked], values[picked]
+
+
+def downsample(series: Series, points: int) -> Lines:
+    """reduce the weight and the fat and muscle masses to at most `points`
+    each with `lttb`, every one of them from the records that have it. The
+    lowest and the highest value of every line are kept, a line of 3 points
+    with both of them in its single bucket gets a fourth one
+
+    Args:
+        series (Series): records
+        points (int): points per line, at least 3
+
+    Returns:
+        Lines: reduced lines
+    """
+    return Lines(
+        weight=_line(series.t, series.weight, points),
+        fat_weight=_line(series.t, series.fat_weight, points),
+        muscle_weight=_line(series.t, series.muscle_weight, points),
+    )
+
+
+async def fetch_downsampled(
+    session_maker: SessionMaker,
+    user_id: int,
+    points: int,
+    since: datetime.datetime | None = None,
+) -> Lines:
+    """fetch the lines of the user's records with at most `points` each, the
+    database reduces the records to the extremes of `BUCKETS_PER_POINT` time
+    buckets per point and `lttb` picks the points from them. At most 8
+    records of a bucket leave the database, but bucketing them costs more than
+    `fetch_series` scanning the index: this is for a database far from the bot
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        points (int): points per line, at least 3
+        since (datetime.datetime | None, optional): only records measured at or
+        after this time. Defaults to None.
+
+    Returns:
+        Lines: reduced lines
+    """
+    series = await fetch_bucketed(
+        session_maker, user_id, points * BUCKETS_PER_POINT, since=since
+    )
+    return downsample(series, points)
@@ -0,0 +1,107 @@
+import asyncio
+from dataclasses import dataclass
+from logging import Logger
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+type MessageKey = tuple[int, int | str, int]
+
+
+@dataclass
+class PendingEdit:
+    bot: Bot
+    markup: InlineKeyboardMarkup
+    sent: InlineKeyboardMarkup | None
+
+
+class EditCoalescer:
+    """
+    Coalesces `edit_message_reply_markup` calls of one message.
+
+    The first edit of a message is sent at once, the edits submitted in the
+    next `window` seconds replace each other and only the latest keyboard is
+    sent when the window is over, so a message is edited at most once per
+    window. A keyboard equal to the one the message already has is not sent
+    """
+
+    def __init__(self, logger: Logger, window: float = 0.5) -> None:
+        self.logger: Logger = logger
+        self.window: float = window
+        self._pending: dict[MessageKey, PendingEdit] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.submitted: int = 0
+        self.sent: int = 0
+        self.failed: int = 0
+
+    def submit(
+        self,
+        bot: Bot,
+        chat_id: int | str,
+        message_id: int,
+        markup: InlineKeyboardMarkup,
+        current: InlineKeyboardMarkup | None = None,
+    ) -> None:
+        """schedule the keyboard edit of the message without waiting for it
+
+        Args:
+            bot (Bot): bot that sent the message
+            chat_id (int | str): chat of the message
+            message_id (int): message to edit
+            markup (InlineKeyboardMarkup): new keyboard of the message
+            current (InlineKeyboardMarkup | None, optional): keyboard the message
+            has now, used to skip the edits changing nothing. Defaults to None.
+        """
+        self.submitted += 1
+        key = (bot.id, chat_id, message_id)
+        if (pending := self._pending.get(key)) is not None:
+            pending.markup = markup
+            return
+        if markup == current:
+            return
+        pending = PendingEdit(bot, markup, current)
+        self._pending[key] = pending
+        task = asyncio.create_task(self._run(key, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: MessageKey, pending: PendingEdit) -> None:
+        try:
+            while pending.markup != pending.sent:
+                markup = pending.markup
+                await self._edit(key, pending.bot, markup)
+                pending.sent = markup
+                await asyncio.sleep(self.window)
+        finally:
+            del self._pending[key]
+
+    async def _edit(
+        self, key: MessageKey, bot: Bot, markup: InlineKeyboardMarkup
+    ) -> None:
+        _, chat_id, message_id = key
+        try:
+            await bot.edit_message_reply_markup(
+                chat_id=chat_id, message_id=message_id, reply_markup=markup
+            )
+            self.sent += 1
+        except TelegramBadRequest as e:
+            if "message is not modified" not in e.message:
+                self.failed += 1
+                self.logger.warning(f"could not edit message {key}: {e.message}")
+        except Exception:
+            self.failed += 1
+            self.logger.exception(f"could not edit message {key}")
+
+    async def close(self) -> None:
+        """wait for the pending edits to be sent"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pending": len(self._pending),
+        }
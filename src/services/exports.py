@@ -0,0 +1,109 @@
+import csv
+import datetime
+import io
+import json
+from collections.abc import AsyncGenerator, AsyncIterator, Sequence
+from typing import TYPE_CHECKING, Any, Literal
+
+from aiogram.types import InputFile
+from sqlalchemy import Row
+from sqlmodel import col, select
+
+from ..db.session import SessionMaker
+from ..models.stats import ParamRecord
+from ..models.user import User
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+type ExportFormat = Literal["csv", "ndjson"]
+
+EXPORT_COLUMNS = ("measured_at", "weight", "height", "fat_percent", "muscle_percent")
+
+
+async def stream_records(
+    session_maker: SessionMaker, user_id: int, chunk_size: int = 5000
+) -> AsyncIterator[Sequence[Row[Any]]]:
+    """stream the values of the user's records that are not deleted, oldest
+    first, with a server-side cursor, so at most `chunk_size` rows are in memory
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        chunk_size (int, optional): rows fetched at a time. Defaults to 5000.
+
+    Yields:
+        Sequence[Row[Any]]: next rows with the `EXPORT_COLUMNS` values
+    """
+    query = (
+        select(*(col(getattr(ParamRecord, column)) for column in EXPORT_COLUMNS))
+        .where(ParamRecord.user_id == user_id, col(ParamRecord.deleted_at).is_(None))
+        .order_by(col(ParamRecord.measured_at), col(ParamRecord.id))
+        .execution_options(yield_per=chunk_size)
+    )
+    async with session_maker() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield rows
+
+
+class RecordExport(InputFile):
+    """
+    Document of a user's records encoded while it is uploaded.
+
+    The records are read from the database chunk by chunk when the file is
+    sent and every chunk is encoded into CSV or NDJSON lines on its own, the
+    whole history is never in memory. The times are in the user's timezone
+    """
+
+    def __init__(
+        self,
+        session_maker: SessionMaker,
+        user: User,
+        export_format: ExportFormat = "csv",
+        chunk_size: int = 5000,
+    ) -> None:
+        super().__init__(filename=f"records.{export_format}", chunk_size=chunk_size)
+        if user.id is None:
+            raise ValueError("user is not saved")
+        self.session_maker: SessionMaker = session_maker
+        self.user: User = user
+        self.user_id: int = user.id
+        self.export_format: ExportFormat = export_format
+        self.rows: int = 0
+
+    async def read(self, bot: "Bot") -> AsyncGenerator[bytes, None]:
+        if self.export_format == "csv":
+            yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+        async for rows in stream_records(
+            self.session_maker, self.user_id, self.chunk_size
+        ):
+            self.rows += len(rows)
+            if self.export_format == "csv":
+                yield self._encode_csv(rows)
+            else:
+                yield self._encode_ndjson(rows)
+
+    def _local_time(self, measured_at: datetime.datetime) -> str:
+        return self.user.timestamp_in_users_timezone(measured_at).isoformat()
+
+    def _encode_csv(self, rows: Sequence[Row[Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for measured_at, *values in rows:
+            writer.writerow((self._local_time(measured_at), *values))
+        return buffer.getvalue().encode()
+
+    def _encode_ndjson(self, rows: Sequence[Row[Any]]) -> bytes:
+        lines = []
+        for measured_at, *values in rows:
+            record = dict(
+                zip(
+                    EXPORT_COLUMNS,
+                    (self._local_time(measured_at), *values),
+                    strict=True,
+                )
+            )
+            lines.append(json.dumps(record, separators=(",", ":")))
+        lines.append("")
+        return "\n".join(lines).encode()
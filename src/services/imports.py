@@ -0,0 +1,463 @@
+import codecs
+import csv
+import datetime
+import re
+from collections import deque
+from collections.abc import AsyncIterable, Iterator
+from dataclasses import dataclass, field
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel, ValidationError
+
+from ..db.session import SessionMaker
+from ..models.stats import Height, StatRatio, Weight
+from ..utils.time import current_timestamp_utc
+
+# the columns of the measurements files, by their headers with everything but
+# letters and % dropped and lowercased, so "Weight (kg)" is "weightkg"
+COLUMNS: dict[str, tuple[str, ...]] = {
+    "date": ("date", "datetime", "timestamp", "timeofmeasurement", "measuredat"),
+    "time": ("time",),
+    "weight": ("weight", "weightkg", "weightlb", "weightlbs", "bodyweight"),
+    "height": ("height", "heightcm"),
+    "fat_percent": (
+        "fat",
+        "fat%",
+        "fatpercent",
+        "bodyfat",
+        "bodyfat%",
+        "fatratio",
+        "fatratio%",
+    ),
+    "fat_mass": ("fatmass", "fatmasskg", "fatmasslb", "fatmasslbs"),
+    "muscle_percent": (
+        "muscle",
+        "muscle%",
+        "musclepercent",
+        "musclerate",
+        "musclerate%",
+        "skeletalmuscle",
+        "skeletalmuscle%",
+    ),
+    "muscle_mass": ("musclemass", "musclemasskg", "musclemasslb", "musclemasslbs"),
+}
+ALIASES = {alias: column for column, aliases in COLUMNS.items() for alias in aliases}
+POUND = 0.45359237
+# characters of a record that does not end, a quoted value that is not closed
+# is rejected past it instead of taking the rest of the file
+MAX_RECORD_SIZE = 64 * 1024
+# dates of the exports that `datetime.fromisoformat` does not read
+DATE_FORMATS = (
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+    "%Y.%m.%d %H:%M:%S",
+    "%Y.%m.%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y",
+)
+COPY_COLUMNS = (
+    "user_id",
+    "created_at",
+    "measured_at",
+    "modified_at",
+    "weight",
+    "height",
+    "fat_percent",
+    "muscle_percent",
+)
+
+type CopyRow = tuple[
+    int,
+    datetime.datetime,
+    datetime.datetime,
+    datetime.datetime,
+    float,
+    float,
+    float | None,
+    float | None,
+]
+
+
+class UnknownFormatError(Exception):
+    def __init__(self, header: str) -> None:
+        self.header: str = header
+        super().__init__(f"no date and weight columns in the header {header!r}")
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportedRecord(BaseModel):
+    measured_at: datetime.datetime
+    weight: Weight
+    height: Height
+    fat_percent: StatRatio | None
+    muscle_percent: StatRatio | None
+
+
+@dataclass
+class ImportResult:
+    accepted: int = 0
+    rejected: int = 0
+    # line numbers and reasons of the first rejected rows
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+
+def _header_key(header: str) -> str:
+    return re.sub(r"[^a-z%]", "", header.lower())
+
+
+def _number(value: str) -> float | None:
+    value = value.strip().rstrip("%").strip()
+    if not value or value == "-":
+        return None
+    try:
+        return float(value.replace(",", "."))
+    except ValueError as e:
+        raise RowError(f"{value!r} is not a number") from e
+
+
+def _ratio(value: float | None) -> float | None:
+    # a percent or a ratio, like the ones typed in the record form
+    if value is None:
+        return None
+    return value / 100 if value >= 1 else value
+
+
+def _datetime(value: str) -> datetime.datetime:
+    value = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise RowError(f"{value!r} is not a date")
+
+
+def _delimiter(header: str) -> str:
+    try:
+        return csv.Sniffer().sniff(header, delimiters=",;\t").delimiter
+    except csv.Error:
+        return ","
+
+
+def _ends_quoted(line: str, delimiter: str, quoted: bool) -> bool:
+    """whether a line of a record ends in a quoted value, like `csv` reads it:
+    a quote opens a value only at the start of a field, in a quoted value a
+    doubled quote is escaped and a single one closes it"""
+    i = 0
+    while True:
+        if quoted:
+            i = line.find('"', i)
+            if i < 0:
+                return True
+            if line.startswith('"', i + 1):
+                i += 2
+                continue
+            quoted = False
+        elif line.startswith('"', i):
+            quoted = True
+            i += 1
+            continue
+        i = line.find(delimiter, i)
+        if i < 0:
+            return False
+        i += 1
+
+
+class _Feed:
+    """
+    Lines for a reader that lives across the parts of a file, it stops when
+    they run out and goes on once more are added
+    """
+
+    def __init__(self) -> None:
+        self.lines: deque[str] = deque()
+        # lines taken so far
+        self.taken: int = 0
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        try:
+            line = self.lines.popleft()
+        except IndexError:
+            raise StopIteration from None
+        self.taken += 1
+        return line
+
+
+class RecordParser:
+    """
+    Turns the text of a measurements file into rows of the user's records.
+
+    The first line is the header, its columns are matched with `COLUMNS` (a
+    generic `date,weight,fat,muscle` file and the exports of the common scale
+    apps) and the delimiter is guessed from it. Every other record is validated
+    on its own with the constraints of the records, the rejected ones are
+    counted in `result`. Times without a timezone are in the user's timezone.
+
+    The file is parsed in parts as it arrives by one reader, a record is read
+    once it ends, so a quoted value can hold line breaks. A record longer than
+    `MAX_RECORD_SIZE` is rejected as a whole
+    """
+
+    def __init__(
+        self, user_id: int, height: float, timezone: str, max_errors: int = 10
+    ) -> None:
+        self.user_id: int = user_id
+        self.height: float = height
+        # pytz's localize is most of the cost of a row, zoneinfo is attached
+        self.timezone: ZoneInfo = ZoneInfo(timezone)
+        self.max_errors: int = max_errors
+        self.result: ImportResult = ImportResult()
+        # the first line of the file, for the errors about its format
+        self.first_line: str | None = None
+        # the line of the file the last record ends on
+        self.line: int = 0
+        self._columns: dict[str, int] | None = None
+        self._delimiter: str = ","
+        self._pounds: set[str] = set()
+        # complete lines of the record that does not end yet, their size and
+        # whether they end in a quoted value, and the line that is not complete
+        # yet
+        self._record: list[str] = []
+        self._record_size: int = 0
+        self._quoted: bool = False
+        self._partial: str = ""
+        self._header_fed: bool = False
+        self._feed: _Feed = _Feed()
+        self._reader: Iterator[list[str]] | None = None
+
+    def parse(self, text: str, final: bool = False) -> list[CopyRow]:
+        """parse the next part of the file, the records that end in it. The
+        rest of a record that goes on in the next part is parsed with it
+
+        Args:
+            text (str): next part of the file
+            final (bool, optional): the last part, a record not ending with a
+            line break is parsed too. Defaults to False.
+
+        Raises:
+            UnknownFormatError: the header has no date or weight column
+
+        Returns:
+            list[CopyRow]: rows of the accepted records for `COPY_COLUMNS`
+        """
+        quotes = '"' in text or '"' in self._partial
+        lines = text.split("\n")
+        lines[0] = self._partial + lines[0]
+        self._partial = "" if final else lines.pop()
+        if self.first_line is None and lines:
+            self.first_line = lines[0].rstrip("\r")
+        if not self._header_fed:
+            lines = self._feed_header(lines)
+        rows: list[CopyRow] = []
+        if not self._record and not quotes:
+            # no quoted values, every line is a record
+            self._feed.lines.extend(line + "\n" for line in lines)
+        else:
+            for line in lines:
+                self._record.append(line + "\n")
+                self._record_size += len(line)
+                # a record ends on a line break outside of quoted values
+                self._quoted = _ends_quoted(line, self._delimiter, self._quoted)
+                if not self._quoted:
+                    self._feed.lines.extend(self._record)
+                    self._clear_record()
+                elif self._record_size > MAX_RECORD_SIZE:
+                    # the records before it are read first, for the line numbers
+                    rows += self._read()
+                    self.line = self._feed.taken + 1
+                    self._feed.taken += len(self._record)
+                    self._reject(RowError("a quoted value does not end"))
+                    self._clear_record()
+        if final:
+            self._feed.lines.extend(self._record)
+            self._clear_record()
+        rows += self._read()
+        return rows
+
+    def _feed_header(self, lines: list[str]) -> list[str]:
+        # the header is a line of its own, the delimiter is guessed from it
+        for i, line in enumerate(lines):
+            if line.strip():
+                self._delimiter = _delimiter(line.rstrip("\r"))
+                self._header_fed = True
+                self._feed.lines.extend(line + "\n" for line in lines[: i + 1])
+                return lines[i + 1 :]
+        self._feed.lines.extend(line + "\n" for line in lines)
+        return []
+
+    def _clear_record(self) -> None:
+        self._record.clear()
+        self._record_size = 0
+        self._quoted = False
+
+    def _read(self) -> list[CopyRow]:
+        rows: list[CopyRow] = []
+        if self._reader is None:
+            for line in self._feed:
+                if line.strip():
+                    self._read_header(line.rstrip("\r\n"))
+                    break
+            else:
+                return rows
+            self._reader = csv.reader(self._feed, delimiter=self._delimiter)
+        now = current_timestamp_utc()
+        while True:
+            try:
+                values = next(self._reader)
+            except StopIteration:
+                return rows
+            except csv.Error as e:
+                # the reader goes on with the next record
+                self.line = self._feed.taken
+                self._reject(RowError(str(e)))
+                continue
+            self.line = self._feed.taken
+            if not any(value.strip() for value in values):
+                continue
+            try:
+                rows.append(self._row(values, now))
+            except (RowError, ValidationError) as e:
+                self._reject(e)
+
+    @property
+    def has_header(self) -> bool:
+        return self._columns is not None
+
+    def _read_header(self, line: str) -> None:
+        columns: dict[str, int] = {}
+        headers = next(csv.reader((line,), delimiter=self._delimiter))
+        for i, header in enumerate(headers):
+            key = _header_key(header)
+            if (column := ALIASES.get(key)) is not None:
+                columns.setdefault(column, i)
+                if key.endswith(("lb", "lbs")):
+                    self._pounds.add(column)
+        if "date" not in columns and "time" in columns:
+            columns["date"] = columns.pop("time")
+        if "date" not in columns or "weight" not in columns:
+            raise UnknownFormatError(line)
+        self._columns = columns
+
+    def _value(self, values: list[str], column: str) -> float | None:
+        assert self._columns is not None
+        i = self._columns.get(column)
+        if i is None or i >= len(values):
+            return None
+        number = _number(values[i])
+        if number is not None and column in self._pounds:
+            number *= POUND
+        return number
+
+    def _row(self, values: list[str], now: datetime.datetime) -> CopyRow:
+        assert self._columns is not None
+        if len(values) <= max(self._columns["date"], self._columns["weight"]):
+            raise RowError("missing columns")
+        date = values[self._columns["date"]]
+        if "time" in self._columns and self._columns["time"] < len(values):
+            date = f"{date} {values[self._columns['time']]}"
+        measured_at = _datetime(date)
+        if measured_at.tzinfo is None:
+            measured_at = measured_at.replace(tzinfo=self.timezone)
+        weight = self._value(values, "weight")
+        if weight is None:
+            raise RowError("no weight")
+        fat_percent = _ratio(self._value(values, "fat_percent"))
+        if fat_percent is None and (fat_mass := self._value(values, "fat_mass")):
+            fat_percent = fat_mass / weight
+        muscle_percent = _ratio(self._value(values, "muscle_percent"))
+        if muscle_percent is None and (
+            muscle_mass := self._value(values, "muscle_mass")
+        ):
+            muscle_percent = muscle_mass / weight
+        record = ImportedRecord(
+            measured_at=measured_at.astimezone(datetime.UTC),
+            weight=weight,
+            height=self._value(values, "height") or self.height,
+            fat_percent=fat_percent,
+            muscle_percent=muscle_percent,
+        )
+        return (
+            self.user_id,
+            now,
+            record.measured_at,
+            now,
+            record.weight,
+            record.height,
+            record.fat_percent,
+            record.muscle_percent,
+        )
+
+    def _reject(self, error: RowError | ValidationError) -> None:
+        self.result.rejected += 1
+        if len(self.result.errors) >= self.max_errors:
+            return
+        if isinstance(error, ValidationError):
+            details = error.errors()[0]
+            reason = f"{details['loc'][0]}: {details['msg']}"
+        else:
+            reason = str(error)
+        self.result.errors.append((self.line, reason))
+
+
+async def import_records(
+    session_maker: SessionMaker,
+    chunks: AsyncIterable[bytes],
+    parser: RecordParser,
+    batch_size: int = 5000,
+) -> ImportResult:
+    """stream a measurements file into the user's records, the accepted rows
+    are loaded with COPY in batches as the file arrives, so only a chunk of the
+    file and a batch of rows are in memory. The records of the file are
+    committed together, or none of them if the import fails
+
+    Args:
+        session_maker (SessionMaker): session maker
+        chunks (AsyncIterable[bytes]): content of the file, utf-8
+        parser (RecordParser): parser of the user's file
+        batch_size (int, optional): rows per COPY. Defaults to 5000.
+
+    Raises:
+        UnknownFormatError: the header of the file is not known
+
+    Returns:
+        ImportResult: numbers of the accepted and rejected rows
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    rows: list[CopyRow] = []
+    async with session_maker() as session, session.begin():
+        conn = await session.connection()
+        raw = (await conn.get_raw_connection()).driver_connection
+
+        async def copy() -> None:
+            await raw.copy_records_to_table(
+                "paramrecord", records=rows, columns=COPY_COLUMNS
+            )
+            parser.result.accepted += len(rows)
+            rows.clear()
+
+        async for chunk in chunks:
+            rows.extend(parser.parse(decoder.decode(chunk)))
+            if len(rows) >= batch_size:
+                await copy()
+        rows.extend(parser.parse(decoder.decode(b"", final=True), final=True))
+        if rows:
+            await copy()
+    if not parser.has_header:
+        raise UnknownFormatError(parser.first_line or "")
+    return parser.result
@@ -0,0 +1,160 @@
+import asyncio
+from logging import Logger
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from ..db.session import SessionMaker
+from ..models.stats import ParamRecord
+from .stats import save_record
+
+type PendingRecord = tuple[ParamRecord, asyncio.Future[ParamRecord]]
+
+
+class RecordWriterClosedError(Exception):
+    def __init__(self) -> None:
+        super().__init__("the record writer is closed")
+
+
+class RecordWriter:
+    """
+    Write-behind of the saved records.
+
+    With a `batch_size` above 1 the records are queued and a single task inserts
+    them with one multi-row INSERT per batch, once `batch_size` records are
+    queued or `delay` seconds after the first of them. `save` returns only when
+    the batch of its record is committed. A batch rejected by a constraint is
+    inserted again one record at a time, so only the `save` of the bad record
+    fails, any other error fails every `save` waiting for the batch. With a
+    `batch_size` of 1 every record is inserted by its own `save`
+    """
+
+    def __init__(
+        self,
+        session_maker: SessionMaker,
+        logger: Logger,
+        batch_size: int = 1,
+        delay: float = 0.05,
+        maxsize: int = 10000,
+    ) -> None:
+        self.session_maker: SessionMaker = session_maker
+        self.logger: Logger = logger
+        self.batch_size: int = batch_size
+        self.delay: float = delay
+        self._queue: asyncio.Queue[PendingRecord] = asyncio.Queue(maxsize)
+        self._task: asyncio.Task | None = None
+        self.closed: bool = False
+        self.saved: int = 0
+        self.failed: int = 0
+        self.batches: int = 0
+        self.max_batch: int = 0
+
+    async def save(self, record: ParamRecord) -> ParamRecord:
+        """save the record, returns once it is committed
+
+        Args:
+            record (ParamRecord): record to save
+
+        Raises:
+            RecordWriterClosedError: the writer is closed
+
+        Returns:
+            ParamRecord: saved record
+        """
+        if self.closed:
+            raise RecordWriterClosedError()
+        if self.batch_size <= 1:
+            try:
+                record = await save_record(self.session_maker, record)
+            except Exception:
+                self.failed += 1
+                raise
+            self.saved += 1
+            return record
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="record-writer")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.delay
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0 or self.closed:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            await self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch: list[PendingRecord]) -> None:
+        # ordered by the parameters, the n-th returned row is the n-th record
+        statement = insert(ParamRecord).returning(
+            ParamRecord, sort_by_parameter_order=True
+        )
+        rows = [record.model_dump(exclude={"id"}) for record, _ in batch]
+        try:
+            async with self.session_maker() as session, session.begin():
+                res = await session.execute(statement, rows)
+                saved = list(res.scalars())
+        except IntegrityError:
+            self.logger.warning(
+                f"a batch of {len(batch)} records was rejected, saving them one by one"
+            )
+            await self._flush_each(batch)
+            return
+        except Exception as e:
+            self.failed += len(batch)
+            self.logger.exception(f"could not save a batch of {len(batch)} records")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.saved += len(batch)
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        for (_, future), record in zip(batch, saved, strict=True):
+            if not future.done():
+                future.set_result(record)
+
+    async def _flush_each(self, batch: list[PendingRecord]) -> None:
+        for record, future in batch:
+            try:
+                saved = await save_record(self.session_maker, record)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.saved += 1
+            if not future.done():
+                future.set_result(saved)
+
+    async def close(self) -> None:
+        """stop accepting records and wait until the queued ones are saved"""
+        self.closed = True
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "saved": self.saved,
+            "failed": self.failed,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "queued": self._queue.qsize(),
+        }
@@ -1,10 +1,151 @@
+import datetime
+from dataclasses import dataclass
+
+from sqlalchemy import and_, func, insert, tuple_
+from sqlmodel import col, select
+
 from ..db.session import SessionMaker
-from ..models.stats import ParamRecord
+from ..models.stats import DailyRollup, ParamRecord, UserSummary
+from ..utils.time import current_timestamp_utc
+
+
+@dataclass(frozen=True)
+class Summary:
+    records: int
+    first: datetime.datetime
+    last: datetime.datetime
+    # the latest weight and its change since the first record
+    weight: float
+    change: float
+    weight_min: float
+    weight_max: float
+    # average weight of the records of the last days by the number of days,
+    # None without records in them
+    averages: dict[int, float | None]
 
 
 async def save_record(session_maker: SessionMaker, record: ParamRecord) -> ParamRecord:
+    """insert the record, the stored row with its id comes back from the same
+    statement
+
+    Args:
+        session_maker (SessionMaker): session maker
+        record (ParamRecord): record to save
+
+    Returns:
+        ParamRecord: saved record
+    """
+    statement = (
+        insert(ParamRecord)
+        .values(**record.model_dump(exclude={"id"}))
+        .returning(ParamRecord)
+    )
+    async with session_maker() as session:
+        # a single statement, no transaction around it
+        await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        res = await session.execute(statement)
+        return res.scalar_one()
+
+
+async def get_records(
+    session_maker: SessionMaker,
+    user_id: int,
+    limit: int = 50,
+    after: ParamRecord | None = None,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+) -> list[ParamRecord]:
+    """get a page of the user's records that are not deleted, newest first
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        limit (int, optional): page size. Defaults to 50.
+        after (ParamRecord | None, optional): last record of the previous page,
+        the page starts right after it. Defaults to None.
+        since (datetime.datetime | None, optional): only records measured at or
+        after this time. Defaults to None.
+        until (datetime.datetime | None, optional): only records measured before
+        this time. Defaults to None.
+
+    Returns:
+        list[ParamRecord]: at most `limit` records ordered by `measured_at` desc
+    """
+    query = select(ParamRecord).where(
+        ParamRecord.user_id == user_id, col(ParamRecord.deleted_at).is_(None)
+    )
+    if after is not None:
+        query = query.where(
+            tuple_(ParamRecord.measured_at, ParamRecord.id)
+            < tuple_(after.measured_at, after.id)
+        )
+    if since is not None:
+        query = query.where(ParamRecord.measured_at >= since)
+    if until is not None:
+        query = query.where(ParamRecord.measured_at < until)
+    query = query.order_by(
+        col(ParamRecord.measured_at).desc(), col(ParamRecord.id).desc()
+    ).limit(limit)
+    async with session_maker() as session:
+        res = await session.execute(query)
+        return list(res.scalars())
+
+
+async def get_summary(
+    session_maker: SessionMaker,
+    user_id: int,
+    windows: tuple[int, ...] = (7, 30),
+    today: datetime.date | None = None,
+) -> Summary | None:
+    """get the summary of the user's records from the rollups with a single
+    query, it reads the user's summary row and the daily rollups of the longest
+    window instead of the records
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        windows (tuple[int, ...], optional): numbers of days up to today to
+        average the weight over. Defaults to (7, 30).
+        today (datetime.date | None, optional): last day of the windows, UTC
+        days like the rollups. Defaults to None, the current day.
+
+    Returns:
+        Summary | None: summary, None without records
+    """
+    if today is None:
+        today = current_timestamp_utc().date()
+    averages = []
+    for days in windows:
+        recent = col(DailyRollup.day) > today - datetime.timedelta(days=days)
+        averages.append(
+            func.sum(DailyRollup.weight_sum).filter(recent)
+            / func.sum(DailyRollup.records).filter(recent)
+        )
+    query = (
+        select(UserSummary, *averages)
+        .outerjoin(
+            DailyRollup,
+            and_(
+                col(DailyRollup.user_id) == UserSummary.user_id,
+                col(DailyRollup.day)
+                > today - datetime.timedelta(days=max(windows, default=0)),
+            ),
+        )
+        .where(UserSummary.user_id == user_id)
+        .group_by(col(UserSummary.user_id))
+    )
     async with session_maker() as session:
-        session.add(record)
-        await session.commit()
-        await session.refresh(record)
-    return record
+        row = (await session.execute(query)).one_or_none()
+    if row is None:
+        return None
+    summary, *values = row
+    return Summary(
+        records=summary.records,
+        first=summary.first_measured_at,
+        last=summary.last_measured_at,
+        weight=summary.last_weight,
+        change=summary.last_weight - summary.first_weight,
+        weight_min=summary.weight_min,
+        weight_max=summary.weight_max,
+        averages=dict(zip(windows, values, strict=True)),
+    )
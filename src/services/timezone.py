@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import aiohttp
+from aiogram.types import Location
+
+from ..utils.cache import SingleFlight, TTLCache
+from ..utils.time import TimezoneApiError
+from ..utils.tz_index import TimezoneIndex, nautical_timezone
+
+type CoordinatesKey = tuple[float, float]
+
+RETRYABLE_API_STATUSES = frozenset({"UNKNOWN_ERROR", "OVER_QUERY_LIMIT"})
+
+
+class TimezoneResolver:
+    """
+    Resolves a location into an IANA timezone name.
+
+    If an offline `TimezoneIndex` is given it answers first. Locations that are
+    outside of every timezone polygon (open sea) are resolved with the Google
+    Time Zone API if `api_fallback` is set, otherwise with the nautical zone.
+
+    All API requests share one HTTP client, every attempt is bounded by `timeout`
+    and failed attempts are retried at most `retries` times. Results are cached
+    by coordinates rounded to `precision` decimal places and concurrent lookups
+    of the same rounded coordinates share a single request
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str,
+        timeout: float = 3.0,
+        retries: int = 2,
+        cache_size: int = 4096,
+        cache_ttl: float = 86400.0,
+        precision: int = 2,
+        index: TimezoneIndex | None = None,
+        api_fallback: bool = True,
+    ) -> None:
+        self.api_key: str = api_key
+        self.api_url: str = api_url
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.precision: int = precision
+        self.index: TimezoneIndex | None = index
+        self.api_fallback: bool = api_fallback
+        self.cache: TTLCache[CoordinatesKey, str] = TTLCache(cache_size, cache_ttl)
+        self._session: aiohttp.ClientSession | None = None
+        self._single_flight: SingleFlight[CoordinatesKey, str] = SingleFlight()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def _key(self, location: Location) -> CoordinatesKey:
+        return (
+            round(location.latitude, self.precision),
+            round(location.longitude, self.precision),
+        )
+
+    async def resolve(self, location: Location) -> str:
+        if self.index is not None:
+            timezone = self.index.lookup(location.latitude, location.longitude)
+            if timezone is not None:
+                return timezone
+            if not self.api_fallback:
+                return nautical_timezone(location.longitude)
+        key = self._key(location)
+        timezone = self.cache.get(key)
+        if timezone is not None:
+            return timezone
+        return await self._single_flight.do(key, lambda: self._load(key))
+
+    async def _load(self, key: CoordinatesKey) -> str:
+        timezone = await self._request(*key)
+        self.cache.set(key, timezone)
+        return timezone
+
+    async def _request(self, latitude: float, longitude: float) -> str:
+        params = {
+            "location": f"{latitude},{longitude}",
+            "timestamp": str(int(time.time())),
+            "key": self.api_key,
+        }
+        error = TimezoneApiError("no attempts were made")
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+            try:
+                async with self._get_session().get(
+                    self.api_url, params=params
+                ) as response:
+                    if response.status >= 500:
+                        error = TimezoneApiError(str(response.status))
+                        continue
+                    if response.status != 200:
+                        raise TimezoneApiError(str(response.status))
+                    data = await response.json(content_type=None)
+            except (TimeoutError, aiohttp.ClientError) as e:
+                error = TimezoneApiError(type(e).__name__)
+                continue
+            if data["status"] in RETRYABLE_API_STATUSES:
+                error = TimezoneApiError(data["status"])
+                continue
+            if data["status"] != "OK":
+                raise TimezoneApiError(data["status"])
+            return data["timeZoneId"]
+        raise error
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,238 @@
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlmodel import col, select
+
+from ..db.session import SessionMaker
+from ..models.stats import ParamRecord
+
+type FloatArray = npt.NDArray[np.float64]
+
+DAY = 86400.0
+WEEK = 7 * DAY
+# the smoothing starts over from its last value after this many time constants,
+# so the growth factors of a block stay far from overflowing
+SMOOTHING_BLOCK = 500
+
+
+@dataclass(frozen=True)
+class Series:
+    """Columns of a user's records, oldest first"""
+
+    # seconds since the epoch
+    t: FloatArray
+    weight: FloatArray
+    # nan where the record has no value
+    fat_percent: FloatArray
+    muscle_percent: FloatArray
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @property
+    def fat_weight(self) -> FloatArray:
+        """`ParamRecord.fat_weight` of every record, nan where it is None"""
+        return _mass(self.weight, self.fat_percent)
+
+    @property
+    def muscle_weight(self) -> FloatArray:
+        """`ParamRecord.muscle_weight` of every record, nan where it is None"""
+        return _mass(self.weight, self.muscle_percent)
+
+
+@dataclass(frozen=True)
+class ComponentTrend:
+    # the latest value, its moving average and its smoothed value
+    value: float
+    average: float
+    smoothed: float
+    # kg per week, None without two records at different times in the window
+    weekly_rate: float | None
+
+
+@dataclass(frozen=True)
+class Trend:
+    points: int
+    first: datetime.datetime
+    last: datetime.datetime
+    weight: ComponentTrend
+    fat_weight: ComponentTrend | None
+    muscle_weight: ComponentTrend | None
+
+
+def _mass(weight: FloatArray, ratio: FloatArray) -> FloatArray:
+    # a zero ratio has no mass either, like in the properties of the record
+    return np.where(ratio > 0, weight * ratio, np.nan)
+
+
+async def fetch_series(
+    session_maker: SessionMaker,
+    user_id: int,
+    since: datetime.datetime | None = None,
+) -> Series:
+    """fetch the user's records that are not deleted as columns with a single
+    query, the database aggregates every column into one array
+
+    Args:
+        session_maker (SessionMaker): session maker
+        user_id (int): user id
+        since (datetime.datetime | None, optional): only records measured at or
+        after this time. Defaults to None.
+
+    Returns:
+        Series: columns of the records ordered by `measured_at`
+    """
+    order = (col(ParamRecord.measured_at), col(ParamRecord.id))
+    query = select(
+        *(
+            func.array_agg(aggregate_order_by(column, *order))
+            for column in (
+                # double precision, `extract` is numeric and decoded as Decimal
+                func.date_part("epoch", ParamRecord.measured_at),
+                col(ParamRecord.weight),
+                col(ParamRecord.fat_percent),
+                col(ParamRecord.muscle_percent),
+            )
+        )
+    ).where(ParamRecord.user_id == user_id, col(ParamRecord.deleted_at).is_(None))
+    if since is not None:
+        query = query.where(ParamRecord.measured_at >= since)
+    async with session_maker() as session:
+        columns = (await session.execute(query)).one()
+    # a user without records gets NULL arrays, a NULL value becomes nan
+    t, weight, fat_percent, muscle_percent = (
+        np.array(column or (), dtype=np.float64) for column in columns
+    )
+    return Series(t, weight, fat_percent, muscle_percent)
+
+
+def moving_average(t: FloatArray, values: FloatArray, window: float) -> FloatArray:
+    """mean of the values measured in the `window` seconds up to every point,
+    with any spacing between the points
+
+    Args:
+        t (FloatArray): sorted times in seconds
+        values (FloatArray): values at the times
+        window (float): length of the window in seconds
+
+    Returns:
+        FloatArray: moving average at every point
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(t) + 1)
+    start = np.searchsorted(t, t - window, side="right")
+    return (sums[end] - sums[start]) / (end - start)
+
+
+def smooth(t: FloatArray, values: FloatArray, tau: float) -> FloatArray:
+    """exponential smoothing for irregularly spaced points: every point pulls
+    the smoothed value towards it by `1 - exp(-dt / tau)` of the difference,
+    where `dt` is the time since the previous point
+
+    Args:
+        t (FloatArray): sorted times in seconds
+        values (FloatArray): values at the times
+        tau (float): time constant in seconds
+
+    Returns:
+        FloatArray: smoothed value at every point, it starts at the first value
+    """
+    smoothed = np.empty_like(values)
+    if not len(t):
+        return smoothed
+    state, previous = values[0], t[0]
+    start = 0
+    while start < len(t):
+        stop = max(
+            int(np.searchsorted(t, t[start] + SMOOTHING_BLOCK * tau, side="right")),
+            start + 1,
+        )
+        block_t, block_values = t[start:stop], values[start:stop]
+        # s_i = d_i * s_(i-1) + (1 - d_i) * v_i unrolled: with g_i = 1 / prod(d)
+        # s_i = (s_0 + sum((1 - d_k) * v_k * g_k)) / g_i
+        decay = np.exp(-np.diff(block_t, prepend=previous) / tau)
+        growth = np.exp((block_t - block_t[0]) / tau)
+        terms = (1 - decay) * block_values * growth
+        terms[0] += decay[0] * state
+        smoothed[start:stop] = np.cumsum(terms) / growth
+        state, previous = smoothed[stop - 1], block_t[-1]
+        start = stop
+    return smoothed
+
+
+def weekly_rate(t: FloatArray, values: FloatArray, window: float) -> float | None:
+    """least squares slope of the values of the last `window` seconds
+
+    Args:
+        t (FloatArray): sorted times in seconds
+        values (FloatArray): values at the times
+        window (float): length of the window in seconds
+
+    Returns:
+        float | None: change per week, None without two points at different
+        times in the window
+    """
+    if not len(t):
+        return None
+    recent = t >= t[-1] - window
+    x, y = t[recent], values[recent]
+    x = x - x.mean()
+    spread = float(x @ x)
+    if spread == 0:
+        return None
+    return float(x @ (y - y.mean())) / spread * WEEK
+
+
+def _component(
+    t: FloatArray, values: FloatArray, window: float, tau: float, rate_window: float
+) -> ComponentTrend | None:
+    measured = ~np.isnan(values)
+    t, values = t[measured], values[measured]
+    if not len(t):
+        return None
+    return ComponentTrend(
+        value=float(values[-1]),
+        average=float(moving_average(t, values, window)[-1]),
+        smoothed=float(smooth(t, values, tau)[-1]),
+        weekly_rate=weekly_rate(t, values, rate_window),
+    )
+
+
+def compute_trend(
+    series: Series,
+    window: float = WEEK,
+    tau: float = 10 * DAY,
+    rate_window: float = 4 * WEEK,
+) -> Trend | None:
+    """compute the trends of the weight and of the fat and muscle masses, each
+    of them from the records that have it
+
+    Args:
+        series (Series): records of the user
+        window (float, optional): moving average window in seconds. Defaults to
+        WEEK.
+        tau (float, optional): smoothing time constant in seconds. Defaults to
+        10 days.
+        rate_window (float, optional): seconds of the latest records the weekly
+        rates are fitted to. Defaults to 4 weeks.
+
+    Returns:
+        Trend | None: trends at the latest record, None without records
+    """
+    weight = _component(series.t, series.weight, window, tau, rate_window)
+    if weight is None:
+        return None
+    return Trend(
+        points=len(series),
+        first=datetime.datetime.fromtimestamp(series.t[0], datetime.UTC),
+        last=datetime.datetime.fromtimestamp(series.t[-1], datetime.UTC),
+        weight=weight,
+        fat_weight=_component(series.t, series.fat_weight, window, tau, rate_window),
+        muscle_weight=_component(
+            series.t, series.muscle_weight, window, tau, rate_window
+        ),
+    )
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from logging import Logger
+
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+
+class UpdateQueue:
+    """
+    Bounded queue of incoming updates processed by `workers` worker tasks.
+
+    Every worker owns a shard of the queue and the shard of an update is chosen
+    by its chat (or user), so updates of one chat are processed one at a time in
+    the order they were put. A shard holds at most `maxsize` updates, `put`
+    refuses updates beyond that
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Update], Awaitable[None]],
+        logger: Logger,
+        workers: int = 8,
+        maxsize: int = 1000,
+    ) -> None:
+        self.process: Callable[[Update], Awaitable[None]] = process
+        self.logger: Logger = logger
+        self.workers: int = workers
+        self.maxsize: int = maxsize
+        self._shards: list[asyncio.Queue[tuple[float, Update]]] = [
+            asyncio.Queue(maxsize) for _ in range(workers)
+        ]
+        self._tasks: list[asyncio.Task] = []
+        self.accepting: bool = False
+        self.accepted: int = 0
+        self.rejected: int = 0
+        # updates processed without an error, the others are failed
+        self.processed: int = 0
+        self.failed: int = 0
+        self.max_depth: int = 0
+        # seconds the last processed update waited in the queue
+        self.last_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    def _shard(self, update: Update) -> asyncio.Queue[tuple[float, Update]]:
+        context = UserContextMiddleware.resolve_event_context(update)
+        key = context.chat_id if context.chat_id is not None else context.user_id
+        if key is None:
+            key = update.update_id
+        return self._shards[key % self.workers]
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._work(shard), name=f"update-worker-{i}")
+            for i, shard in enumerate(self._shards)
+        ]
+        self.accepting = True
+
+    def put(self, update: Update) -> bool:
+        """queue the update without waiting
+
+        Args:
+            update (Update): update to process
+
+        Returns:
+            bool: False if the update was refused because the queue is stopped
+            or the shard of the update is full
+        """
+        if not self.accepting:
+            self.rejected += 1
+            return False
+        try:
+            self._shard(update).put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    async def _work(self, shard: asyncio.Queue[tuple[float, Update]]) -> None:
+        while True:
+            queued_at, update = await shard.get()
+            self.last_wait = time.monotonic() - queued_at
+            self.max_wait = max(self.max_wait, self.last_wait)
+            try:
+                await self.process(update)
+            except Exception:
+                self.failed += 1
+                self.logger.exception(f"failed to process update {update.update_id}")
+            else:
+                self.processed += 1
+            finally:
+                shard.task_done()
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """stop accepting updates, wait until the queued ones are processed and
+        stop the workers
+
+        Args:
+            timeout (float | None, optional): seconds to wait for the queued
+            updates, the rest is dropped. Defaults to None, wait for all.
+        """
+        self.accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.join() for shard in self._shards)), timeout
+            )
+        except TimeoutError:
+            self.logger.warning(f"dropped {self.depth} queued updates on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_wait": self.last_wait,
+            "max_wait": self.max_wait,
+        }
@@ -1,7 +1,9 @@
 from logging import Logger
 
 from aiogram.types import Message
-from sqlmodel import select
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, select
 
 from ..db.session import SessionMaker
 from ..models.stats import Height
@@ -10,8 +12,8 @@ from ..models.user import (
     TUser,
     User,
     UserAlreadyExistsError,
-    UserNotRegisteredError,
 )
+from ..utils.cache import SingleFlight, TTLCache
 
 
 def get_telegram_user(message: Message) -> TUser:
@@ -25,23 +27,13 @@ async def get_user_if_exists(
 ) -> User | None:
     async with session_maker() as session:
         res = await session.execute(
-            select(User).where(User.telegram_id == telegram_user.id)
+            select(User).where(
+                (User.telegram_id == telegram_user.id) & (User.is_active)
+            )
         )
         return res.scalar_one_or_none()
 
 
-async def get_user(message: Message, session_maker: SessionMaker) -> User:
-    telegram_user: TUser = get_telegram_user(message)
-    async with session_maker() as session:
-        res = await session.execute(
-            select(User).where(User.telegram_id == telegram_user.id)
-        )
-        user = res.scalar_one_or_none()
-        if not user:
-            raise UserNotRegisteredError(telegram_user.id)
-        return user
-
-
 async def create_user(
     telegram_user: TUser,
     sessionmaker: SessionMaker,
@@ -49,25 +41,104 @@ async def create_user(
     height: Height,
     timezone: str,
 ) -> User:
+    """register the telegram user with a single statement: the insert of an
+    active user that already exists hits the unique index on active telegram ids
+    and returns the existing row instead
+
+    Args:
+        telegram_user (TUser): telegram user
+        sessionmaker (SessionMaker): session maker
+        logger (Logger): logger
+        height (Height): height of the user
+        timezone (str): timezone of the user
+
+    Raises:
+        UserAlreadyExistsError: the telegram id has an active user, it is in
+        the `user` attribute of the error
+
+    Returns:
+        User: created user
+    """
+    user = User(
+        telegram_id=telegram_user.id,
+        username=telegram_user.username,
+        first_name=telegram_user.first_name,
+        last_name=telegram_user.last_name,
+        height=height,
+        timezone=timezone,
+    )
+    statement = insert(User).values(**user.model_dump(exclude={"id"}))
+    statement = statement.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        index_where=col(User.is_active),
+        # a no-op update, so the existing row is returned
+        set_={"telegram_id": statement.excluded.telegram_id},
+    ).returning(User, literal_column("xmax = 0").label("inserted"))
     async with sessionmaker() as session:
-        res = await session.execute(
-            select(User).where(
-                (User.telegram_id == telegram_user.id) & (User.is_active)
-            )
-        )
-        user_or_none = res.scalar_one_or_none()
-        if user_or_none:
-            raise UserAlreadyExistsError(telegram_id=telegram_user.id)
-        user = User(
-            telegram_id=telegram_user.id,
-            username=telegram_user.username,
-            first_name=telegram_user.first_name,
-            last_name=telegram_user.last_name,
-            height=height,
-            timezone=timezone,
-        )
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-        logger.info(f"created a new user with id {user.telegram_id}")
+        # a single statement, no transaction around it
+        await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        res = await session.execute(statement)
+        user, inserted = res.one()
+    if not inserted:
+        raise UserAlreadyExistsError(telegram_id=telegram_user.id, user=user)
+    logger.info(f"created a new user with id {user.telegram_id}")
     return user
+
+
+MISSING = object()
+
+
+class UserCache:
+    """
+    Per-process cache of users by telegram id with a bounded size.
+
+    Unregistered telegram ids are cached as well, for `negative_ttl` seconds:
+    enough for a burst of updates, short because a registration through
+    another process of the bot is not seen until they expire.
+    Concurrent lookups of the same telegram id share a single query. Call `set`
+    after a user is created and `invalidate` after a user is changed
+    """
+
+    def __init__(
+        self,
+        session_maker: SessionMaker,
+        maxsize: int = 10000,
+        ttl: float = 300.0,
+        negative_ttl: float = 1.0,
+    ) -> None:
+        self.session_maker: SessionMaker = session_maker
+        self.negative_ttl: float = negative_ttl
+        self.cache: TTLCache[int, User | None] = TTLCache(maxsize, ttl)
+        self.loads: int = 0
+        self._single_flight: SingleFlight[int, User | None] = SingleFlight()
+        # ids invalidated while they were being loaded, the load result is stale
+        self._stale: set[int] = set()
+
+    async def get(self, telegram_user: TUser) -> User | None:
+        user = self.cache.get(telegram_user.id, MISSING)
+        if user is not MISSING:
+            return user
+        return await self._single_flight.do(
+            telegram_user.id, lambda: self._load(telegram_user)
+        )
+
+    async def _load(self, telegram_user: TUser) -> User | None:
+        self.loads += 1
+        user = await get_user_if_exists(telegram_user, self.session_maker)
+        if telegram_user.id in self._stale:
+            self._stale.discard(telegram_user.id)
+        else:
+            self.cache.set(telegram_user.id, user, None if user else self.negative_ttl)
+        return user
+
+    def set(self, user: User) -> None:
+        self.invalidate(user.telegram_id)
+        self.cache.set(user.telegram_id, user)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self.cache.pop(telegram_id)
+        if telegram_id in self._single_flight:
+            self._stale.add(telegram_id)
+
+    def stats(self) -> dict[str, int]:
+        return {**self.cache.stats(), "loads": self.loads}
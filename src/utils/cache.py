@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class TTLCache[K: Hashable, V]:
+    """
+    Bounded in-process LRU cache whose entries expire `ttl` seconds after
+    they were set
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self._timer = timer
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self._timer()
+
+    def get(self, key: K, default: Any = None) -> V | Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        self._data[key] = (self._timer() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class _Abandoned(Exception):
+    pass
+
+
+class SingleFlight[K: Hashable, V]:
+    """
+    Collapses concurrent calls for the same key into one: while a call for a key
+    is running, every other caller of that key waits for its result instead of
+    starting its own. If the caller running it is cancelled, a waiting caller
+    runs it instead
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[K, asyncio.Future[V]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._in_flight
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        while (running := self._in_flight.get(key)) is not None:
+            try:
+                return await asyncio.shield(running)
+            except _Abandoned:
+                # the first waiter to wake up runs it, the others wait for it
+                continue
+        future: asyncio.Future[V] = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # only this caller is cancelled, not the ones waiting
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved in case nobody else is waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
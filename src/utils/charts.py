@@ -0,0 +1,75 @@
+import io
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import numpy.typing as npt
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.figure import Figure
+
+# the renderer runs in the worker processes of the chart pool, it imports no
+# module of the bot and takes only values that pickle cheaply
+
+type FloatArray = npt.NDArray[np.float64]
+# times and values of a line, oldest first
+type Line = tuple[FloatArray, FloatArray]
+
+SIZE = (8.0, 5.0)
+DPI = 100
+DAY = 86400.0
+
+
+def render_chart(
+    weight: Line,
+    fat_weight: Line,
+    muscle_weight: Line,
+    timezone: str,
+    title: str,
+) -> bytes:
+    """render the weight and the fat and muscle masses over time as a PNG, the
+    masses get a second panel when there are any
+
+    Args:
+        weight (Line): times in seconds since the epoch and weights
+        fat_weight (Line): times and fat masses, empty without them
+        muscle_weight (Line): times and muscle masses, empty without them
+        timezone (str): timezone of the dates on the axis
+        title (str): title of the chart
+
+    Returns:
+        bytes: PNG image
+    """
+    masses = [
+        (label, line)
+        for label, line in (("fat", fat_weight), ("muscle", muscle_weight))
+        if len(line[0])
+    ]
+    # no pyplot: a figure of its own per call, nothing global to clean up
+    figure = Figure(figsize=SIZE, dpi=DPI, layout="constrained")
+    axes = figure.subplots(2 if masses else 1, 1, sharex=True, squeeze=False)[:, 0]
+    t, values = weight
+    # days since the epoch are the dates of matplotlib, the points of a short
+    # history are marked
+    axes[0].plot(t / DAY, values, marker="." if len(t) < 100 else "")
+    axes[0].set_ylabel("weight, kg")
+    axes[0].set_title(title)
+    for label, (t, values) in masses:
+        axes[1].plot(t / DAY, values, label=label)
+    if masses:
+        axes[1].set_ylabel("mass, kg")
+        axes[1].legend(loc="upper left")
+    tz = ZoneInfo(timezone)
+    locator = AutoDateLocator(tz=tz)
+    axes[-1].xaxis.set_major_locator(locator)
+    axes[-1].xaxis.set_major_formatter(ConciseDateFormatter(locator, tz=tz))
+    for ax in axes:
+        ax.grid(alpha=0.3)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def warm_up() -> None:
+    """render a chart once, so the fonts and the caches of matplotlib are loaded
+    before the first chart of a worker process"""
+    t = np.array([0.0, DAY])
+    render_chart((t, t), (t, t), (t[:0], t[:0]), "UTC", "")
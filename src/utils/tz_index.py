@@ -0,0 +1,334 @@
+"""
+Offline coordinate to IANA timezone lookup.
+
+The timezone boundary polygons are compiled into a single binary file that is
+memory-mapped at runtime, so opening the index costs almost nothing and only the
+pages touched by lookups become resident.
+
+The world is split into a regular grid of `cell_deg` sized cells. A cell that
+no polygon boundary passes through is answered directly from the cell table.
+For a cell crossed by boundaries, the index stores the edges of every polygon
+that cross it together with whether the cell center is inside that polygon; a
+lookup counts how many of those edges the segment from the point to the cell
+center crosses, so it never has to look at edges outside the cell.
+
+Build the index from the dataset bundled with `tzwhere`:
+
+    python -m src.utils.tz_index static/timezones/tz_index.bin
+"""
+
+import argparse
+import bisect
+import gzip
+import importlib.resources
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+
+type Ring = Sequence[Sequence[float]]
+type Feature = tuple[str, Sequence[Ring]]
+
+MAGIC = b"TZIX"
+VERSION = 1
+HEADER = struct.Struct("<4sHHdIIIIIIII")
+UNINHABITED = "uninhabited"
+
+
+class TimezoneIndexError(Exception): ...
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def nautical_timezone(longitude: float) -> str:
+    """get the nautical `Etc/GMT` timezone for the longitude, used for points
+    that are not inside any timezone polygon (open sea)
+
+    Args:
+        longitude (float): longitude of the point
+
+    Returns:
+        str: IANA name of the nautical timezone
+    """
+    offset = max(-12, min(12, round(longitude / 15)))
+    # Etc/GMT zones have an inverted sign: Etc/GMT+5 is UTC-5
+    return "Etc/GMT" if offset == 0 else f"Etc/GMT{-offset:+d}"
+
+
+class TimezoneIndex:
+    """Memory-mapped grid index over timezone boundary polygons"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path: Path = Path(path)
+        with self.path.open("rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            byteorder,
+            self.cell_deg,
+            self.cols,
+            self.rows,
+            n_zones,
+            zones_len,
+            n_polys,
+            n_vertices,
+            n_entries,
+            n_edges,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise TimezoneIndexError(f"{self.path} is not a timezone index")
+        if byteorder != (sys.byteorder == "little"):
+            self._mmap.close()
+            raise TimezoneIndexError(f"{self.path} was built for another byte order")
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def section(fmt: str, count: int) -> memoryview:
+            nonlocal offset
+            offset = _aligned(offset)
+            size = array(fmt).itemsize * count
+            part = view[offset : offset + size].cast(fmt)
+            offset += size
+            return part
+
+        self.zones: list[str] = (
+            bytes(section("B", zones_len)).decode("utf-8").split("\n")
+        )
+        assert len(self.zones) == n_zones
+        self._poly_zone = section("H", n_polys)
+        self._vertices = section("f", 2 * n_vertices)
+        cells = self.cols * self.rows
+        self._cell_zone = section("h", cells)
+        self._cell_start = section("I", cells + 1)
+        self._entries = section("I", 4 * n_entries)
+        self._edges = section("I", n_edges)
+
+    def __enter__(self) -> "TimezoneIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for part in (
+            self._poly_zone,
+            self._vertices,
+            self._cell_zone,
+            self._cell_start,
+            self._entries,
+            self._edges,
+        ):
+            part.release()
+        self._mmap.close()
+
+    def lookup(self, latitude: float, longitude: float) -> str | None:
+        """get the timezone of the point
+
+        Args:
+            latitude (float): latitude of the point
+            longitude (float): longitude of the point
+
+        Returns:
+            str | None: IANA timezone name or None if the point is not inside
+            any timezone polygon
+        """
+        d = self.cell_deg
+        col = min(max(int((longitude + 180.0) / d), 0), self.cols - 1)
+        row = min(max(int((latitude + 90.0) / d), 0), self.rows - 1)
+        cell = row * self.cols + col
+        start, end = self._cell_start[cell], self._cell_start[cell + 1]
+        if start != end:
+            px, py = longitude, latitude
+            cx, cy = (col + 0.5) * d - 180.0, (row + 0.5) * d - 90.0
+            dx, dy = cx - px, cy - py
+            vertices, edges, entries = self._vertices, self._edges, self._entries
+            for entry in range(4 * start, 4 * end, 4):
+                inside = entries[entry + 1] == 1
+                edge_start = entries[entry + 2]
+                for k in range(edge_start, edge_start + entries[entry + 3]):
+                    v = 2 * edges[k]
+                    ax, ay, bx, by = vertices[v : v + 4]
+                    # the edge endpoints are on different sides of the segment
+                    # (half-open, so a shared vertex is counted exactly once)
+                    if ((dx * (ay - py) - dy * (ax - px)) > 0) == (
+                        (dx * (by - py) - dy * (bx - px)) > 0
+                    ):
+                        continue
+                    # and the segment endpoints are on different sides of the edge
+                    ex, ey = bx - ax, by - ay
+                    if ((ex * (py - ay) - ey * (px - ax)) > 0) != (
+                        (ex * (cy - ay) - ey * (cx - ax)) > 0
+                    ):
+                        inside = not inside
+                if inside:
+                    return self.zones[self._poly_zone[entries[entry]]]
+        zone = self._cell_zone[cell]
+        return self.zones[zone] if zone >= 0 else None
+
+
+def load_tz_world() -> Iterator[Feature]:
+    """read the timezone polygons bundled with the `tzwhere` package
+
+    Yields:
+        Feature: timezone name and the rings of one polygon
+    """
+    source = importlib.resources.files("tzwhere") / "tz_world.json.gz"
+    with source.open("rb") as raw, gzip.open(raw, "rt", encoding="utf-8") as f:
+        collection = json.load(f)
+    for feature in collection["features"]:
+        geometry = feature["geometry"]
+        polygons = (
+            [geometry["coordinates"]]
+            if geometry["type"] == "Polygon"
+            else geometry["coordinates"]
+        )
+        for polygon in polygons:
+            yield feature["properties"]["TZID"], polygon
+
+
+def build_index(
+    features: Iterable[Feature], path: str | Path, cell_deg: float = 0.25
+) -> None:
+    """compile timezone polygons into an index file
+
+    Args:
+        features (Iterable[Feature]): timezone name and rings of every polygon,
+        coordinates are (longitude, latitude) pairs
+        path (str | Path): index file to write
+        cell_deg (float, optional): grid cell size in degrees. Defaults to 0.25.
+    """
+    cols, rows = round(360 / cell_deg), round(180 / cell_deg)
+    zone_ids: dict[str, int] = {}
+    poly_zone = array("H")
+    vertices = array("f")
+    # start vertex of every edge, an edge joins a vertex with the next one
+    edge_vertex = array("I")
+    edge_poly = array("I")
+    for zone, rings in features:
+        if zone == UNINHABITED:
+            continue
+        poly = len(poly_zone)
+        poly_zone.append(zone_ids.setdefault(zone, len(zone_ids)))
+        for ring in rings:
+            first = len(vertices) // 2
+            for x, y in ring:
+                vertices.append(x)
+                vertices.append(y)
+            last = len(vertices) // 2 - 1
+            if vertices[2 * first : 2 * first + 2] != vertices[2 * last : 2 * last + 2]:
+                vertices.extend(vertices[2 * first : 2 * first + 2])
+                last += 1
+            edge_vertex.extend(range(first, last))
+            edge_poly.extend([poly] * (last - first))
+
+    def col_of(x: float) -> int:
+        return min(max(int((x + 180.0) / cell_deg), 0), cols - 1)
+
+    def row_of(y: float) -> int:
+        return min(max(int((y + 90.0) / cell_deg), 0), rows - 1)
+
+    # cell -> polygon -> edges, for every cell an edge's bounding box touches
+    cell_edges: defaultdict[int, defaultdict[int, list[int]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    # row -> polygon -> longitudes where the polygon crosses the row center line
+    row_crossings: defaultdict[int, defaultdict[int, list[float]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    for edge, (v, poly) in enumerate(zip(edge_vertex, edge_poly, strict=True)):
+        ax, ay, bx, by = vertices[2 * v : 2 * v + 4]
+        col_min, col_max = col_of(min(ax, bx)), col_of(max(ax, bx))
+        row_min, row_max = row_of(min(ay, by)), row_of(max(ay, by))
+        for row in range(row_min, row_max + 1):
+            base = row * cols
+            for col in range(col_min, col_max + 1):
+                cell_edges[base + col][poly].append(edge)
+            cy = (row + 0.5) * cell_deg - 90.0
+            if (ay > cy) != (by > cy):
+                row_crossings[row][poly].append(ax + (cy - ay) * (bx - ax) / (by - ay))
+
+    cell_zone = array("h", [-1]) * (cols * rows)
+    centers_inside: set[tuple[int, int]] = set()
+    for row, polys in row_crossings.items():
+        base = row * cols
+        for poly, xs in polys.items():
+            xs.sort()
+            for left, right in zip(xs[::2], xs[1::2], strict=False):
+                # columns whose center lies between the two crossings
+                first = max(math.ceil((left + 180.0) / cell_deg - 0.5), 0)
+                last = min(math.floor((right + 180.0) / cell_deg - 0.5), cols - 1)
+                for col in range(first, last + 1):
+                    cx = (col + 0.5) * cell_deg - 180.0
+                    # the exact parity test, the range above may be off by one
+                    if (len(xs) - bisect.bisect_right(xs, cx)) % 2 == 0:
+                        continue
+                    cell = base + col
+                    if cell in cell_edges and poly in cell_edges[cell]:
+                        centers_inside.add((cell, poly))
+                    else:
+                        cell_zone[cell] = poly_zone[poly]
+
+    cell_start = array("I", [0]) * (cols * rows + 1)
+    entries = array("I")
+    edges = array("I")
+    for cell in range(cols * rows):
+        cell_start[cell] = len(entries) // 4
+        for poly, poly_edges in cell_edges.get(cell, {}).items():
+            entries.extend(
+                (poly, (cell, poly) in centers_inside, len(edges), len(poly_edges))
+            )
+            edges.extend(edge_vertex[edge] for edge in poly_edges)
+    cell_start[cols * rows] = len(entries) // 4
+
+    zones = "\n".join(zone_ids).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        sys.byteorder == "little",
+        cell_deg,
+        cols,
+        rows,
+        len(zone_ids),
+        len(zones),
+        len(poly_zone),
+        len(vertices) // 2,
+        len(entries) // 4,
+        len(edges),
+    )
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(header)
+        for part in (
+            zones,
+            poly_zone,
+            vertices,
+            cell_zone,
+            cell_start,
+            entries,
+            edges,
+        ):
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(part)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="build the offline timezone index")
+    parser.add_argument("path", type=Path, help="index file to write")
+    parser.add_argument("--cell-deg", type=float, default=0.25, help="grid cell size")
+    args = parser.parse_args()
+    build_index(load_tz_world(), args.path, args.cell_deg)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import re
+from collections import Counter
+
+from aiogram import Dispatcher
+from aiogram.filters.callback_data import CallbackQueryFilter
+from aiogram.types import Update
+from aiogram.types.update import UpdateTypeLookupError
+from pydantic import BaseModel
+
+# telegram sends the update id first and the update type right after it
+UPDATE_TYPE = re.compile(rb'\s*\{\s*"update_id"\s*:\s*-?\d+\s*,\s*"(\w+)"\s*:')
+
+
+class CallbackQueryProbe(BaseModel):
+    data: str | None = None
+
+
+class UpdateProbe(BaseModel):
+    """Only the callback data of an update, everything else is skipped"""
+
+    callback_query: CallbackQueryProbe | None = None
+
+
+def resolve_callback_prefixes(dispatcher: Dispatcher) -> tuple[str, ...] | None:
+    """get the callback data prefixes the callback query handlers accept
+
+    Args:
+        dispatcher (Dispatcher): dispatcher with all routers included
+
+    Returns:
+        tuple[str, ...] | None: prefixes with the separator or None if some
+        handler accepts any callback data
+    """
+    prefixes: set[str] = set()
+    for router in dispatcher.chain_tail:
+        for handler in router.callback_query.handlers:
+            filters = [
+                f.callback
+                for f in handler.filters or []
+                if isinstance(f.callback, CallbackQueryFilter)
+            ]
+            if not filters:
+                return None
+            prefixes.update(
+                f.callback_data.__prefix__ + f.callback_data.__separator__
+                for f in filters
+            )
+    return tuple(sorted(prefixes))
+
+
+class UpdateDecoder:
+    """
+    Decodes webhook request bodies straight from the raw JSON into updates and
+    skips the updates no handler of the dispatcher would take before the
+    `Update` model is built: update types without handlers and callback queries
+    whose data has none of the handled callback data prefixes (buttons of old
+    keyboards)
+    """
+
+    def __init__(self, dispatcher: Dispatcher) -> None:
+        self.update_types: frozenset[str] = frozenset(
+            dispatcher.resolve_used_update_types()
+        )
+        self.callback_prefixes: tuple[str, ...] | None = resolve_callback_prefixes(
+            dispatcher
+        )
+        self.skipped: Counter[str] = Counter()
+
+    def decode(self, body: bytes) -> Update | None:
+        """decode the request body
+
+        Args:
+            body (bytes): webhook request body
+
+        Returns:
+            Update | None: the update or None if no handler would take it
+        """
+        match = UPDATE_TYPE.match(body)
+        update_type = match[1].decode() if match else None
+        if update_type is not None and update_type not in self.update_types:
+            self.skipped[update_type] += 1
+            return None
+        if self.callback_prefixes is not None and update_type in (
+            None,
+            "callback_query",
+        ):
+            callback_query = UpdateProbe.model_validate_json(body).callback_query
+            if callback_query is not None and not (
+                callback_query.data or ""
+            ).startswith(self.callback_prefixes):
+                self.skipped["callback_query"] += 1
+                return None
+        update = Update.model_validate_json(body)
+        if update_type is None:
+            # an unusual layout, check the type of the decoded update
+            try:
+                update_type = update.event_type
+            except UpdateTypeLookupError:
+                update_type = "unknown"
+            if update_type not in self.update_types:
+                self.skipped[update_type] += 1
+                return None
+        return update
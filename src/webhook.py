@@ -1,28 +1,95 @@
+import asyncio
 import logging
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from typing import Annotated
+from typing import Annotated, Any
+from urllib.parse import urlencode
 
 from aiogram.methods import TelegramMethod
-from aiogram.types import Update
-from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
+from aiogram.types import InputFile, Update
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    status,
+)
 
 from .bot import setup, shutdown_event, startup_event
 from .config import config
+from .db.session import async_engine, ping, pool_status
 from .logger import get_logger
+from .services.update_queue import UpdateQueue
+from .utils.updates import UpdateDecoder
 
 dp, bot = setup()
+update_decoder = UpdateDecoder(dp)
+
+
+async def process_update(update: Update) -> None:
+    response = await dp.feed_update(bot, update)
+    if isinstance(response, TelegramMethod):
+        await bot(response)
+
+
+async def call_method(method: TelegramMethod, logger: logging.Logger) -> None:
+    try:
+        await bot(method)
+    except Exception:
+        logger.exception(f"failed to call {method.__api_method__}")
+
+
+def webhook_response_body(method: TelegramMethod[Any]) -> str | None:
+    """serialize the method into a webhook response body, telegram executes
+    it as if it was sent to the Bot API
+
+    Args:
+        method (TelegramMethod[Any]): method returned by a handler
+
+    Returns:
+        str | None: url-encoded body or None if the method uploads files and
+        has to be sent to the Bot API
+    """
+    files: dict[str, InputFile] = {}
+    params: dict[str, str] = {"method": method.__api_method__}
+    for key, value in method.model_dump(warnings=False).items():
+        prepared = bot.session.prepare_value(value, bot=bot, files=files)
+        if prepared is not None:
+            params[key] = prepared
+    if files:
+        return None
+    return urlencode(params)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    await bot.set_webhook(config.webhook_url, secret_token=config.webhook_secret)
+    await bot.set_webhook(
+        config.webhook_url,
+        secret_token=config.webhook_secret,
+        allowed_updates=sorted(update_decoder.update_types),
+    )
     await startup_event(dp)
+    if config.webhook_queue:
+        app.state.update_queue = UpdateQueue(
+            process_update,
+            get_logger(),
+            workers=config.webhook_workers,
+            maxsize=config.webhook_queue_size,
+        )
+        app.state.update_queue.start()
     yield
+    if app.state.update_queue is not None:
+        await app.state.update_queue.drain(config.webhook_drain_timeout)
+        get_logger().info(f"update queue: {app.state.update_queue.stats()}")
     await shutdown_event(dp)
 
 
 app = FastAPI(lifespan=lifespan)
+# when set, updates are acknowledged right away and processed by its workers
+app.state.update_queue = None
 
 
 @app.get("/")
@@ -30,12 +97,35 @@ async def hello_world() -> str:
     return "Hello, World!"
 
 
+@app.get("/health/updates")
+async def health_updates(request: Request) -> dict:
+    update_queue: UpdateQueue | None = request.app.state.update_queue
+    return {
+        "queue": update_queue.stats() if update_queue else None,
+        "skipped": update_decoder.skipped,
+    }
+
+
+@app.get("/health/db")
+async def health_db() -> dict:
+    pool = pool_status(async_engine)
+    try:
+        latency = await asyncio.wait_for(ping(async_engine), config.db_pool_timeout)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": repr(e), "pool": pool},
+        ) from e
+    return {"latency": latency, "pool": pool}
+
+
 @app.post(config.webhook_path)
 async def webhook_post(
     request: Request,
     logger: Annotated[logging.Logger, Depends(get_logger)],
+    background_tasks: BackgroundTasks,
     x_telegram_bot_api_secret_token: Annotated[str | None, Header()] = None,
-) -> dict:
+) -> Any:
     logger.info("got post request")
     if x_telegram_bot_api_secret_token != config.webhook_secret:
         logger.warning("unauthorised access")
@@ -43,8 +133,23 @@ async def webhook_post(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="access denied",
         )
-    update: Update = Update.model_validate(await request.json())
-    response = await dp.feed_update(bot, update)
-    if isinstance(response, TelegramMethod):
-        await bot(response)
+    update = update_decoder.decode(await request.body())
+    if update is None:
+        return {"ok": True}
+    update_queue: UpdateQueue | None = request.app.state.update_queue
+    if update_queue is None:
+        response = await dp.feed_update(bot, update)
+        if isinstance(response, TelegramMethod):
+            body = webhook_response_body(response)
+            if body is not None:
+                # saves the request to the Bot API, its result is not needed
+                return Response(body, media_type="application/x-www-form-urlencoded")
+            background_tasks.add_task(call_method, response, logger)
+    elif not update_queue.put(update):
+        # telegram retries the update later
+        logger.warning(f"update queue is full, refused update {update.update_id}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="too many updates",
+        )
     return {"ok": True}
@@ -0,0 +1,224 @@
+"""Render latency and cache hit rate of the `/chart` charts.
+
+`USERS` users get a daily record for `DAYS` days, then:
+
+- the workers of `ChartRenderer` are started, then every window of one user is
+  rendered `REPEAT` times by `ChartRenderer` in its process pool and by
+  `render_chart` in the event loop from the same downsampled lines, while a
+  heartbeat task measures the longest the loop is blocked. The medians are
+  reported;
+- `REQUESTS` chart requests are replayed: popular users are asked for more
+  often (Zipf), the windows by `WINDOW_WEIGHTS`, and before `NEW_RECORD` of the
+  requests the user saves a record. Sent charts are remembered with a file id
+  like the handler does. The hit rate of the cache, the renders, the uploads
+  and the latency of hits and misses are reported.
+
+Needs a database: run with
+`TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_charts` from the
+repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.charts import CHART_WINDOWS, ChartRenderer
+from src.services.downsampling import downsample
+from src.services.stats import save_record
+from src.services.trends import DAY, Series, fetch_series
+from src.utils.charts import render_chart
+
+USERS = 200
+DAYS = 3 * 365
+REPEAT = 3
+REQUESTS = 3000
+NEW_RECORD = 0.05
+WORKERS = 2
+HEARTBEAT = 0.005
+WINDOW_WEIGHTS = {"week": 2, "month": 5, "year": 2, "all": 1}
+
+
+async def seed(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO "user" (telegram_id, first_name, height, is_active,
+                    timezone, created_at, modified_at)
+                SELECT g, 'John', 180, true, 'Europe/Berlin', now(), now()
+                FROM generate_series(1, :users) g
+                """
+            ),
+            {"users": USERS},
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, weight, height, fat_percent, muscle_percent)
+                SELECT u, now(), now() - d * interval '1 day', now(),
+                    70 + random() * 30, 180,
+                    CASE WHEN random() < 0.7 THEN 0.2 + random() * 0.1 END,
+                    CASE WHEN random() < 0.5 THEN 0.3 + random() * 0.1 END
+                FROM generate_series(1, :users) u, generate_series(1, :days) d
+                """
+            ),
+            {"users": USERS, "days": DAYS},
+        )
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+async def blocking(call: Callable[[], Awaitable[object]]) -> tuple[float, float]:
+    """time the call and the longest the event loop was blocked meanwhile"""
+    loop = asyncio.get_running_loop()
+    blocked = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        # a tick late by more than its interval, the loop was blocked
+        nonlocal blocked
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(HEARTBEAT)
+            blocked = max(blocked, loop.time() - start - HEARTBEAT)
+
+    task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await call()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    return elapsed, blocked
+
+
+async def median(call: Callable[[], Awaitable[object]]) -> tuple[float, float]:
+    runs = [await blocking(call) for _ in range(REPEAT)]
+    return (
+        statistics.median(elapsed for elapsed, _ in runs),
+        statistics.median(blocked for _, blocked in runs),
+    )
+
+
+async def render_latency(session_maker: SessionMaker, user: User) -> None:
+    renderer = ChartRenderer(session_maker, workers=WORKERS)
+    start = time.perf_counter()
+    await renderer.start()
+    print(f"{WORKERS} workers started in {time.perf_counter() - start:.1f}s")
+    series = await fetch_series(session_maker, user.id or 0)
+    print("chart ms (longest block of the event loop ms):")
+    for window, days in CHART_WINDOWS.items():
+
+        async def render(window=window) -> None:
+            renderer.cache.clear()
+            await renderer.get(user, window)
+
+        pool = await median(render)
+        recent = series.t >= series.t[-1] - (days or DAYS) * DAY
+        lines = downsample(
+            Series(
+                series.t[recent],
+                series.weight[recent],
+                series.fat_percent[recent],
+                series.muscle_percent[recent],
+            ),
+            renderer.points,
+        )
+
+        async def inline(lines=lines) -> None:
+            render_chart(
+                lines.weight,
+                lines.fat_weight,
+                lines.muscle_weight,
+                user.timezone,
+                "",
+            )
+
+        loop = await median(inline)
+        print(
+            f"  {window:<5} {int(recent.sum()):>5} points:"
+            f" pool {pool[0] * 1000:6.1f} ({pool[1] * 1000:5.1f}),"
+            f" event loop {loop[0] * 1000:6.1f} ({loop[1] * 1000:5.1f})"
+        )
+    await renderer.close()
+
+
+async def hit_rate(session_maker: SessionMaker, users: list[User]) -> None:
+    renderer = ChartRenderer(session_maker, workers=WORKERS)
+    rng = random.Random(1)
+    popularity = [1 / rank for rank in range(1, len(users) + 1)]
+    windows = list(WINDOW_WEIGHTS)
+    hits: list[float] = []
+    misses: list[float] = []
+    file_ids = 0
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        user = rng.choices(users, popularity)[0]
+        window = rng.choices(windows, list(WINDOW_WEIGHTS.values()))[0]
+        if rng.random() < NEW_RECORD:
+            record = ParamRecord(
+                user_id=user.id,
+                weight=80,
+                height=180,
+                fat_percent=None,
+                muscle_percent=None,
+            )
+            await save_record(session_maker, record)
+        renders = renderer.renders
+        request_start = time.perf_counter()
+        chart = await renderer.get(user, window)
+        elapsed = time.perf_counter() - request_start
+        assert chart is not None
+        (misses if renderer.renders > renders else hits).append(elapsed)
+        if isinstance(chart.photo, bytes):
+            renderer.remember(chart.key, f"file-{i}")
+        else:
+            file_ids += 1
+    total = time.perf_counter() - start
+    stats = renderer.stats()
+    await renderer.close()
+    print(
+        f"{REQUESTS} requests in {total:.1f}s: hit rate"
+        f" {len(hits) / REQUESTS:.1%}, {stats['renders']} renders,"
+        f" {stats['uploads']} uploads, {file_ids} sent by file id"
+    )
+    for name, times in (("hit", hits), ("miss", misses)):
+        times.sort()
+        print(
+            f"  {name:<4} median {statistics.median(times) * 1000:7.2f} ms,"
+            f" p95 {times[int(len(times) * 0.95)] * 1000:7.2f} ms"
+        )
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    await seed(engine)
+    async with session_maker() as session:
+        users = list((await session.execute(select(User).order_by(User.id))).scalars())
+    print(f"{USERS} users, {DAYS} daily records each")
+    await render_latency(session_maker, users[0])
+    await hit_rate(session_maker, users)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Session acquire latency of the engine's pool under concurrent load.
+
+Bursts of concurrent handlers each open a session, take its connection and
+run a short query, the time until the connection is there is the acquire
+latency. The pool settings are compared with SQLAlchemy's defaults, with and
+without warming the pool and pre-pinging. Needs a database (a local Postgres
+container is fine): run with `TEST_DB_URL=postgresql+asyncpg://...
+python -m tests.bench_db_pool` from the repository root.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.db.session import warm_pool
+
+BURSTS = 20
+CONCURRENCY = 20
+PAUSE = 0.05
+QUERY = text("SELECT pg_sleep(0.002)")
+SETTINGS: dict[str, dict[str, Any]] = {
+    "defaults (5 + 10 overflow)": {},
+    "pool 20 + 10 overflow, cold": {"pool_size": 20, "max_overflow": 10},
+    "pool 20 + 10 overflow, warm": {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "warmup": True,
+    },
+    "pool 20 + 10, warm, pre-ping": {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "warmup": True,
+        "pool_pre_ping": True,
+    },
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    return sorted(values)[min(int(len(values) * q), len(values) - 1)]
+
+
+async def run(name: str, url: str, settings: dict[str, Any]) -> None:
+    settings = dict(settings)
+    warmup = settings.pop("warmup", False)
+    engine = create_async_engine(url, **settings)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    if warmup:
+        await warm_pool(engine, settings["pool_size"])
+    latencies: list[float] = []
+
+    async def handler() -> None:
+        start = time.perf_counter()
+        async with session_maker() as session:
+            await session.connection()
+            latencies.append(time.perf_counter() - start)
+            await session.execute(QUERY)
+
+    first_burst: list[float] = []
+    start = time.perf_counter()
+    for burst in range(BURSTS):
+        await asyncio.gather(*(handler() for _ in range(CONCURRENCY)))
+        if burst == 0:
+            first_burst = list(latencies)
+        await asyncio.sleep(PAUSE)
+    elapsed = time.perf_counter() - start - BURSTS * PAUSE
+    print(
+        f"  {name:<30} acquire p50 {percentile(latencies, 0.5) * 1e3:6.2f}ms"
+        f" p99 {percentile(latencies, 0.99) * 1e3:6.2f}ms,"
+        f" first burst p99 {percentile(first_burst, 0.99) * 1e3:6.2f}ms,"
+        f" {len(latencies) / elapsed:5.0f} sessions/s"
+    )
+    await engine.dispose()
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    print(f"{BURSTS} bursts of {CONCURRENCY} concurrent sessions:")
+    for name, settings in SETTINGS.items():
+        await run(name, url, settings)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""Downsampling of long histories for `/chart`: every record against the records
+reduced by the database and `lttb`.
+
+For every density a user gets `YEARS` years of records (`density` readings a
+day at random times, some of them soft deleted), then the lines of the chart
+are built three ways: every record with `fetch_series` and drawn as is, every
+record reduced by `downsample`, and `fetch_downsampled` reducing the records to
+the extremes of time buckets in the database first. The fetch, the reduction
+and the render are timed (medians of `REPEAT` runs), and the points drawn and
+whether the lowest and highest weight are kept are reported. Needs a database:
+run with `TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_downsampling`
+from the repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from collections.abc import Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord  # noqa: F401
+from src.models.user import User  # noqa: F401
+from src.services.downsampling import Lines, downsample, fetch_downsampled
+from src.services.trends import Series, fetch_series
+from src.utils.charts import render_chart
+
+YEARS = 5
+DENSITIES = (1, 10, 24)
+POINTS = 500
+REPEAT = 3
+
+
+async def seed(engine: AsyncEngine, density: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO "user" (telegram_id, first_name, height, is_active,
+                    timezone, created_at, modified_at)
+                VALUES (1, 'John', 180, true, 'UTC', now(), now())
+                """
+            )
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, deleted_at, weight, height, fat_percent,
+                    muscle_percent)
+                SELECT 1, now(),
+                    now() - (g + random()) * interval '1 day' / :density,
+                    now(), CASE WHEN random() < 0.02 THEN now() END,
+                    80 + 8 * sin(g / (30.0 * :density)) + random() * 2
+                        + CASE WHEN random() < 0.001 THEN 15 ELSE 0 END,
+                    180,
+                    CASE WHEN random() < 0.7 THEN 0.2 + random() * 0.02 END,
+                    CASE WHEN random() < 0.5 THEN 0.35 + random() * 0.02 END
+                FROM generate_series(0, :records - 1) g
+                """
+            ),
+            {"density": density, "records": YEARS * 365 * density},
+        )
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+def raw_lines(series: Series) -> Lines:
+    def line(values):
+        measured = values == values
+        return series.t[measured], values[measured]
+
+    return Lines(
+        line(series.weight), line(series.fat_weight), line(series.muscle_weight)
+    )
+
+
+def render(lines: Lines) -> bytes:
+    return render_chart(lines.weight, lines.fat_weight, lines.muscle_weight, "UTC", "")
+
+
+def timed[T](call: Callable[[], T]) -> tuple[T, float]:
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+async def run(session_maker: SessionMaker, density: int) -> None:
+    ways: dict[str, list[tuple[float, float, float]]] = {}
+    drawn: dict[str, Lines] = {}
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        series = await fetch_series(session_maker, 1)
+        fetched = time.perf_counter() - start
+        lines, reduced = timed(lambda series=series: downsample(series, POINTS))
+        raw = raw_lines(series)
+        for name, way, reduce in (
+            ("every record", raw, 0.0),
+            ("lttb", lines, reduced),
+        ):
+            _, rendered = timed(lambda way=way: render(way))
+            ways.setdefault(name, []).append((fetched, reduce, rendered))
+            drawn[name] = way
+
+        start = time.perf_counter()
+        lines = await fetch_downsampled(session_maker, 1, POINTS)
+        elapsed = time.perf_counter() - start
+        _, rendered = timed(lambda lines=lines: render(lines))
+        # the fetch and the reduction are one call, reported as the fetch
+        ways.setdefault("database + lttb", []).append((elapsed, 0.0, rendered))
+        drawn["database + lttb"] = lines
+
+    weight = drawn["every record"].weight[1]
+    print(f"  {density:>2} a day, {len(weight):>6} records:")
+    for name, runs in ways.items():
+        fetched, reduced, rendered = (
+            statistics.median(run[i] for run in runs) for i in range(3)
+        )
+        lines = drawn[name]
+        points = sum(len(line[0]) for line in lines.__dict__.values())
+        extremes = (lines.weight[1].min(), lines.weight[1].max()) == (
+            weight.min(),
+            weight.max(),
+        )
+        print(
+            f"    {name:<15} fetch {fetched * 1000:7.1f} ms,"
+            f" reduce {reduced * 1000:6.1f} ms, render {rendered * 1000:7.1f} ms,"
+            f" total {(fetched + reduced + rendered) * 1000:7.1f} ms,"
+            f" {points:>6} points, extremes kept: {extremes}"
+        )
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    print(f"{YEARS} years of records, {POINTS} points per line:")
+    for density in DENSITIES:
+        await seed(engine, density)
+        await run(session_maker, density)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""Time and peak RSS of exporting a long measurement history.
+
+Seeds a user with `RECORDS` records and exports them as the `/export` document
+would be uploaded: the chunks of `RecordExport` (CSV and NDJSON) are read and
+dropped, the way a socket takes them. For comparison the whole history is
+loaded through `User.records` and encoded into one CSV document. Every export
+runs in its own process, the peak RSS of the process is reported over its RSS
+before the export. Needs a database: run with
+`TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_exports` from the
+repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel, select
+
+from src.config import config
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.user import User
+from src.services.exports import EXPORT_COLUMNS, RecordExport
+
+RECORDS = 1_000_000
+EXPORTS = ("csv", "ndjson", "relationship")
+
+
+async def seed(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO "user" (telegram_id, first_name, height, is_active,
+                    timezone, created_at, modified_at)
+                VALUES (1, 'John', 180, true, 'Europe/Berlin', now(), now())
+                """
+            )
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, weight, height, fat_percent, muscle_percent)
+                SELECT 1, now(), now() - g * interval '1 hour', now(),
+                    70 + random() * 30, 180, 0.2 + random() * 0.1, NULL
+                FROM generate_series(1, :records) g
+                """
+            ),
+            {"records": RECORDS},
+        )
+        await conn.execute(text("ANALYZE"))
+
+
+def max_rss() -> float:
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def export(url: str, name: str) -> None:
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = (await session.execute(select(User))).scalar_one()
+    before = max_rss()
+    start = time.perf_counter()
+    size = 0
+    if name == "relationship":
+        async with session_maker() as session:
+            user = (
+                await session.execute(select(User).options(selectinload(User.records)))
+            ).scalar_one()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            local_time = user.timestamp_in_users_timezone
+            for record in user.records:
+                writer.writerow(
+                    (
+                        local_time(record.measured_at).isoformat(),
+                        record.weight,
+                        record.height,
+                        record.fat_percent,
+                        record.muscle_percent,
+                    )
+                )
+            size = len(buffer.getvalue().encode())
+    else:
+        document = RecordExport(
+            session_maker, user, name, chunk_size=config.export_chunk_size
+        )
+        async for chunk in document.read(None):  # type: ignore[arg-type]
+            size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {name:<14} {size / 2**20:6.1f} MB in {elapsed:5.1f}s,"
+        f" {RECORDS / elapsed:7.0f} rows/s,"
+        f" peak RSS +{max_rss() - before:7.1f} MB"
+    )
+    await engine.dispose()
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    await seed(engine)
+    await engine.dispose()
+    print(f"{RECORDS} records:")
+    for name in EXPORTS:
+        subprocess.run([sys.executable, "-m", "tests.bench_exports", name], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        asyncio.run(export(os.environ["TEST_DB_URL"], sys.argv[1]))
+    else:
+        asyncio.run(main())
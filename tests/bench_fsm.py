@@ -0,0 +1,162 @@
+"""FSM storage calls and queries of a full `/add_record` conversation.
+
+Runs the stats router with the regular aiogram FSM middleware and with the
+transactional one over `PostgresStorage`. Needs a database: run with
+`TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_fsm` from the
+repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.storage.memory import DisabledEventIsolation
+from aiogram.types import Update
+from aiogram.types import User as TelegramUser
+from aiogram_timepicker.main import TimeQuery
+from message_loader import MessageLoader
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.api.routers import stats
+from src.db.storage import PostgresStorage
+from src.middleware.fsm import TransactionalFSMContextMiddleware
+from src.middleware.user import UserMiddleware
+from src.services.user import UserCache, create_user
+
+CONVERSATIONS = 50
+STORAGE_METHODS = (
+    "get_state",
+    "set_state",
+    "get_data",
+    "set_data",
+    "update_data",
+    "get_record",
+    "set_record",
+)
+
+
+class CountingStorage(PostgresStorage):
+    """PostgresStorage that counts calls of its public methods"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.calls: Counter[str] = Counter()
+        for name in STORAGE_METHODS:
+            setattr(self, name, self._counted(name, getattr(self, name)))
+
+    def _counted(self, name: str, method: Any) -> Any:
+        async def counted(*args: Any, **kwargs: Any) -> Any:
+            self.calls[name] += 1
+            return await method(*args, **kwargs)
+
+        return counted
+
+
+class SwitchableMiddleware(BaseMiddleware):
+    def __init__(self) -> None:
+        self.middleware: BaseMiddleware | None = None
+
+    async def __call__(self, handler, event, data):
+        assert self.middleware is not None
+        return await self.middleware(handler, event, data)
+
+
+def conversation(chat_id: int) -> list[Update]:
+    user = {"id": chat_id, "is_bot": False, "first_name": "John"}
+    message = {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": user,
+    }
+    time_query = TimeQuery(name="stats", hour=8, minute=30, ok=True)
+    callback = {
+        "id": "1",
+        "from": user,
+        "chat_instance": "1",
+        "data": time_query.pack(),
+        "message": {**message, "text": "time"},
+    }
+    return [
+        Update.model_validate({"update_id": 1, "message": {**message, "text": text}})
+        if text
+        else Update.model_validate({"update_id": 1, "callback_query": callback})
+        for text in ("/add_record", None, "80", "20", "30")
+    ]
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    for chat_id in range(CONVERSATIONS):
+        await create_user(
+            TelegramUser(id=chat_id, is_bot=False, first_name="John"),
+            session_maker,
+            logging.getLogger(),
+            180,
+            "Europe/Berlin",
+        )
+
+    storage = CountingStorage(engine)
+    statements: Counter[str] = Counter()
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "fsm_state" in statement:
+            statements[statement.split()[0]] += 1
+
+    fsm = SwitchableMiddleware()
+    dp = Dispatcher(
+        storage=storage,
+        disable_fsm=True,
+        session_maker=session_maker,
+        user_cache=UserCache(session_maker),
+        message_loader=MessageLoader("static/messages/messages.json"),
+        logger=logging.getLogger(),
+    )
+    dp.update.outer_middleware(fsm)
+    dp.message.outer_middleware(UserMiddleware())
+    dp.callback_query.outer_middleware(UserMiddleware())
+    dp.include_router(stats.router)
+    bot = Bot("42:TEST")
+
+    for name, middleware in (
+        ("FSMContextMiddleware", FSMContextMiddleware),
+        ("TransactionalFSMContextMiddleware", TransactionalFSMContextMiddleware),
+    ):
+        fsm.middleware = middleware(storage, DisabledEventIsolation())
+        storage.calls.clear()
+        statements.clear()
+        start = time.perf_counter()
+        for chat_id in range(CONVERSATIONS):
+            for update in conversation(chat_id):
+                await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - start
+        calls = sum(storage.calls.values())
+        print(f"{name}:")
+        print(
+            f"  {calls / CONVERSATIONS:.0f} storage calls and"
+            f" {statements.total() / CONVERSATIONS:.0f} fsm queries per conversation,"
+            f" {elapsed / CONVERSATIONS * 1e3:.1f}ms per conversation"
+        )
+        print(f"  calls: {dict(storage.calls)}")
+        print(f"  queries: {dict(statements)}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Import of a large measurements file.
+
+Generates a CSV export of `ROWS` measurements (a few of them invalid) and
+imports it twice: streamed in chunks through `import_records`, the rows loaded
+with COPY in batches, and the way a whole file would be loaded otherwise, read
+at once and validated into `ParamRecord`s that are added to a session. Memory
+is the peak traced by `tracemalloc` in a second run of each import. Needs a
+database: run with `TEST_DB_URL=postgresql+asyncpg://... python -m
+tests.bench_imports` from the repository root. The tables of the database are
+recreated.
+"""
+
+import asyncio
+import csv
+import datetime
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytz
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, func, select
+
+from src.config import config
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.imports import RecordParser, import_records
+
+ROWS = 200_000
+INVALID = 0.01
+TIMEZONE = "Europe/Berlin"
+
+
+def generate(path: Path) -> None:
+    random.seed(1)
+    start = datetime.datetime(2010, 1, 1, 7, 0)
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Weight (kg)", "Fat mass (kg)", "Muscle (%)", "BMI"])
+        for i in range(ROWS):
+            weight = 70 + random.random() * 20
+            if random.random() < INVALID:
+                weight = 0
+            writer.writerow(
+                [
+                    (start + datetime.timedelta(hours=i)).isoformat(" "),
+                    f"{weight:.2f}",
+                    f"{weight * 0.2:.2f}",
+                    f"{30 + random.random() * 10:.1f}",
+                    f"{weight / 1.8**2:.1f}",
+                ]
+            )
+
+
+async def read_chunks(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as f:
+        while chunk := f.read(config.import_chunk_size):
+            yield chunk
+            await asyncio.sleep(0)
+
+
+async def reset(engine: AsyncEngine) -> User:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        user = User(telegram_id=1, first_name="John", height=180, timezone=TIMEZONE)
+        session.add(user)
+        await session.commit()
+        return user
+
+
+async def streamed(session_maker: SessionMaker, user: User, path: Path) -> int:
+    assert user.id is not None
+    parser = RecordParser(user.id, user.height, user.timezone)
+    result = await import_records(
+        session_maker, read_chunks(path), parser, config.import_batch_size
+    )
+    return result.accepted
+
+
+async def whole_file(session_maker: SessionMaker, user: User, path: Path) -> int:
+    tz = pytz.timezone(TIMEZONE)
+    records: list[ParamRecord] = []
+    for row in csv.DictReader(io.StringIO(path.read_text())):
+        weight = float(row["Weight (kg)"])
+        try:
+            record = ParamRecord.model_validate(
+                {
+                    "user_id": user.id,
+                    "measured_at": tz.localize(
+                        datetime.datetime.fromisoformat(row["Date"])
+                    ),
+                    "weight": weight,
+                    "height": user.height,
+                    "fat_percent": float(row["Fat mass (kg)"]) / weight,
+                    "muscle_percent": float(row["Muscle (%)"]) / 100,
+                }
+            )
+        except (ValidationError, ZeroDivisionError):
+            continue
+        records.append(record)
+    async with session_maker() as session:
+        session.add_all(records)
+        await session.commit()
+    return len(records)
+
+
+async def run(name: str, engine: AsyncEngine, path: Path, load) -> None:
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    user = await reset(engine)
+    start = time.perf_counter()
+    accepted = await load(session_maker, user, path)
+    elapsed = time.perf_counter() - start
+    async with session_maker() as session:
+        stored = (await session.execute(select(func.count(ParamRecord.id)))).scalar()
+    assert stored == accepted
+    # traced separately, tracing slows the import down a few times
+    user = await reset(engine)
+    tracemalloc.start()
+    await load(session_maker, user, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"  {name:<12} {accepted} rows in {elapsed:6.2f}s,"
+        f" {ROWS / elapsed:7.0f} rows/s, peak memory {peak / 2**20:7.1f} MB"
+    )
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "export.csv"
+        generate(path)
+        print(f"{ROWS} rows, {path.stat().st_size / 2**20:.1f} MB:")
+        await run("streamed", engine, path, streamed)
+        await run("whole file", engine, path, whole_file)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""Query plans and latencies of the hot queries before and after the indexes.
+
+Seeds `USERS` users with `RECORDS_PER_USER` records each (in the order they
+would arrive, a few of them soft deleted) into the schema of the initial
+migration, runs the queries, applies the remaining migrations and runs them
+again. Needs a database: run with `TEST_DB_URL=postgresql+asyncpg://...
+python -m tests.bench_indexes` from the repository root. The tables of the
+database are recreated.
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.migrations import INITIAL_SCHEMA, upgrade
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.user import User  # noqa: F401
+
+USERS = 10_000
+RECORDS_PER_USER = 200
+SAMPLES = 100
+SEED = [
+    """
+    INSERT INTO "user" (telegram_id, first_name, height, is_active, timezone,
+        created_at, modified_at)
+    SELECT g, 'John', 180, true, 'UTC', now(), now()
+    FROM generate_series(1, :users) g
+    """,
+    """
+    INSERT INTO paramrecord (user_id, created_at, measured_at, modified_at,
+        deleted_at, weight, height, fat_percent, muscle_percent)
+    SELECT u, now(), now() - d * interval '1 day' - random() * interval '12 hours',
+        now(), CASE WHEN random() < 0.05 THEN now() END, 70 + random() * 30, 180,
+        0.2 + random() * 0.1, 0.3 + random() * 0.1
+    FROM generate_series(1, :records) d, generate_series(1, :users) u
+    ORDER BY d DESC, u
+    """,
+]
+QUERIES = {
+    "user by telegram id": (
+        'SELECT * FROM "user" WHERE telegram_id = :telegram_id AND is_active'
+    ),
+    "first page of records": """
+        SELECT * FROM paramrecord WHERE user_id = :user_id AND deleted_at IS NULL
+        ORDER BY measured_at DESC, id DESC LIMIT 50
+    """,
+    "page 3 (keyset)": """
+        SELECT * FROM paramrecord WHERE user_id = :user_id AND deleted_at IS NULL
+        AND (measured_at, id) < (now() - interval '100 days', 0)
+        ORDER BY measured_at DESC, id DESC LIMIT 50
+    """,
+    "last 90 days of weights": """
+        SELECT measured_at, weight, fat_percent, muscle_percent FROM paramrecord
+        WHERE user_id = :user_id AND deleted_at IS NULL
+        AND measured_at >= now() - interval '90 days'
+        ORDER BY measured_at
+    """,
+    "weekly averages": """
+        SELECT date_trunc('week', measured_at) AS week, avg(weight)
+        FROM paramrecord WHERE user_id = :user_id AND deleted_at IS NULL
+        GROUP BY week ORDER BY week
+    """,
+}
+
+
+def params(rng: random.Random) -> dict[str, int]:
+    user = rng.randrange(1, USERS + 1)
+    return {"telegram_id": user, "user_id": user}
+
+
+async def run_queries(engine: AsyncEngine, title: str) -> None:
+    print(title)
+    rng = random.Random(0)
+    async with engine.connect() as conn:
+        for name, query in QUERIES.items():
+            plan = await conn.execute(
+                text(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {query}"), params(rng)
+            )
+            latencies = []
+            for _ in range(SAMPLES):
+                start = time.perf_counter()
+                await conn.execute(text(query), params(rng))
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            print(
+                f"  {name:<24} p50 {latencies[len(latencies) // 2] * 1e3:8.2f}ms"
+                f" p99 {latencies[int(len(latencies) * 0.99)] * 1e3:8.2f}ms"
+            )
+            for (line,) in plan:
+                if "->" in line or not line.startswith(" "):
+                    print(f"      {line}")
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS schema_version"))
+    await upgrade(engine, (INITIAL_SCHEMA,))
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        for statement in SEED:
+            await conn.execute(
+                text(statement), {"users": USERS, "records": RECORDS_PER_USER}
+            )
+    print(
+        f"seeded {USERS * RECORDS_PER_USER:,} records of {USERS:,} users"
+        f" in {time.perf_counter() - start:.0f}s"
+    )
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+    await run_queries(engine, "initial schema:")
+
+    start = time.perf_counter()
+    applied = await upgrade(engine)
+    print(
+        f"applied {', '.join(m.name for m in applied)}"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+    await run_queries(engine, "migrated schema:")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Throughput of saving records one per transaction and with the write-behind.
+
+`USERS` concurrent users finish their record forms one after another, each
+save is awaited like in the handlers (the user is confirmed once the record is
+committed). The saves go through `save_record`, a transaction per record, and
+through `RecordWriter` with a few batch sizes. The raw inserts of a batch with
+asyncpg's COPY, which does not return the stored rows, are there for
+comparison. Needs a database: run with `TEST_DB_URL=postgresql+asyncpg://...
+python -m tests.bench_record_writer` from the repository root. The tables of
+the database are recreated.
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.records import RecordWriter
+from src.services.stats import save_record
+
+USERS = 200
+RECORDS_PER_USER = 25
+BATCH_SIZES = (10, 50, 200)
+DELAY = 0.01
+
+
+def make_record(user_id: int, i: int) -> ParamRecord:
+    return ParamRecord(
+        user_id=user_id,
+        measured_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+        + datetime.timedelta(minutes=i),
+        weight=80,
+        height=180,
+        fat_percent=0.2,
+        muscle_percent=None,
+    )
+
+
+async def reset(engine: AsyncEngine) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        user = User(telegram_id=1, first_name="John", height=180, timezone="UTC")
+        session.add(user)
+        await session.commit()
+        assert user.id is not None
+        return user.id
+
+
+async def run(name: str, user_id: int, save) -> None:
+    latencies: list[float] = []
+
+    async def user() -> None:
+        for i in range(RECORDS_PER_USER):
+            start = time.perf_counter()
+            await save(make_record(user_id, i))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(USERS)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"  {name:<28} {len(latencies) / elapsed:7.0f} records/s,"
+        f" save p50 {latencies[len(latencies) // 2] * 1e3:6.1f}ms"
+        f" p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.1f}ms"
+    )
+
+
+async def copy(engine: AsyncEngine, user_id: int, batch_size: int) -> None:
+    rows = [
+        (
+            user_id,
+            record.created_at,
+            record.measured_at,
+            record.modified_at,
+            record.weight,
+            record.height,
+        )
+        for record in (make_record(user_id, i) for i in range(USERS * RECORDS_PER_USER))
+    ]
+    start = time.perf_counter()
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        for i in range(0, len(rows), batch_size):
+            async with raw.transaction():
+                await raw.copy_records_to_table(
+                    "paramrecord",
+                    records=rows[i : i + batch_size],
+                    columns=[
+                        "user_id",
+                        "created_at",
+                        "measured_at",
+                        "modified_at",
+                        "weight",
+                        "height",
+                    ],
+                )
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {f'COPY batch {batch_size}, serial':<28}"
+        f" {len(rows) / elapsed:7.0f} records/s"
+    )
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url, pool_size=10, max_overflow=10)
+    session_maker: SessionMaker = async_sessionmaker(engine, expire_on_commit=False)
+    logger = logging.getLogger()
+    print(f"{USERS} users saving {RECORDS_PER_USER} records each:")
+    user_id = await reset(engine)
+    await run("per row", user_id, lambda r: save_record(session_maker, r))
+    for batch_size in BATCH_SIZES:
+        user_id = await reset(engine)
+        writer = RecordWriter(session_maker, logger, batch_size, DELAY)
+        await run(f"write-behind, batch {batch_size}", user_id, writer.save)
+        await writer.close()
+    for batch_size in BATCH_SIZES:
+        user_id = await reset(engine)
+        await copy(engine, user_id, batch_size)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
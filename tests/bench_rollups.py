@@ -0,0 +1,133 @@
+"""Latency of a user's summary from the rollups against the records, and the
+cost of keeping the rollups on insert.
+
+For every size the user's records are seeded (a few readings a day, some of
+them soft deleted) and the rollups are rebuilt. The summary of `/stats` is then
+read `REPEAT` times with `get_summary`, which reads the user's summary row and
+at most 30 daily rollups, and with one aggregate query over the user's records
+(the covering index of `paramrecord` serves it). Last `save_record` is timed
+with the triggers of the rollups and with them disabled. Needs a database: run
+with `TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_rollups` from
+the repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.rollups import rebuild_rollups
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord
+from src.models.user import User  # noqa: F401
+from src.services.stats import get_summary, save_record
+
+SIZES = (1_000, 100_000, 1_000_000)
+REPEAT = 200
+
+FROM_RECORDS = """
+SELECT count(*), min(weight), max(weight),
+    (array_agg(weight ORDER BY measured_at DESC, id DESC))[1]
+        - (array_agg(weight ORDER BY measured_at, id))[1],
+    (array_agg(weight ORDER BY measured_at DESC, id DESC))[1],
+    avg(weight) FILTER (WHERE measured_at > now() - interval '7 days'),
+    avg(weight) FILTER (WHERE measured_at > now() - interval '30 days')
+FROM paramrecord WHERE user_id = 1 AND deleted_at IS NULL
+"""
+
+
+async def seed(engine: AsyncEngine, records: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO "user" (telegram_id, first_name, height, is_active,
+                    timezone, created_at, modified_at)
+                VALUES (1, 'John', 180, true, 'UTC', now(), now())
+                """
+            )
+        )
+        # without the triggers, the rollups are rebuilt once afterwards
+        await conn.execute(text("ALTER TABLE paramrecord DISABLE TRIGGER USER"))
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, deleted_at, weight, height)
+                SELECT 1, now(),
+                    now() - g * interval '8 hours' - random() * interval '8 hours',
+                    now(), CASE WHEN random() < 0.02 THEN now() END,
+                    70 + random() * 30, 180
+                FROM generate_series(1, :records) g
+                """
+            ),
+            {"records": records},
+        )
+        await conn.execute(text("ALTER TABLE paramrecord ENABLE TRIGGER USER"))
+        await rebuild_rollups(conn)
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+async def latency(call: Callable[[], Awaitable[object]]) -> str:
+    await call()
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await call()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return (
+        f"median {statistics.median(times):8.3f} ms,"
+        f" p95 {times[int(len(times) * 0.95)]:8.3f} ms"
+    )
+
+
+async def run(engine: AsyncEngine, session_maker: SessionMaker, records: int) -> None:
+    async def from_rollups() -> None:
+        await get_summary(session_maker, 1)
+
+    async def from_records() -> None:
+        async with session_maker() as session:
+            (await session.execute(text(FROM_RECORDS))).one()
+
+    async def save() -> None:
+        record = ParamRecord(
+            user_id=1, weight=80, height=180, fat_percent=None, muscle_percent=None
+        )
+        await save_record(session_maker, record)
+
+    print(f"{records} records:")
+    print(f"  summary from rollups     {await latency(from_rollups)}")
+    print(f"  summary from records     {await latency(from_records)}")
+    print(f"  save_record with rollups {await latency(save)}")
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE paramrecord DISABLE TRIGGER USER"))
+    print(f"  save_record without      {await latency(save)}")
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE paramrecord ENABLE TRIGGER USER"))
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    for records in SIZES:
+        await seed(engine, records)
+        await run(engine, session_maker, records)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
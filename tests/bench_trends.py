@@ -0,0 +1,157 @@
+"""Trend analytics over a user's history: ORM objects and a loop per record
+against columns and NumPy.
+
+For every size the user's records are seeded (a few readings a day at random
+times, some of them soft deleted), then the trend of `/trend` is computed
+twice: from `ParamRecord` objects with the moving average, smoothing and rate
+done in a Python loop over the objects and their `fat_weight`/`muscle_weight`
+properties, and with `fetch_series` + `compute_trend`. Both the fetch and the
+computation are timed. Needs a database: run with
+`TEST_DB_URL=postgresql+asyncpg://... python -m tests.bench_trends` from the
+repository root. The tables of the database are recreated.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, col, select
+
+from src.db.session import SessionMaker
+from src.models.fsm import FSMRecord  # noqa: F401
+from src.models.stats import ParamRecord
+from src.models.user import User  # noqa: F401
+from src.services.trends import DAY, WEEK, compute_trend, fetch_series
+
+SIZES = (10_000, 100_000, 1_000_000)
+TAU = 10 * DAY
+RATE_WINDOW = 4 * WEEK
+
+
+async def seed(engine: AsyncEngine, records: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO "user" (telegram_id, first_name, height, is_active,
+                    timezone, created_at, modified_at)
+                VALUES (1, 'John', 180, true, 'UTC', now(), now())
+                """
+            )
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, deleted_at, weight, height, fat_percent,
+                    muscle_percent)
+                SELECT 1, now(),
+                    now() - g * interval '8 hours' - random() * interval '8 hours',
+                    now(), CASE WHEN random() < 0.02 THEN now() END,
+                    70 + random() * 30, 180,
+                    CASE WHEN random() < 0.7 THEN 0.2 + random() * 0.1 END,
+                    CASE WHEN random() < 0.5 THEN 0.3 + random() * 0.1 END
+                FROM generate_series(1, :records) g
+                """
+            ),
+            {"records": records},
+        )
+        await conn.execute(text("ANALYZE"))
+
+
+async def fetch_objects(session_maker: SessionMaker) -> list[ParamRecord]:
+    query = (
+        select(ParamRecord)
+        .where(ParamRecord.user_id == 1, col(ParamRecord.deleted_at).is_(None))
+        .order_by(col(ParamRecord.measured_at), col(ParamRecord.id))
+    )
+    async with session_maker() as session:
+        return list((await session.execute(query)).scalars())
+
+
+def loop_component(points: list[tuple[float, float]]) -> tuple | None:
+    if not points:
+        return None
+    window: deque[tuple[float, float]] = deque()
+    total = 0.0
+    smoothed = points[0][1]
+    previous = points[0][0]
+    for t, value in points:
+        window.append((t, value))
+        total += value
+        while window[0][0] <= t - WEEK:
+            total -= window.popleft()[1]
+        smoothed += (1 - math.exp(-(t - previous) / TAU)) * (value - smoothed)
+        previous = t
+    last = points[-1][0]
+    recent = [(t, v) for t, v in points if t >= last - RATE_WINDOW]
+    mean_t = sum(t for t, _ in recent) / len(recent)
+    mean_v = sum(v for _, v in recent) / len(recent)
+    spread = sum((t - mean_t) ** 2 for t, _ in recent)
+    rate = (
+        sum((t - mean_t) * (v - mean_v) for t, v in recent) / spread * WEEK
+        if spread
+        else None
+    )
+    return points[-1][1], total / len(window), smoothed, rate
+
+
+def loop_trend(records: list[ParamRecord]) -> tuple:
+    weight, fat, muscle = [], [], []
+    for record in records:
+        t = record.measured_at.timestamp()
+        weight.append((t, record.weight))
+        if (fat_weight := record.fat_weight) is not None:
+            fat.append((t, fat_weight))
+        if (muscle_weight := record.muscle_weight) is not None:
+            muscle.append((t, muscle_weight))
+    return loop_component(weight), loop_component(fat), loop_component(muscle)
+
+
+async def run(session_maker: SessionMaker, records: int) -> None:
+    start = time.perf_counter()
+    objects = await fetch_objects(session_maker)
+    fetched = time.perf_counter()
+    expected = loop_trend(objects)
+    done = time.perf_counter()
+    print(
+        f"  {records:>9} objects + loop  fetch {fetched - start:7.3f}s,"
+        f" compute {done - fetched:7.3f}s, total {done - start:7.3f}s"
+    )
+    del objects
+
+    start = time.perf_counter()
+    series = await fetch_series(session_maker, 1)
+    fetched = time.perf_counter()
+    trend = compute_trend(series, tau=TAU, rate_window=RATE_WINDOW)
+    done = time.perf_counter()
+    print(
+        f"  {records:>9} columns + numpy fetch {fetched - start:7.3f}s,"
+        f" compute {done - fetched:7.3f}s, total {done - start:7.3f}s"
+    )
+    assert trend is not None
+    assert math.isclose(trend.weight.smoothed, expected[0][2], rel_tol=1e-9)
+    assert trend.fat_weight is not None
+    assert math.isclose(trend.fat_weight.average, expected[1][1], rel_tol=1e-9)
+
+
+async def main() -> None:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        raise SystemExit("TEST_DB_URL is not set")
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    for records in SIZES:
+        await seed(engine, records)
+        await run(session_maker, records)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
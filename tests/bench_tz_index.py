@@ -0,0 +1,72 @@
+"""Lookups per second and resident memory of the offline timezone index.
+
+Run with `python -m tests.bench_tz_index [index path]` from the repository root.
+The index is built from the `tzwhere` dataset first if the file does not exist.
+"""
+
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+
+from src.config import config
+from src.utils.tz_index import TimezoneIndex, build_index, load_tz_world
+
+NUMBER = 200_000
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def bench(index: TimezoneIndex, points: list[tuple[float, float]]) -> None:
+    start = time.perf_counter()
+    for lat, lng in points:
+        index.lookup(lat, lng)
+    elapsed = time.perf_counter() - start
+    timings = []
+    for lat, lng in points[:20_000]:
+        start = time.perf_counter()
+        index.lookup(lat, lng)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"  {len(points) / elapsed:>12,.0f} lookups/s"
+        f"  p50 {timings[len(timings) // 2] * 1e6:.1f}µs"
+        f"  p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f}µs"
+    )
+
+
+def main() -> None:
+    path = Path(sys.argv[1] if len(sys.argv) > 1 else config.timezone_index_path)
+    if not path.exists():
+        print(f"building {path}")
+        start = time.perf_counter()
+        build_index(load_tz_world(), path)
+        print(f"  built in {time.perf_counter() - start:.1f}s")
+    print(f"index file: {path.stat().st_size / 2**20:.1f} MB")
+
+    rng = random.Random(0)
+    world = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(NUMBER)]
+    inhabited = [(rng.uniform(-45, 65), rng.uniform(-130, 150)) for _ in range(NUMBER)]
+
+    before = rss_mb()
+    start = time.perf_counter()
+    index = TimezoneIndex(path)
+    print(f"open: {(time.perf_counter() - start) * 1e3:.2f}ms")
+    print(f"rss after open: +{rss_mb() - before:.1f} MB")
+    print("uniform world points:")
+    bench(index, world)
+    print("inhabited latitudes:")
+    bench(index, inhabited)
+    print(f"rss after {2 * NUMBER:,} lookups: +{rss_mb() - before:.1f} MB")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
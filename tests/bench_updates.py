@@ -0,0 +1,85 @@
+"""Decoding cost of the webhook request bodies.
+
+Decodes a corpus of recorded update payloads (`tests/data/updates.jsonl`) with
+the old `json.loads` + `Update.model_validate` path, with pydantic's own JSON
+parser and with the `UpdateDecoder` of the webhook, which also skips the updates
+the bot has no handler for. `orjson` is measured as well when it is installed.
+Allocations are the peak of the memory traced while an update is decoded.
+
+Run with `python -m tests.bench_updates` from the repository root.
+"""
+
+import json
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from aiogram.types import Update
+
+from src.config import config
+
+config.bot_api_key = config.bot_api_key or "42:TEST"
+
+from src.webhook import update_decoder  # noqa: E402
+
+CORPUS = Path(__file__).parent / "data" / "updates.jsonl"
+ROUNDS = 20
+
+
+def json_validate(body: bytes) -> Update:
+    return Update.model_validate(json.loads(body))
+
+
+def decoders() -> dict[str, Callable[[bytes], Any]]:
+    result = {"json.loads + model_validate": json_validate}
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        result["orjson.loads + model_validate"] = lambda body: Update.model_validate(
+            orjson.loads(body)
+        )
+    result["model_validate_json"] = Update.model_validate_json
+    result["UpdateDecoder.decode"] = update_decoder.decode
+    return result
+
+
+def allocated(decode: Callable[[bytes], Any], bodies: list[bytes]) -> float:
+    tracemalloc.start()
+    total = 0
+    for body in bodies:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        update = decode(body)
+        total += tracemalloc.get_traced_memory()[1] - before
+        del update
+    tracemalloc.stop()
+    return total / len(bodies)
+
+
+def main() -> None:
+    bodies = CORPUS.read_bytes().splitlines()
+    print(f"{len(bodies)} updates, {sum(map(len, bodies)) / len(bodies):.0f}B each")
+    for name, decode in decoders().items():
+        update_decoder.skipped.clear()
+        rounds = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            for body in bodies:
+                decode(body)
+            rounds.append(time.perf_counter() - start)
+        # the best round, the others are slowed down by everything else running
+        elapsed = min(rounds) / len(bodies)
+        skipped = {k: count // ROUNDS for k, count in update_decoder.skipped.items()}
+        print(
+            f"  {name:<30} {elapsed * 1e6:6.1f}µs/update"
+            f" {allocated(decode, bodies) / 1024:6.1f}KiB allocated/update"
+        )
+    print(f"skipped by the decoder: {skipped}")
+
+
+if __name__ == "__main__":
+    main()
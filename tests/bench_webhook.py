@@ -0,0 +1,106 @@
+"""In-process load test of the webhook endpoint.
+
+Drives the FastAPI app through httpx with synthetic updates from many chats and
+compares processing the update inside the request with acknowledging it right
+away and processing it on the update queue. Handlers are simulated by a sleep.
+
+Run with `python -m tests.bench_webhook` from the repository root.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from src.config import config
+
+config.bot_api_key = config.bot_api_key or "42:TEST"
+
+from src import webhook  # noqa: E402
+from src.services.update_queue import UpdateQueue  # noqa: E402
+
+UPDATES = 5000
+CHATS = 500
+CONCURRENCY = 20
+HANDLER_SECONDS = 0.02
+# every 100th update hits a slow handler (a database hiccup)
+SLOW_HANDLER_SECONDS = 0.5
+
+
+async def process(update) -> None:  # type: ignore[no-untyped-def]
+    slow = update.update_id % 100 == 0
+    await asyncio.sleep(SLOW_HANDLER_SECONDS if slow else HANDLER_SECONDS)
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "John"},
+            "text": "80",
+        },
+    }
+
+
+async def run(name: str, update_queue: UpdateQueue | None) -> None:
+    webhook.app.state.update_queue = update_queue
+    rng = random.Random(0)
+    updates = [make_update(i, rng.randrange(1, CHATS + 1)) for i in range(UPDATES)]
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=webhook.app),
+        base_url="http://bench",
+        headers={"X-Telegram-Bot-Api-Secret-Token": config.webhook_secret},
+    ) as client:
+
+        async def post(update: dict) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(config.webhook_path, json=update)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        acked = time.perf_counter() - start
+        if update_queue is not None:
+            await update_queue.drain()
+        done = time.perf_counter() - start
+    latencies.sort()
+    print(f"{name}:")
+    print(
+        f"  acknowledged in {acked:.2f}s, processed in {done:.2f}s,"
+        f" {UPDATES / done:,.0f} updates/s"
+    )
+    print(
+        f"  response p50 {latencies[len(latencies) // 2] * 1e3:.1f}ms"
+        f"  p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.1f}ms"
+        f"  max {latencies[-1] * 1e3:.1f}ms  statuses {statuses}"
+    )
+    if update_queue is not None:
+        print(f"  queue: {update_queue.stats()}")
+
+
+async def main() -> None:
+    logging.disable(logging.WARNING)
+    webhook.process_update = process
+    await run("inline", None)
+    for workers, maxsize in ((8, 1000), (32, 1000), (32, 10)):
+        update_queue = UpdateQueue(
+            process, logging.getLogger(), workers=workers, maxsize=maxsize
+        )
+        update_queue.start()
+        await run(f"queue, {workers} workers, {maxsize} per shard", update_queue)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
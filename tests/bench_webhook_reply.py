@@ -0,0 +1,139 @@
+"""End-to-end latency of an update answered through the webhook response.
+
+A stub Bot API with a simulated network round trip receives the outbound
+calls. An update is done once its `sendMessage` has reached telegram: with the
+method in the webhook response that is when the response is sent, otherwise
+when the stub receives the outbound call. The in-process transport returns the
+webhook response only after the background call has finished, the same as the
+webhook did when it awaited the call itself.
+
+Run with `python -m tests.bench_webhook_reply` from the repository root.
+"""
+
+import asyncio
+import logging
+import time
+
+import httpx
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command
+from aiogram.methods import SendMessage
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.config import config
+
+config.bot_api_key = config.bot_api_key or "42:TEST"
+
+from src import webhook  # noqa: E402
+
+UPDATES = 300
+ROUND_TRIP_SECONDS = (0.0, 0.05)
+
+
+class StubBotApi:
+    def __init__(self, round_trip: float) -> None:
+        self.round_trip: float = round_trip
+        self.received: asyncio.Queue[float] = asyncio.Queue()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await request.read()
+        # half of the round trip before the request arrives, half for the answer
+        await asyncio.sleep(self.round_trip / 2)
+        self.received.put_nowait(time.perf_counter())
+        await asyncio.sleep(self.round_trip / 2)
+        return web.json_response(
+            {
+                "ok": True,
+                "result": {
+                    "message_id": 1,
+                    "date": 0,
+                    "chat": {"id": 1, "type": "private"},
+                },
+            }
+        )
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "John"},
+            "text": "/ping",
+        },
+    }
+
+
+async def run(name: str, api: StubBotApi, inline: bool) -> None:
+    webhook_response_body = webhook.webhook_response_body
+    if not inline:
+        webhook.webhook_response_body = lambda method: None
+    response_times: list[float] = []
+    totals: list[float] = []
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=webhook.app),
+        base_url="http://bench",
+        headers={"X-Telegram-Bot-Api-Secret-Token": config.webhook_secret},
+    ) as client:
+        for update_id in range(UPDATES):
+            start = time.perf_counter()
+            response = await client.post(
+                config.webhook_path, json=make_update(update_id)
+            )
+            response_times.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            if inline:
+                assert response.text.startswith("method=sendMessage")
+                totals.append(response_times[-1])
+            else:
+                totals.append(await api.received.get() - start)
+    webhook.webhook_response_body = webhook_response_body
+    response_times.sort()
+    totals.sort()
+    p50, p99 = totals[len(totals) // 2], totals[int(len(totals) * 0.99)]
+    response_p50 = response_times[len(response_times) // 2]
+    print(
+        f"  {name:<22} end-to-end p50 {p50 * 1e3:6.2f}ms p99 {p99 * 1e3:6.2f}ms,"
+        f" webhook response p50 {response_p50 * 1e3:6.2f}ms"
+    )
+
+
+async def main() -> None:
+    logging.disable(logging.WARNING)
+    router = Router()
+
+    @router.message(Command("ping"))
+    async def ping(message: Message) -> SendMessage:
+        return message.answer("pong")
+
+    webhook.dp = Dispatcher()
+    webhook.dp.include_router(router)
+    for round_trip in ROUND_TRIP_SECONDS:
+        api = StubBotApi(round_trip)
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", api.handle)
+        server = TestServer(app)
+        await server.start_server()
+        webhook.bot = Bot(
+            config.bot_api_key,
+            session=AiohttpSession(
+                api=TelegramAPIServer.from_base(str(server.make_url("")).rstrip("/"))
+            ),
+            default=DefaultBotProperties(parse_mode="HTML"),
+        )
+        print(f"Bot API round trip {round_trip * 1e3:.0f}ms:")
+        await run("method in response", api, inline=True)
+        await run("outbound api call", api, inline=False)
+        await webhook.bot.session.close()
+        await server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
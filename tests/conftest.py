@@ -0,0 +1,155 @@
+import datetime
+import os
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
+from pathlib import Path
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message
+from aiogram.types import User as TelegramUser
+from message_loader import MessageLoader
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.session import SessionMaker
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.user import UserCache
+
+ROOT = Path(__file__).parents[1]
+
+
+class QueryCounter:
+    """Records every statement an engine executes"""
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.statements: list[str] = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+
+@pytest.fixture(scope="session")
+def db_url() -> str:
+    url = os.environ.get("TEST_DB_URL")
+    if not url:
+        pytest.skip("TEST_DB_URL is not set")
+    return url
+
+
+@pytest.fixture
+async def engine(db_url: str) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_maker(engine: AsyncEngine) -> SessionMaker:
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def user_cache(session_maker: SessionMaker) -> UserCache:
+    return UserCache(session_maker)
+
+
+@pytest.fixture
+def timezone() -> str:
+    """the timezone of `user`, overridden by the modules that need another one"""
+    return "UTC"
+
+
+@pytest.fixture
+async def user(session_maker: SessionMaker, timezone: str) -> User:
+    """a registered user without records"""
+    async with session_maker() as session:
+        user = User(telegram_id=1, first_name="John", height=180, timezone=timezone)
+        session.add(user)
+        await session.commit()
+    return user
+
+
+@pytest.fixture
+def make_record() -> Callable[..., ParamRecord]:
+    def make_record(
+        user_id: int,
+        measured_at: datetime.datetime,
+        weight: float = 80,
+        fat_percent: float | None = None,
+        muscle_percent: float | None = None,
+        deleted_at: datetime.datetime | None = None,
+    ) -> ParamRecord:
+        return ParamRecord(
+            user_id=user_id,
+            measured_at=measured_at,
+            weight=weight,
+            height=180,
+            fat_percent=fat_percent,
+            muscle_percent=muscle_percent,
+            deleted_at=deleted_at,
+        )
+
+    return make_record
+
+
+@pytest.fixture
+def add_records(
+    session_maker: SessionMaker,
+) -> Callable[[Iterable[ParamRecord]], Awaitable[None]]:
+    async def add_records(records: Iterable[ParamRecord]) -> None:
+        async with session_maker() as session:
+            session.add_all(records)
+            await session.commit()
+
+    return add_records
+
+
+@pytest.fixture
+def count_queries() -> Callable[[AsyncEngine], QueryCounter]:
+    """counters of the statements of other engines than `engine`"""
+    return QueryCounter
+
+
+@pytest.fixture
+def queries(engine: AsyncEngine) -> QueryCounter:
+    return QueryCounter(engine)
+
+
+@pytest.fixture(scope="session")
+def message_loader() -> MessageLoader:
+    return MessageLoader(ROOT / "static" / "messages" / "messages.json")
+
+
+@pytest.fixture
+def make_message() -> Callable[..., Message]:
+    def make_message(text: str, telegram_id: int = 1) -> Message:
+        return Message(
+            message_id=1,
+            date=datetime.datetime.now(datetime.UTC),
+            chat=Chat(id=telegram_id, type="private"),
+            from_user=TelegramUser(id=telegram_id, is_bot=False, first_name="John"),
+            text=text,
+        )
+
+    return make_message
+
+
+@pytest.fixture
+def state() -> FSMContext:
+    return FSMContext(
+        storage=MemoryStorage(), key=StorageKey(bot_id=42, chat_id=1, user_id=1)
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import datetime
+import io
+from collections.abc import AsyncGenerator
+
+import numpy as np
+import pytest
+from aiogram.filters import CommandObject
+from aiogram.methods import SendMessage
+from aiogram.types import BufferedInputFile, Chat, Message, PhotoSize
+from PIL import Image
+from sqlalchemy import update
+from sqlmodel import col
+
+from src.api.routers.charts import chart
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.charts import ChartRenderer
+from src.services.stats import save_record
+from src.utils.charts import DAY, DPI, SIZE, render_chart
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def history(make_record, user: User) -> list[ParamRecord]:
+    return [
+        make_record(
+            user.id,
+            START + datetime.timedelta(days=i),
+            80 - i / 10,
+            fat_percent=0.2 if i % 2 else None,
+        )
+        for i in range(60)
+    ]
+
+
+@pytest.mark.parametrize("with_fat", [False, True])
+def test_render_chart(with_fat):
+    t = 1.7e9 + np.arange(200) * DAY
+    weight = 80 + np.sin(np.arange(200) / 10)
+    fat = (t, weight * 0.2) if with_fat else (t[:0], t[:0])
+    png = render_chart((t, weight), fat, (t[:0], t[:0]), "Europe/Berlin", "")
+    image = Image.open(io.BytesIO(png))
+    assert image.format == "PNG"
+    assert image.size == (SIZE[0] * DPI, SIZE[1] * DPI)
+
+
+@pytest.fixture
+async def renderer(session_maker) -> AsyncGenerator[ChartRenderer, None]:
+    renderer = ChartRenderer(session_maker, workers=1)
+    yield renderer
+    await renderer.close()
+
+
+async def test_cached_until_records_change(
+    user, session_maker, renderer, queries, make_record, add_records
+):
+    await add_records(history(make_record, user))
+    first = await renderer.get(user, "month")
+    assert first is not None and isinstance(first.photo, bytes)
+    assert first.photo.startswith(b"\x89PNG")
+    queries.reset()
+    again = await renderer.get(user, "month")
+    assert again == first
+    assert len(queries) == 1
+    # another window is another chart
+    assert (await renderer.get(user, "all")) != first
+    assert renderer.renders == 2
+    # a record committed after the chart, set up before it by another process
+    record = make_record(user.id, START + datetime.timedelta(days=60), 74)
+    record.modified_at = START
+    await save_record(session_maker, record)
+    added = await renderer.get(user, "month")
+    assert added is not None and added.key != first.key
+    async with session_maker() as session:
+        await session.execute(
+            update(ParamRecord).where(col(ParamRecord.id) == 1).values(deleted_at=START)
+        )
+        await session.commit()
+    deleted = await renderer.get(user, "month")
+    assert deleted is not None and deleted.key != added.key
+    # the axes are in the user's timezone
+    user.timezone = "Asia/Tokyo"
+    moved = await renderer.get(user, "month")
+    assert moved is not None and moved.key != deleted.key
+    assert renderer.renders == 5
+
+
+async def test_file_id_is_reused(user, renderer, make_record, add_records):
+    await add_records(history(make_record, user))
+    result = await renderer.get(user, "week")
+    assert result is not None
+    renderer.remember(result.key, "photo-1")
+    again = await renderer.get(user, "week")
+    assert again is not None and again.photo == "photo-1"
+    assert renderer.stats()["uploads"] == 1
+
+
+async def test_concurrent_requests_render_once(
+    user, renderer, make_record, add_records
+):
+    await add_records(history(make_record, user))
+    results = await asyncio.gather(*(renderer.get(user, "year") for _ in range(5)))
+    assert len({r.photo for r in results if r is not None}) == 1
+    assert renderer.renders == 1
+
+
+async def test_no_records(user, renderer):
+    assert await renderer.get(user, "month") is None
+
+
+class StubBot:
+    def __init__(self) -> None:
+        self.sent: list = []
+
+    async def send_photo(self, chat_id, photo, caption=None) -> Message:
+        self.sent.append(photo)
+        return Message(
+            message_id=len(self.sent),
+            date=datetime.datetime.now(datetime.UTC),
+            chat=Chat(id=chat_id, type="private"),
+            photo=[
+                PhotoSize(
+                    file_id=f"photo-{name}", file_unique_id=name, width=w, height=w
+                )
+                for name, w in (("small", 90), ("large", 800))
+            ],
+        )
+
+
+@pytest.fixture
+def send_chart(renderer, make_message, message_loader):
+    async def send_chart(bot: StubBot, user: User, args: str | None) -> object:
+        return await chart(
+            make_message("/chart"),
+            CommandObject(command="chart", args=args),
+            bot,  # type: ignore[arg-type]
+            user,
+            renderer,
+            message_loader,
+        )
+
+    return send_chart
+
+
+async def test_chart(user, send_chart, make_record, add_records):
+    await add_records(history(make_record, user))
+    bot = StubBot()
+    assert await send_chart(bot, user, None) is None
+    assert await send_chart(bot, user, "month") is None
+    assert isinstance(bot.sent[0], BufferedInputFile)
+    # the second chart is the upload of the first one
+    assert bot.sent[1] == "photo-large"
+    response = await send_chart(bot, user, "decade")
+    assert isinstance(response, SendMessage) and "/chart all" in response.text
+
+
+async def test_chart_no_records(user, send_chart):
+    response = await send_chart(StubBot(), user, "week")
+    assert isinstance(response, SendMessage) and "no records yet" in response.text
@@ -0,0 +1,23 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.db.session import ping, pool_status, warm_pool
+
+
+async def test_warm_pool(db_url):
+    engine = create_async_engine(db_url, pool_size=5, max_overflow=5)
+    assert pool_status(engine) == {
+        "size": 5,
+        "checked_out": 0,
+        "idle": 0,
+        "overflow": -5,
+    }
+    await warm_pool(engine, 5)
+    assert pool_status(engine) == {
+        "size": 5,
+        "checked_out": 0,
+        "idle": 5,
+        "overflow": 0,
+    }
+    assert await ping(engine) > 0
+    assert pool_status(engine)["idle"] == 5
+    await engine.dispose()
@@ -0,0 +1,201 @@
+import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from src.models.user import User
+from src.services.downsampling import (
+    downsample,
+    fetch_bucketed,
+    fetch_downsampled,
+    lttb,
+)
+from src.services.trends import DAY, Series, fetch_series
+
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+YEARS = 5
+
+
+def reference_lttb(t: list[float], values: list[float], points: int) -> list[int]:
+    """the algorithm of the paper, a loop per point"""
+    n = len(t)
+
+    def edge(i: int) -> int:
+        return i * (n - 2) // (points - 2) + 1
+
+    picked = [0]
+    a = 0
+    for i in range(points - 2):
+        start, stop = edge(i), edge(i + 1)
+        next_start, next_stop = stop, edge(i + 2)
+        if i == points - 3:
+            next_start, next_stop = n - 1, n
+        avg_t = sum(t[next_start:next_stop]) / (next_stop - next_start)
+        avg_v = sum(values[next_start:next_stop]) / (next_stop - next_start)
+        areas = [
+            abs(
+                (t[a] - avg_t) * (values[j] - values[a])
+                - (t[a] - t[j]) * (avg_v - values[a])
+            )
+            for j in range(start, stop)
+        ]
+        a = start + areas.index(max(areas))
+        picked.append(a)
+    return [*picked, n - 1]
+
+
+def spiky(n: int, seed: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.2, 2.0, n)) * DAY
+    values = 80 + np.sin(np.arange(n) / 50) * 3 + rng.normal(0, 0.3, n)
+    # a few peaks and troughs of a single measurement
+    values[rng.choice(n, 5, replace=False)] += [9, -8, 7, -10, 12]
+    return t, values
+
+
+@pytest.mark.parametrize(
+    ("n", "points"), [(1000, 3), (1000, 100), (5000, 500), (50, 49)]
+)
+def test_lttb_matches_the_reference(n, points):
+    t, values = spiky(n)
+    picked = lttb(t, values, points)
+    assert list(picked) == reference_lttb(list(t), list(values), points)
+
+
+def test_lttb_short_lines():
+    t, values = spiky(10)
+    assert list(lttb(t, values, 10)) == list(range(10))
+    assert list(lttb(t[:0], values[:0], 5)) == []
+    with pytest.raises(ValueError):
+        lttb(t, values, 2)
+
+
+def test_lttb_keeps_peaks_and_troughs():
+    t, values = spiky(20000)
+    picked = lttb(t, values, 300)
+    assert len(picked) == 300
+    assert picked[0] == 0 and picked[-1] == len(t) - 1
+    assert np.all(np.diff(picked) > 0)
+    assert values[picked].max() == values.max()
+    assert values[picked].min() == values.min()
+    # every single measurement peak or trough is kept, taking every n-th point
+    # keeps hardly any
+    spikes = np.flatnonzero(np.abs(values - np.median(values)) > 6)
+    assert set(spikes) <= set(picked)
+    assert len(set(spikes) & set(range(0, len(t), len(t) // 300))) < len(spikes)
+
+
+def test_downsample():
+    t, weight = spiky(3000)
+    fat = np.where(np.arange(3000) % 3 == 0, 0.2, np.nan)
+    series = Series(t, weight, fat, np.full(3000, np.nan))
+    lines = downsample(series, 100)
+    assert len(lines.weight[0]) == len(lines.fat_weight[0]) == 100
+    assert len(lines.muscle_weight[0]) == 0
+    # the fat mass only from the records that have it
+    fat_times = set(t[::3])
+    assert set(lines.fat_weight[0]) <= fat_times
+    assert lines.fat_weight[1] == pytest.approx(
+        weight[np.searchsorted(t, lines.fat_weight[0])] * 0.2
+    )
+    assert lines.weight[1].max() == weight.max()
+
+
+def test_downsample_keeps_the_extremes():
+    # noise without a single spike, plain lttb misses the lowest and the highest
+    rng = np.random.default_rng(0)
+    t = np.arange(5000) * DAY
+    weight = 80 + np.sin(np.arange(5000) / 300) * 3 + rng.normal(0, 1, 5000)
+    picked = lttb(t, weight, 100)
+    assert weight[picked].max() < weight.max()
+    assert weight[picked].min() > weight.min()
+    nan = np.full(5000, np.nan)
+    line_t, line = downsample(Series(t, weight, nan, nan), 100).weight
+    assert len(line) == 100 and np.all(np.diff(line_t) > 0)
+    assert (line.min(), line.max()) == (weight.min(), weight.max())
+
+
+@pytest.mark.parametrize(
+    "points,spike,count",
+    # a bucket in the middle, the last bucket and the single bucket of 3 points
+    [(50, 500, 50), (50, 997, 50), (3, 500, 4)],
+)
+def test_downsample_keeps_extremes_of_one_bucket(points, spike, count):
+    rng = np.random.default_rng(0)
+    t = np.arange(1000) * DAY
+    weight = 80 + rng.normal(0, 0.5, 1000)
+    weight[spike], weight[spike + 1] = 90, 70
+    nan = np.full(1000, np.nan)
+    line_t, line = downsample(Series(t, weight, nan, nan), points).weight
+    assert len(line) == count and np.all(np.diff(line_t) > 0)
+    assert (line.min(), line.max()) == (70, 90)
+    assert (line_t[0], line_t[-1]) == (t[0], t[-1])
+
+
+async def add_history(engine, user: User) -> None:
+    async with engine.begin() as conn:
+        # daily records, some of them twice a day, a peak and a trough of
+        # single records and a deleted record far above the peak
+        await conn.execute(
+            text(
+                """
+                INSERT INTO paramrecord (user_id, created_at, measured_at,
+                    modified_at, deleted_at, weight, height, fat_percent,
+                    muscle_percent)
+                SELECT :user_id, now(),
+                    CAST(:start AS timestamptz) + g * interval '1 day'
+                        + (g % 2) * interval '12 hours',
+                    now(), CASE WHEN g = 900 THEN now() END,
+                    CASE g WHEN 400 THEN 120 WHEN 1300 THEN 50 WHEN 900 THEN 200
+                        ELSE 80 + 5 * sin(g / 30.0) END,
+                    180,
+                    CASE WHEN g % 2 = 0 THEN 0.2 + 0.01 * sin(g / 20.0) END,
+                    CASE WHEN g = 700 THEN 0.5 WHEN g % 5 = 0 THEN 0.35 END
+                FROM generate_series(0, :days) g,
+                    generate_series(1, 1 + (g % 7 = 0)::int)
+                """
+            ),
+            {"user_id": user.id, "start": START, "days": YEARS * 365},
+        )
+
+
+async def test_fetch_bucketed(user, session_maker, engine, queries):
+    assert user.id is not None
+    await add_history(engine, user)
+    series = await fetch_series(session_maker, user.id)
+    queries.reset()
+    bucketed = await fetch_bucketed(session_maker, user.id, 100)
+    assert len(queries) == 1
+    assert len(bucketed) <= 8 * 100
+    assert np.all(np.diff(bucketed.t) >= 0)
+    assert (bucketed.t[0], bucketed.t[-1]) == (series.t[0], series.t[-1])
+    for values, reduced in (
+        (series.weight, bucketed.weight),
+        (series.fat_weight, bucketed.fat_weight),
+        (series.muscle_weight, bucketed.muscle_weight),
+    ):
+        assert np.nanmax(reduced) == pytest.approx(np.nanmax(values))
+        assert np.nanmin(reduced) == pytest.approx(np.nanmin(values))
+    # the deleted record is not in any interval
+    assert bucketed.weight.max() == 120
+    # fewer records than intervals are all kept
+    since = START + datetime.timedelta(days=YEARS * 365 - 10)
+    recent = await fetch_bucketed(session_maker, user.id, 100, since=since)
+    expected = await fetch_series(session_maker, user.id, since=since)
+    assert list(recent.t) == list(expected.t)
+    assert len(await fetch_bucketed(session_maker, user.id + 1, 100)) == 0
+
+
+async def test_fetch_downsampled(user, session_maker, engine):
+    assert user.id is not None
+    await add_history(engine, user)
+    lines = await fetch_downsampled(session_maker, user.id, 200)
+    series = await fetch_series(session_maker, user.id)
+    for line in (lines.weight, lines.fat_weight, lines.muscle_weight):
+        assert 3 <= len(line[0]) <= 200
+        assert set(line[0]) <= set(series.t)
+    assert (lines.weight[1].min(), lines.weight[1].max()) == (50, 120)
+    muscle = np.nanmax(series.muscle_weight)
+    assert lines.muscle_weight[1].max() == pytest.approx(muscle)
+    assert lines.weight[0][0] == series.t[0] and lines.weight[0][-1] == series.t[-1]
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageReplyMarkup
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src.services.edits import EditCoalescer
+
+WINDOW = 0.05
+
+
+def keyboard(i: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text=str(i), callback_data=str(i))]]
+    )
+
+
+class StubBot:
+    id = 42
+
+    def __init__(self, error: str | None = None) -> None:
+        self.edits: list[tuple[int, int, InlineKeyboardMarkup]] = []
+        self.error = error
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
+        await asyncio.sleep(0.001)
+        if self.error:
+            raise TelegramBadRequest(EditMessageReplyMarkup(), self.error)
+        self.edits.append((chat_id, message_id, reply_markup))
+
+
+@pytest.fixture
+def coalescer() -> EditCoalescer:
+    return EditCoalescer(logging.getLogger(), window=WINDOW)
+
+
+async def test_burst(coalescer):
+    bot = StubBot()
+    taps = 50
+    start = asyncio.get_running_loop().time()
+    for i in range(taps):
+        coalescer.submit(bot, 1, 1, keyboard(i))
+        await asyncio.sleep(WINDOW / 10)
+    elapsed = asyncio.get_running_loop().time() - start
+    await coalescer.close()
+    # one edit at once, one per window of the burst and the latest at last
+    assert len(bot.edits) <= elapsed / WINDOW + 2
+    assert len(bot.edits) < taps / 5
+    assert bot.edits[0][2] == keyboard(0)
+    assert bot.edits[-1][2] == keyboard(taps - 1)
+    assert coalescer.stats() == {
+        "submitted": taps,
+        "sent": len(bot.edits),
+        "failed": 0,
+        "pending": 0,
+    }
+
+
+async def test_first_edit_is_sent_at_once(coalescer):
+    bot = StubBot()
+    coalescer.submit(bot, 1, 1, keyboard(1))
+    await asyncio.sleep(WINDOW / 5)
+    assert [markup for _, _, markup in bot.edits] == [keyboard(1)]
+    await coalescer.close()
+
+
+async def test_messages_are_edited_separately(coalescer):
+    bot = StubBot()
+    for message_id in range(5):
+        coalescer.submit(bot, 1, message_id, keyboard(message_id))
+    await coalescer.close()
+    assert sorted(bot.edits, key=lambda edit: edit[1]) == [
+        (1, message_id, keyboard(message_id)) for message_id in range(5)
+    ]
+
+
+async def test_unchanged_keyboard_is_not_sent(coalescer):
+    bot = StubBot()
+    coalescer.submit(bot, 1, 1, keyboard(1), current=keyboard(1))
+    await coalescer.close()
+    assert bot.edits == []
+    # up and back down within the window leaves the sent keyboard as it is
+    coalescer.submit(bot, 1, 1, keyboard(2), current=keyboard(1))
+    coalescer.submit(bot, 1, 1, keyboard(3))
+    coalescer.submit(bot, 1, 1, keyboard(2))
+    await coalescer.close()
+    assert [markup for _, _, markup in bot.edits] == [keyboard(2)]
+
+
+async def test_not_modified_is_ignored(coalescer):
+    bot = StubBot(
+        error="Bad Request: message is not modified: specified new message content"
+    )
+    coalescer.submit(bot, 1, 1, keyboard(1))
+    await coalescer.close()
+    assert coalescer.failed == 0
+    bot.error = "Bad Request: message to edit not found"
+    coalescer.submit(bot, 1, 1, keyboard(2))
+    await coalescer.close()
+    assert coalescer.failed == 1
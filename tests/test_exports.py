@@ -0,0 +1,147 @@
+import csv
+import datetime
+import io
+import json
+import logging
+
+import pytest
+from aiogram import Bot
+from aiogram.filters import CommandObject
+from aiogram.methods import SendDocument
+
+from src.api.routers.exports import export
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.exports import RecordExport
+
+TIMEZONE = "Asia/Tokyo"
+RECORDS = 10
+
+
+@pytest.fixture
+def timezone() -> str:
+    return TIMEZONE
+
+
+def history(make_record, user: User) -> list[ParamRecord]:
+    start = datetime.datetime(2024, 1, 1, 22, 30, tzinfo=datetime.UTC)
+    # inserted newest first, exported oldest first
+    return [
+        make_record(
+            user.id,
+            start + datetime.timedelta(days=i),
+            70 + i,
+            fat_percent=0.2 if i % 2 else None,
+            deleted_at=start if i == 5 else None,
+        )
+        for i in reversed(range(RECORDS))
+    ]
+
+
+async def read(document: RecordExport) -> list[bytes]:
+    return [chunk async for chunk in document.read(None)]  # type: ignore[arg-type]
+
+
+async def test_csv(user, session_maker, queries, make_record, add_records):
+    await add_records(history(make_record, user))
+    document = RecordExport(session_maker, user, chunk_size=4)
+    queries.reset()
+    chunks = await read(document)
+    # the header and a chunk per 4 rows
+    assert len(chunks) == 1 + 3
+    assert sum(1 for s in queries.statements if s.startswith("SELECT")) == 1
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert document.rows == len(rows) == RECORDS - 1
+    assert [float(row["weight"]) for row in rows] == [
+        70 + i for i in range(RECORDS) if i != 5
+    ]
+    assert rows[0] == {
+        "measured_at": "2024-01-02T07:30:00+09:00",
+        "weight": "70.0",
+        "height": "180.0",
+        "fat_percent": "",
+        "muscle_percent": "",
+    }
+    assert rows[1]["fat_percent"] == "0.2"
+
+
+async def test_ndjson(user, session_maker, make_record, add_records):
+    await add_records(history(make_record, user))
+    document = RecordExport(session_maker, user, "ndjson", chunk_size=4)
+    assert document.filename == "records.ndjson"
+    lines = b"".join(await read(document)).decode().splitlines()
+    assert len(lines) == RECORDS - 1
+    assert json.loads(lines[1]) == {
+        "measured_at": "2024-01-03T07:30:00+09:00",
+        "weight": 71.0,
+        "height": 180.0,
+        "fat_percent": 0.2,
+        "muscle_percent": None,
+    }
+
+
+class Sink:
+    def __init__(self) -> None:
+        self.body = b""
+
+    async def write(self, data: bytes) -> None:
+        self.body += data
+
+
+async def test_upload_body(user, session_maker, make_record, add_records):
+    await add_records(history(make_record, user))
+    # aiogram streams the document into the multipart body of the request
+    bot = Bot("42:TEST")
+    document = RecordExport(session_maker, user)
+    form = bot.session.build_form_data(bot, SendDocument(chat_id=1, document=document))
+    sink = Sink()
+    await form().write(sink)
+    await bot.session.close()
+    assert b'filename="records.csv"' in sink.body
+    assert b"2024-01-02T07:30:00+09:00,70.0,180.0,," in sink.body
+    assert document.rows == RECORDS - 1
+
+
+@pytest.mark.parametrize(
+    "args,message",
+    [("xml", "export_unknown_format"), (None, "export_empty")],
+)
+async def test_export_messages(
+    user, session_maker, make_message, message_loader, args, message
+):
+    response = await export(
+        make_message("/export"),
+        CommandObject(command="export", args=args),
+        user,
+        session_maker,
+        logging.getLogger(),
+        message_loader,
+    )
+    assert response.text == message_loader.render_msg(message)
+
+
+@pytest.mark.parametrize(
+    "args,filename", [(None, "records.csv"), ("json", "records.ndjson")]
+)
+async def test_export(
+    user,
+    session_maker,
+    make_message,
+    message_loader,
+    make_record,
+    add_records,
+    args,
+    filename,
+):
+    await add_records(history(make_record, user))
+    response = await export(
+        make_message("/export"),
+        CommandObject(command="export", args=args),
+        user,
+        session_maker,
+        logging.getLogger(),
+        message_loader,
+    )
+    assert isinstance(response, SendDocument)
+    assert isinstance(response.document, RecordExport)
+    assert response.document.filename == filename
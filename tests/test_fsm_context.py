@@ -0,0 +1,155 @@
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import DisabledEventIsolation, MemoryStorage
+from aiogram.types import Message, Update
+
+from src.db.storage import PostgresStorage
+from src.middleware.fsm import (
+    TransactionalFSMContext,
+    TransactionalFSMContextMiddleware,
+)
+
+KEY = StorageKey(bot_id=42, chat_id=1, user_id=1)
+
+
+class Form(StatesGroup):
+    first = State()
+    second = State()
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: list[str] = []
+
+    async def set_state(self, key, state=None):
+        self.calls.append("set_state")
+        await super().set_state(key, state)
+
+    async def get_state(self, key):
+        self.calls.append("get_state")
+        return await super().get_state(key)
+
+    async def set_data(self, key, data):
+        self.calls.append("set_data")
+        await super().set_data(key, data)
+
+    async def get_data(self, key):
+        self.calls.append("get_data")
+        return await super().get_data(key)
+
+
+async def test_changes_are_written_on_flush():
+    storage = CountingStorage()
+    context = TransactionalFSMContext(storage, KEY)
+    await context.clear()
+    await context.update_data(a=1)
+    await context.set_state(Form.first)
+    assert await context.get_state() == Form.first.state
+    assert await context.get_data() == {"a": 1}
+    assert storage.calls == []
+    await context.flush()
+    assert storage.calls == ["set_state", "set_data"]
+    assert await storage.get_state(KEY) == Form.first.state
+    assert await storage.get_data(KEY) == {"a": 1}
+
+
+async def test_reads_once():
+    storage = CountingStorage()
+    await storage.set_data(KEY, {"a": 1})
+    storage.calls.clear()
+    context = TransactionalFSMContext(storage, KEY)
+    assert await context.get_state() is None
+    assert await context.get_value("a") == 1
+    assert await context.update_data(b=2) == {"a": 1, "b": 2}
+    assert storage.calls == ["get_state", "get_data"]
+    await context.flush()
+    assert await storage.get_data(KEY) == {"a": 1, "b": 2}
+
+
+async def test_unchanged_context_is_not_written():
+    storage = CountingStorage()
+    context = TransactionalFSMContext(storage, KEY)
+    await context.get_data()
+    await context.flush()
+    assert "set_state" not in storage.calls and "set_data" not in storage.calls
+
+
+async def test_postgres_round_trips(engine, queries):
+    storage = PostgresStorage(engine)
+    await storage.set_record(KEY, Form.first, {"a": 1})
+    queries.reset()
+    context = TransactionalFSMContext(storage, KEY)
+    assert await context.get_state() == Form.first.state
+    await context.update_data(b=2)
+    await context.set_state(Form.second)
+    await context.flush()
+    assert len(queries) == 2
+    assert await storage.get_record(KEY) == (Form.second.state, {"a": 1, "b": 2})
+
+    queries.reset()
+    context = TransactionalFSMContext(storage, KEY)
+    await context.clear()
+    await context.flush()
+    assert queries.statements[0].startswith("DELETE")
+    assert len(queries) == 1
+    assert await storage.get_record(KEY) == (None, {})
+
+
+@pytest.fixture
+def dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message(Command("start"))
+    async def start(message: Message, state: FSMContext) -> str:
+        await state.clear()
+        await state.update_data(started=True)
+        await state.set_state(Form.first)
+        return "ok"
+
+    @router.message(Form.first, Command("fail"))
+    async def fail(message: Message, state: FSMContext) -> str:
+        await state.set_state(Form.second)
+        raise ValueError("fail")
+
+    storage = CountingStorage()
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    dp.fsm = TransactionalFSMContextMiddleware(storage, DisabledEventIsolation())
+    dp.update.outer_middleware(dp.fsm)
+    dp.include_router(router)
+    return dp
+
+
+def update(text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 1, "is_bot": False, "first_name": "John"},
+                "text": text,
+            },
+        }
+    )
+
+
+async def test_middleware_flushes_after_handler(dispatcher):
+    bot = Bot("42:TEST")
+    assert await dispatcher.feed_update(bot, update("/start")) == "ok"
+    assert dispatcher.storage.calls == ["get_state", "set_state", "set_data"]
+    assert await dispatcher.storage.get_state(KEY) == Form.first.state
+    assert await dispatcher.storage.get_data(KEY) == {"started": True}
+
+
+async def test_middleware_discards_changes_on_error(dispatcher):
+    bot = Bot("42:TEST")
+    await dispatcher.feed_update(bot, update("/start"))
+    with pytest.raises(ValueError):
+        await dispatcher.feed_update(bot, update("/fail"))
+    assert await dispatcher.storage.get_state(KEY) == Form.first.state
@@ -0,0 +1,209 @@
+import asyncio
+import datetime
+import logging
+import re
+from collections.abc import AsyncGenerator
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message, Update
+from aiogram.types import User as TelegramUser
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from src.api.routers.start import start, timezone_from_gmt
+from src.db.storage import PostgresStorage
+
+KEY = StorageKey(bot_id=42, chat_id=1, user_id=1)
+
+
+class Form(StatesGroup):
+    name = State()
+    age = State()
+
+
+@pytest.fixture
+def storage(engine: AsyncEngine) -> PostgresStorage:
+    return PostgresStorage(engine)
+
+
+@pytest.fixture
+async def other_engine(
+    engine: AsyncEngine, db_url: str
+) -> AsyncGenerator[AsyncEngine, None]:
+    # a separate connection pool, as another replica of the bot would have
+    other_engine = create_async_engine(db_url)
+    yield other_engine
+    await other_engine.dispose()
+
+
+async def test_empty_key(storage):
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+
+async def test_state_and_data(storage):
+    await storage.set_state(KEY, Form.name)
+    await storage.set_data(KEY, {"a": 1})
+    assert await storage.get_state(KEY) == Form.name.state
+    assert await storage.get_data(KEY) == {"a": 1}
+    assert await storage.update_data(KEY, {"b": 2}) == {"a": 1, "b": 2}
+    assert await storage.get_data(KEY) == {"a": 1, "b": 2}
+    await storage.set_state(KEY, None)
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {"a": 1, "b": 2}
+
+
+async def test_keys_are_separate(storage):
+    other = StorageKey(bot_id=42, chat_id=1, user_id=1, thread_id=7)
+    await storage.set_state(KEY, Form.name)
+    await storage.set_state(other, Form.age)
+    assert await storage.get_state(KEY) == Form.name.state
+    assert await storage.get_state(other) == Form.age.state
+
+
+async def test_data_is_stored_as_json(storage):
+    measured_at = datetime.datetime(2025, 1, 2, 3, 4, tzinfo=datetime.UTC)
+    user = TelegramUser(id=1, is_bot=False, first_name="John")
+    await storage.set_data(KEY, {"measured_at": measured_at, "user": user})
+    data = await storage.get_data(KEY)
+    assert data["measured_at"] == "2025-01-02T03:04:00Z"
+    assert TelegramUser.model_validate(data["user"]) == user
+
+
+async def test_writes_are_single_statements(storage, queries):
+    await storage.set_state(KEY, Form.name)
+    await storage.set_data(KEY, {"a": 1})
+    await storage.update_data(KEY, {"b": 2})
+    assert len(queries) == 3
+    assert all(statement.startswith("INSERT") for statement in queries.statements)
+
+
+async def test_concurrent_updates_are_merged(storage, other_engine):
+    other = PostgresStorage(other_engine)
+    await asyncio.gather(
+        *(
+            (storage if i % 2 else other).update_data(KEY, {str(i): i})
+            for i in range(50)
+        )
+    )
+    assert await storage.get_data(KEY) == {str(i): i for i in range(50)}
+
+
+async def test_read_through_cache(engine, queries):
+    storage = PostgresStorage(engine, cache_ttl=60)
+    assert await storage.get_state(KEY) is None
+    await storage.set_state(KEY, Form.name)
+    await storage.update_data(KEY, {"a": 1})
+    queries.reset()
+    assert await storage.get_state(KEY) == Form.name.state
+    assert await storage.get_data(KEY) == {"a": 1}
+    assert len(queries) == 0
+    (await storage.get_data(KEY))["a"] = 2
+    assert await storage.get_data(KEY) == {"a": 1}
+
+
+async def test_delete_expired(storage, engine):
+    cleared = StorageKey(bot_id=42, chat_id=2, user_id=2)
+    await storage.set_state(KEY, Form.name)
+    await storage.set_state(cleared, Form.name)
+    await storage.set_state(cleared, None)
+    await storage.set_data(cleared, {})
+    assert await storage.delete_expired() == 1
+    assert await storage.get_state(KEY) == Form.name.state
+    assert await PostgresStorage(engine, state_ttl=0).delete_expired() == 1
+    assert await storage.get_state(KEY) is None
+
+
+async def test_expiry_task(engine):
+    storage = PostgresStorage(engine, state_ttl=0)
+    await storage.set_state(KEY, Form.name)
+    storage.start_expiry(3600)
+    await asyncio.sleep(0.2)
+    assert await storage.get_state(KEY) is None
+    await storage.close()
+
+
+async def test_registration(
+    storage, session_maker, user_cache, make_message, message_loader
+):
+    state = FSMContext(storage, KEY)
+    await start(make_message("/start"), None, state, message_loader)
+    await state.update_data(height=180.0)
+    gmt = re.match(r"^[\+-]\d{1,2}$", "+3")
+    await timezone_from_gmt(
+        make_message("+3"),
+        state,
+        session_maker,
+        logging.getLogger(),
+        gmt,
+        message_loader,
+        user_cache,
+    )
+    user = await user_cache.get(TelegramUser(id=1, is_bot=False, first_name="John"))
+    assert user is not None and user.timezone == "Etc/GMT+3"
+    assert await storage.get_state(KEY) is None
+
+
+def form_router() -> Router:
+    router = Router()
+
+    @router.message(Command("start"))
+    async def start(message: Message, state: FSMContext) -> str:
+        await state.set_state(Form.name)
+        return "name?"
+
+    @router.message(Form.name, F.text)
+    async def name(message: Message, state: FSMContext) -> str:
+        await state.update_data(name=message.text)
+        await state.set_state(Form.age)
+        return "age?"
+
+    @router.message(Form.age, F.text)
+    async def age(message: Message, state: FSMContext) -> str:
+        data = await state.update_data(age=int(message.text or ""))
+        await state.clear()
+        return f"{data['name']} {data['age']}"
+
+    return router
+
+
+def update(chat_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "John"},
+                "text": text,
+            },
+        }
+    )
+
+
+async def test_two_dispatchers_share_conversations(engine, other_engine):
+    replicas = []
+    for replica_engine in (engine, other_engine):
+        dp = Dispatcher(storage=PostgresStorage(replica_engine))
+        dp.include_router(form_router())
+        replicas.append(dp)
+    bot = Bot("42:TEST")
+
+    async def conversation(chat_id: int) -> list[str]:
+        answers = []
+        # every step is handled by the other replica than the previous one
+        for step, text in enumerate(["/start", f"user{chat_id}", str(chat_id)]):
+            dp = replicas[(chat_id + step) % 2]
+            answers.append(await dp.feed_update(bot, update(chat_id, text)))
+        return answers
+
+    results = await asyncio.gather(*(conversation(chat_id) for chat_id in range(40)))
+    for chat_id, answers in enumerate(results):
+        assert answers == ["name?", "age?", f"user{chat_id} {chat_id}"]
+    for dp in replicas:
+        await dp.storage.close()
@@ -0,0 +1,278 @@
+import datetime
+import logging
+
+import pytest
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Document, File, Message
+from sqlmodel import select
+
+from src.api.routers.imports import ImportForm, upload
+from src.config import config
+from src.models.stats import ParamRecord
+from src.services import imports
+from src.services.imports import (
+    POUND,
+    RecordParser,
+    UnknownFormatError,
+    import_records,
+)
+
+TIMEZONE = "Europe/Berlin"
+
+
+def parse(text: str) -> tuple[list[tuple], RecordParser]:
+    parser = RecordParser(1, 180, TIMEZONE)
+    return parser.parse(text, final=True), parser
+
+
+def test_generic_csv():
+    rows, parser = parse(
+        "date,weight,fat,muscle\n2024-01-05 07:30,80.5,25,0.4\n\n2024-01-06,80,,\n"
+    )
+    assert [(row[2], *row[4:]) for row in rows] == [
+        (
+            datetime.datetime(2024, 1, 5, 6, 30, tzinfo=datetime.UTC),
+            80.5,
+            180,
+            0.25,
+            0.4,
+        ),
+        (
+            datetime.datetime(2024, 1, 5, 23, 0, tzinfo=datetime.UTC),
+            80,
+            180,
+            None,
+            None,
+        ),
+    ]
+    assert all(row[0] == 1 for row in rows)
+    assert parser.result.rejected == 0
+
+
+def test_semicolons_and_decimal_commas():
+    rows, _ = parse('Date;Weight (kg);Body Fat (%)\n05.01.2024 07:30;"80,5";24,5%\n')
+    assert [row[4:7] for row in rows] == [(80.5, 180, 0.245)]
+
+
+def test_masses_and_pounds():
+    rows, _ = parse(
+        "Date,Weight (lb),Fat mass (lb),Muscle mass (lb),Height (cm)\n"
+        "2024-01-05T07:30:00+00:00,200,50,80,175\n"
+    )
+    ((*_, weight, height, fat_percent, muscle_percent),) = rows
+    assert weight == pytest.approx(200 * POUND)
+    assert height == 175
+    assert (fat_percent, muscle_percent) == pytest.approx((0.25, 0.4))
+
+
+def test_separate_time_column():
+    rows, _ = parse("Date,Time,Weight\n2024-01-05,07:30,80\n")
+    assert rows[0][2] == datetime.datetime(2024, 1, 5, 6, 30, tzinfo=datetime.UTC)
+
+
+def test_rejected_rows():
+    rows, parser = parse(
+        "date,weight,fat\n"
+        "2024-01-05,80,20\n"
+        "2024-01-06,900,20\n"
+        "yesterday,80,20\n"
+        "2024-01-07,eighty,20\n"
+        "2024-01-08,80,0.2,extra\n"
+        "2024-01-09\n"
+    )
+    assert len(rows) == 2
+    assert parser.result.rejected == 4
+    assert [line for line, _ in parser.result.errors] == [3, 4, 5, 7]
+    assert parser.result.errors[0][1].startswith("weight: ")
+
+
+def test_errors_are_limited():
+    _, parser = parse("date,weight\n" + "2024-01-05,0\n" * 100)
+    assert parser.result.rejected == 100
+    assert len(parser.result.errors) == parser.max_errors
+
+
+def test_line_breaks_in_quoted_values():
+    rows, parser = parse(
+        'date,weight,note\r\n2024-01-05,80,"after\r\nthe ""run""\n"\r\n'
+        "2024-01-06,0,\n"
+        "2024-01-07,81"
+    )
+    assert [row[4] for row in rows] == [80, 81]
+    # the rejected record starts on line 5
+    assert [line for line, _ in parser.result.errors] == [5]
+
+
+def test_quotes_inside_values():
+    # a quote opens a quoted value only at the start of a field
+    rows, parser = parse(
+        'date,weight,note\n2024-01-05,80,ran 5" today\n2024-01-06,81,\n'
+    )
+    assert [row[4] for row in rows] == [80, 81]
+    assert parser.result.rejected == 0
+
+
+def test_quoted_value_not_closed(monkeypatch):
+    monkeypatch.setattr(imports, "MAX_RECORD_SIZE", 100)
+    parser = RecordParser(1, 180, TIMEZONE)
+    rows = parser.parse('date,weight,note\n2024-01-05,80,"not closed\n')
+    for _ in range(10):
+        rows += parser.parse("2024-01-06,81,\n")
+    rows += parser.parse("2024-01-07,0,\n", final=True)
+    # the record takes the lines up to the limit and is rejected as one row,
+    # the rows after it are read
+    assert len(rows) == 4
+    assert parser.result.rejected == 2
+    assert [line for line, _ in parser.result.errors] == [2, 13]
+    assert parser.result.errors[0][1] == "a quoted value does not end"
+
+
+def test_field_too_large():
+    rows, parser = parse(
+        "date,weight,note\n2024-01-05,80," + "x" * 200_000 + "\n2024-01-06,81,\n"
+    )
+    assert [row[4] for row in rows] == [81]
+    assert parser.result.errors[0][0] == 2
+    assert "field larger than field limit" in parser.result.errors[0][1]
+
+
+@pytest.mark.parametrize("header", ["name,height", "weight,fat", "80,2024-01-05"])
+def test_unknown_format(header):
+    with pytest.raises(UnknownFormatError):
+        parse(f"{header}\n2024-01-05,80\n")
+
+
+@pytest.fixture
+def timezone() -> str:
+    return TIMEZONE
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def test_import(user, session_maker):
+    lines = ["\ufeffdate,weight,fat,note"]
+    lines += [f"2024-01-{day:02},{70 + day / 10},20,ü" for day in range(1, 31)]
+    # a note of two lines
+    lines.append('2024-01-31,73.1,20,"ü\r\nü"')
+    lines.append("2024-02-01,0,20,ü")
+    data = "\r\n".join(lines).encode()
+    parser = RecordParser(user.id, user.height, user.timezone)
+    # chunks end in the middle of lines, of quoted values and of the two bytes
+    # of ü
+    result = await import_records(session_maker, chunked(data, 7), parser, 10)
+    assert (result.accepted, result.rejected) == (31, 1)
+    assert result.errors[0][0] == 34
+    async with session_maker() as session:
+        records = list(
+            (await session.execute(select(ParamRecord).order_by(ParamRecord.id)))
+            .scalars()
+            .all()
+        )
+    assert len(records) == 31
+    assert records[-1].weight == pytest.approx(73.1)
+    assert records[-1].fat_percent == 0.2
+    assert records[-1].height == 180
+    assert records[-1].deleted_at is None
+
+
+@pytest.mark.parametrize(
+    "data,header",
+    [(b"", ""), (b" \r\n\r\n", " "), (b"name,height\n1,2", "name,height")],
+)
+async def test_import_unknown_format(user, session_maker, data, header):
+    parser = RecordParser(user.id, user.height, user.timezone)
+    with pytest.raises(UnknownFormatError) as e:
+        await import_records(session_maker, chunked(data, 7), parser)
+    assert e.value.header == header
+
+
+class StubSession:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.api = TelegramAPIServer.from_base("https://api.telegram.org")
+
+    def stream_content(self, url: str, chunk_size: int):
+        assert url.endswith("/documents/export.csv")
+        return chunked(self.data, chunk_size)
+
+
+class StubBot:
+    token = "42:TEST"
+
+    def __init__(self, data: bytes) -> None:
+        self.session = StubSession(data)
+
+    async def get_file(self, file_id: str) -> File:
+        return File(
+            file_id=file_id, file_unique_id=file_id, file_path="documents/export.csv"
+        )
+
+
+def document_message(make_message, size: int) -> Message:
+    message = make_message("")
+    return message.model_copy(
+        update={
+            "text": None,
+            "document": Document(
+                file_id="export", file_unique_id="export", file_size=size
+            ),
+        }
+    )
+
+
+async def test_upload(user, session_maker, state, make_message, message_loader):
+    data = b"date,weight\n2024-01-05,80\n2024-01-06,0\n"
+    await state.set_state(ImportForm.upload)
+    response = await upload(
+        document_message(make_message, len(data)),
+        state,
+        StubBot(data),
+        user,
+        session_maker,
+        logging.getLogger(),
+        message_loader,
+    )
+    assert response.text == message_loader.render_msg(
+        "import_done",
+        accepted=1,
+        rejected=1,
+        errors=[(3, "weight: Input should be greater than or equal to 1")],
+    )
+    assert await state.get_state() is None
+
+
+async def test_upload_unknown_format(
+    user, session_maker, state, make_message, message_loader
+):
+    data = b"name,height\nJohn,180\n"
+    await state.set_state(ImportForm.upload)
+    response = await upload(
+        document_message(make_message, len(data)),
+        state,
+        StubBot(data),
+        user,
+        session_maker,
+        logging.getLogger(),
+        message_loader,
+    )
+    assert response.text == message_loader.render_msg("import_unknown_format")
+    # the user can send another file
+    assert await state.get_state() == ImportForm.upload.state
+
+
+async def test_upload_too_large(
+    user, session_maker, state, make_message, message_loader
+):
+    response = await upload(
+        document_message(make_message, config.import_max_file_size + 1),
+        state,
+        StubBot(b""),
+        user,
+        session_maker,
+        logging.getLogger(),
+        message_loader,
+    )
+    assert response.text.startswith("The file is too large")
@@ -0,0 +1,138 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.migrations import (
+    INITIAL_SCHEMA,
+    LATEST_VERSION,
+    MIGRATIONS,
+    SchemaVersionError,
+    check_schema_version,
+    get_schema_version,
+    upgrade,
+)
+
+SCHEMA = """
+SELECT c.table_name, c.column_name, c.data_type, c.is_nullable, c.column_default
+FROM information_schema.columns c
+WHERE c.table_schema = 'public' AND c.table_name <> 'schema_version'
+ORDER BY c.table_name, c.column_name
+"""
+INDEXES = """
+SELECT indexname, indexdef FROM pg_indexes
+WHERE schemaname = 'public' AND tablename <> 'schema_version'
+ORDER BY indexname
+"""
+TRIGGERS = """
+SELECT trigger_name, event_manipulation, event_object_table, action_timing,
+    action_orientation, action_statement
+FROM information_schema.triggers
+WHERE trigger_schema = 'public'
+ORDER BY trigger_name, event_manipulation
+"""
+
+
+@pytest.fixture
+async def empty_engine(db_url: str) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS schema_version"))
+    yield engine
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS schema_version"))
+    await engine.dispose()
+
+
+async def fetch(engine: AsyncEngine, query: str) -> list[tuple]:
+    async with engine.connect() as conn:
+        return [tuple(row) for row in await conn.execute(text(query))]
+
+
+async def test_migrations_match_the_models(empty_engine):
+    applied = await upgrade(empty_engine)
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    migrated = [await fetch(empty_engine, q) for q in (SCHEMA, INDEXES, TRIGGERS)]
+    async with empty_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    created = [await fetch(empty_engine, q) for q in (SCHEMA, INDEXES, TRIGGERS)]
+    assert migrated == created
+    assert len(created[2]) == 3
+
+
+async def test_upgrade_is_applied_once(empty_engine):
+    await upgrade(empty_engine)
+    assert await upgrade(empty_engine) == []
+    async with empty_engine.connect() as conn:
+        assert await get_schema_version(conn) == MIGRATIONS[-1].version
+
+
+async def test_schema_version_without_migrations(empty_engine):
+    async with empty_engine.connect() as conn:
+        assert await get_schema_version(conn) == 0
+
+
+async def test_existing_schema_is_adopted(empty_engine):
+    # a database created by create_all before the migrations, with a duplicate
+    # active user nothing prevented
+    await upgrade(empty_engine, (INITIAL_SCHEMA,))
+    async with empty_engine.begin() as conn:
+        await conn.execute(text("DROP TABLE schema_version"))
+        await conn.execute(
+            text(
+                'INSERT INTO "user" (telegram_id, first_name, height, is_active,'
+                " timezone, created_at, modified_at) VALUES"
+                " (1, 'John', 180, true, 'UTC', now(), now()),"
+                " (1, 'John', 180, true, 'UTC', now(), now())"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO paramrecord (user_id, created_at, measured_at,"
+                " modified_at, weight, height) VALUES"
+                " (1, now(), now(), now(), 80, 180),"
+                " (1, now(), now(), now(), 82, 180)"
+            )
+        )
+    await upgrade(empty_engine)
+    assert await fetch(
+        empty_engine, 'SELECT id, is_active FROM "user" ORDER BY id'
+    ) == [(1, True), (2, False)]
+    # the rollups of the records from before
+    assert await fetch(
+        empty_engine, "SELECT user_id, records, weight_sum FROM usersummary"
+    ) == [(1, 2, 162)]
+    with pytest.raises(IntegrityError):
+        async with empty_engine.begin() as conn:
+            await conn.execute(text('UPDATE "user" SET is_active = true'))
+
+
+async def test_concurrent_upgrades(db_url, empty_engine):
+    engines = [create_async_engine(db_url) for _ in range(5)]
+    results = await asyncio.gather(*(upgrade(engine) for engine in engines))
+    for engine in engines:
+        await engine.dispose()
+    assert sorted(len(applied) for applied in results) == [0] * 4 + [len(MIGRATIONS)]
+    assert await fetch(empty_engine, "SELECT version FROM schema_version") == [
+        (m.version,) for m in MIGRATIONS
+    ]
+
+
+async def test_check_schema_version(empty_engine, count_queries):
+    with pytest.raises(SchemaVersionError) as e:
+        await check_schema_version(empty_engine)
+    assert (e.value.version, e.value.expected) == (0, LATEST_VERSION)
+    await upgrade(empty_engine, (INITIAL_SCHEMA,))
+    with pytest.raises(SchemaVersionError) as e:
+        await check_schema_version(empty_engine)
+    assert e.value.version == INITIAL_SCHEMA.version
+    await upgrade(empty_engine)
+    queries = count_queries(empty_engine)
+    assert await check_schema_version(empty_engine) == LATEST_VERSION
+    assert len(queries) == 1
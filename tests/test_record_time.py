@@ -0,0 +1,55 @@
+import datetime
+import re
+
+import pytest
+import pytz
+
+from src.api.routers.stats import (
+    TIME_FORMAT,
+    RecordForm,
+    enter_time,
+    time_picker_builder,
+)
+
+TIMEZONE = "Europe/Berlin"
+
+
+@pytest.fixture
+async def time_state(state):
+    await state.update_data(timezone=TIMEZONE)
+    await state.set_state(RecordForm.enter_time)
+    return state
+
+
+@pytest.mark.parametrize(
+    "text,hour,minute",
+    [("08:30", 8, 30), (" 8:05 ", 8, 5), ("21.45", 21, 45), ("00:00", 0, 0)],
+)
+async def test_typed_time(time_state, make_message, message_loader, text, hour, minute):
+    time_m = re.match(TIME_FORMAT, text)
+    assert time_m is not None
+    response = await enter_time(make_message(text), time_state, time_m, message_loader)
+    assert response.text == message_loader.render_msg("stats_weight")
+    assert await time_state.get_state() == RecordForm.enter_weight.state
+    measured_at = (await time_state.get_data())["measured_at"]
+    local = measured_at.astimezone(pytz.timezone(TIMEZONE))
+    assert (local.hour, local.minute) == (hour, minute)
+
+
+@pytest.mark.parametrize("text", ["24:00", "8:60", "830", "8:5", "80", "08:30pm"])
+def test_typed_time_incorrect_format(text):
+    assert re.match(TIME_FORMAT, text) is None
+
+
+def test_time_picker_rows():
+    keyboard = time_picker_builder.build_from_timestamp_tz(
+        datetime.datetime(2025, 5, 1, 8, 30)
+    ).get_keyboard()
+    texts = [[button.text for button in row] for row in keyboard.inline_keyboard]
+    assert texts[3:] == [
+        ["-3h", "+3h"],
+        ["-15m", "+15m"],
+        ["-5m", "+5m"],
+        ["07:00", "09:00", "13:00", "19:00", "22:00"],
+        ["Ok"],
+    ]
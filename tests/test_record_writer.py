@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import logging
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import func, select
+
+from src.api.routers.stats import RecordForm, skip_muscle_p
+from src.models.stats import ParamRecord
+from src.services.records import RecordWriter, RecordWriterClosedError
+
+DELAY = 0.05
+START = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+
+
+def at(minutes: int) -> datetime.datetime:
+    return START + datetime.timedelta(minutes=minutes)
+
+
+async def count_records(session_maker) -> int:
+    async with session_maker() as session:
+        return (await session.execute(select(func.count(ParamRecord.id)))).scalar_one()
+
+
+async def test_batches(user, session_maker, queries, make_record):
+    writer = RecordWriter(
+        session_maker, logging.getLogger(), batch_size=10, delay=DELAY
+    )
+    queries.reset()
+    saved = await asyncio.gather(
+        *(writer.save(make_record(user.id, at(i), 60 + i)) for i in range(25))
+    )
+    await writer.close()
+    # every save gets the row of its own record
+    assert [record.weight for record in saved] == [60 + i for i in range(25)]
+    assert len({record.id for record in saved}) == 25
+    inserts = [s for s in queries.statements if s.startswith("INSERT")]
+    assert len(inserts) == 3
+    assert writer.stats() == {
+        "saved": 25,
+        "failed": 0,
+        "batches": 3,
+        "max_batch": 10,
+        "queued": 0,
+    }
+    assert await count_records(session_maker) == 25
+
+
+async def test_save_returns_after_commit(user, session_maker, make_record):
+    writer = RecordWriter(
+        session_maker, logging.getLogger(), batch_size=10, delay=DELAY
+    )
+    record = await writer.save(make_record(user.id, at(0), 60))
+    # a single record waits for the delay and is committed when save returns
+    async with session_maker() as session:
+        assert (await session.get(ParamRecord, record.id)).weight == 60
+    await writer.close()
+
+
+async def test_per_row(user, session_maker, queries, make_record):
+    writer = RecordWriter(session_maker, logging.getLogger())
+    queries.reset()
+    record = await writer.save(make_record(user.id, at(0), 60))
+    assert record.id is not None
+    assert len(queries) == 1
+    await writer.close()
+    assert writer.stats()["saved"] == 1
+
+
+async def test_close_drains(user, session_maker, make_record):
+    writer = RecordWriter(session_maker, logging.getLogger(), batch_size=100, delay=5)
+    saves = [
+        asyncio.create_task(writer.save(make_record(user.id, at(i), 60 + i)))
+        for i in range(5)
+    ]
+    await asyncio.sleep(0)
+    # the batch is not full and the delay is long, close writes it right away
+    await asyncio.wait_for(writer.close(), 1)
+    assert all(save.done() for save in saves)
+    assert await count_records(session_maker) == 5
+    with pytest.raises(RecordWriterClosedError):
+        await writer.save(make_record(user.id, at(5), 65))
+
+
+async def test_bad_record_fails_only_its_save(user, session_maker, make_record):
+    writer = RecordWriter(
+        session_maker, logging.getLogger(), batch_size=10, delay=DELAY
+    )
+    # a record of a user that does not exist is rejected, the others of its
+    # batch are saved one by one
+    results = await asyncio.gather(
+        writer.save(make_record(user.id, at(0), 60)),
+        writer.save(make_record(user.id + 1, at(1), 61)),
+        writer.save(make_record(user.id, at(2), 62)),
+        return_exceptions=True,
+    )
+    assert isinstance(results[1], IntegrityError)
+    assert [results[0].weight, results[2].weight] == [60, 62]
+    assert await count_records(session_maker) == 2
+    # the writer goes on with the next batches
+    assert (await writer.save(make_record(user.id, at(3), 63))).weight == 63
+    await writer.close()
+    assert writer.stats()["saved"] == 3
+    assert writer.stats()["failed"] == 1
+
+
+async def test_record_confirmed(
+    user, session_maker, state, make_message, message_loader
+):
+    writer = RecordWriter(session_maker, logging.getLogger(), batch_size=10, delay=0)
+    await state.update_data(
+        user_id=user.id,
+        height=180,
+        timezone=user.timezone,
+        measured_at=START,
+        weight=80,
+        fat_percent=0.2,
+    )
+    await state.set_state(RecordForm.enter_muscle_p)
+    response = await skip_muscle_p(make_message("/skip"), state, writer, message_loader)
+    await writer.close()
+    assert "weight: 80" in response.text
+    assert await state.get_state() is None
+    assert await count_records(session_maker) == 1
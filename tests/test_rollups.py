@@ -0,0 +1,234 @@
+import datetime
+import random
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import text, update
+from sqlmodel import col, delete, select
+
+from src.api.routers.stats import stats
+from src.db.rollups import rebuild_rollups
+from src.models.stats import DailyRollup, ParamRecord, UserSummary
+from src.models.user import User
+from src.services.stats import get_summary, save_record
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def aggregate(records: list[ParamRecord]) -> tuple:
+    ordered = sorted(records, key=lambda r: (r.measured_at, r.id))
+    first, last = ordered[0], ordered[-1]
+    weights = [r.weight for r in records]
+    return (
+        len(records),
+        pytest.approx(sum(weights)),
+        min(weights),
+        max(weights),
+        first.measured_at,
+        first.id,
+        first.weight,
+        last.measured_at,
+        last.id,
+        last.weight,
+    )
+
+
+def rollup_row(rollup: DailyRollup | UserSummary) -> tuple:
+    return (
+        rollup.records,
+        rollup.weight_sum,
+        rollup.weight_min,
+        rollup.weight_max,
+        rollup.first_measured_at,
+        rollup.first_id,
+        rollup.first_weight,
+        rollup.last_measured_at,
+        rollup.last_id,
+        rollup.last_weight,
+    )
+
+
+async def assert_consistent(session_maker) -> None:
+    """compare the rollups with the ones computed from all the records"""
+    async with session_maker() as session:
+        records = (
+            await session.execute(
+                select(ParamRecord).where(col(ParamRecord.deleted_at).is_(None))
+            )
+        ).scalars()
+        days: dict[tuple[int, datetime.date], list[ParamRecord]] = defaultdict(list)
+        users: dict[int, list[ParamRecord]] = defaultdict(list)
+        for record in records:
+            day = record.measured_at.astimezone(datetime.UTC).date()
+            days[(record.user_id, day)].append(record)
+            users[record.user_id].append(record)
+        rollups = (await session.execute(select(DailyRollup))).scalars()
+        summaries = (await session.execute(select(UserSummary))).scalars()
+        assert {(r.user_id, r.day): rollup_row(r) for r in rollups} == {
+            key: aggregate(records) for key, records in days.items()
+        }
+        assert {s.user_id: rollup_row(s) for s in summaries} == {
+            user_id: aggregate(records) for user_id, records in users.items()
+        }
+
+
+@pytest.fixture
+async def users(session_maker, user) -> list[User]:
+    async with session_maker() as session:
+        other = User(telegram_id=2, first_name="Jane", height=170, timezone="UTC")
+        session.add(other)
+        await session.commit()
+    return [user, other]
+
+
+def at(hours: float) -> datetime.datetime:
+    return START + datetime.timedelta(hours=hours)
+
+
+async def test_save_record(users, session_maker, make_record):
+    # out of order, ties of `measured_at` and records of another day
+    for hours, weight in [(5, 80), (1, 81), (5, 79), (30, 82), (1, 78), (0, 83)]:
+        await save_record(session_maker, make_record(users[0].id, at(hours), weight))
+        await assert_consistent(session_maker)
+    async with session_maker() as session:
+        summary = await session.get(UserSummary, users[0].id)
+    assert summary is not None
+    assert (summary.records, summary.first_weight, summary.last_weight) == (6, 83, 82)
+
+
+async def test_batch_and_copy(users, session_maker, engine, make_record):
+    rng = random.Random(1)
+    async with session_maker() as session:
+        session.add_all(
+            make_record(
+                rng.choice(users).id, at(rng.randrange(72)), rng.uniform(60, 90)
+            )
+            for _ in range(200)
+        )
+        await session.commit()
+    await assert_consistent(session_maker)
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+            "paramrecord",
+            records=[
+                (users[1].id, START, START + datetime.timedelta(hours=h), START, w, 180)
+                for h, w in [(3, 70.5), (100, 71.5), (3, 69.5)]
+            ],
+            columns=[
+                "user_id",
+                "created_at",
+                "measured_at",
+                "modified_at",
+                "weight",
+                "height",
+            ],
+        )
+        await conn.commit()
+    await assert_consistent(session_maker)
+
+
+async def test_edits_and_deletes(users, session_maker, make_record):
+    rng = random.Random(2)
+    async with session_maker() as session:
+        session.add_all(
+            make_record(
+                rng.choice(users).id, at(rng.randrange(96)), rng.uniform(60, 90)
+            )
+            for _ in range(100)
+        )
+        await session.commit()
+        ids = list((await session.execute(select(ParamRecord.id))).scalars())
+    changes = [
+        # a new weight
+        lambda i: update(ParamRecord).where(col(ParamRecord.id) == i).values(weight=99),
+        # moved to another day
+        lambda i: (
+            update(ParamRecord)
+            .where(col(ParamRecord.id) == i)
+            .values(measured_at=START + datetime.timedelta(days=10))
+        ),
+        # moved to the other user
+        lambda i: (
+            update(ParamRecord)
+            .where(col(ParamRecord.id) == i)
+            .values(user_id=users[0].id)
+        ),
+        # soft deleted and restored
+        lambda i: (
+            update(ParamRecord).where(col(ParamRecord.id) == i).values(deleted_at=START)
+        ),
+        lambda i: (
+            update(ParamRecord).where(col(ParamRecord.id) == i).values(deleted_at=None)
+        ),
+        lambda i: delete(ParamRecord).where(col(ParamRecord.id) == i),
+    ]
+    for _ in range(60):
+        async with session_maker() as session:
+            await session.execute(rng.choice(changes)(rng.choice(ids)))
+            await session.commit()
+    await assert_consistent(session_maker)
+    # every record of a user deleted at once takes the summary with it
+    async with session_maker() as session:
+        await session.execute(
+            update(ParamRecord)
+            .where(col(ParamRecord.user_id) == users[1].id)
+            .values(deleted_at=START)
+        )
+        await session.commit()
+        assert await session.get(UserSummary, users[1].id) is None
+    await assert_consistent(session_maker)
+
+
+async def test_rebuild(users, session_maker, engine, make_record):
+    async with session_maker() as session:
+        session.add_all(
+            make_record(u.id, at(h), 80 + h) for u in users for h in range(50)
+        )
+        await session.commit()
+    async with engine.begin() as conn:
+        await conn.execute(text("UPDATE dailyrollup SET records = 0"))
+        await conn.execute(text("UPDATE usersummary SET last_weight = 0"))
+        assert await rebuild_rollups(conn, users[0].id) == 1
+    async with session_maker() as session:
+        first = await session.get(UserSummary, users[0].id)
+        second = await session.get(UserSummary, users[1].id)
+        assert first is not None and first.last_weight == 129
+        assert second is not None and second.last_weight == 0
+    async with engine.begin() as conn:
+        assert await rebuild_rollups(conn) == 2
+    await assert_consistent(session_maker)
+
+
+async def test_get_summary(users, session_maker, queries, make_record):
+    async with session_maker() as session:
+        session.add_all(
+            make_record(users[0].id, at(days * 24), weight)
+            for days, weight in [(0, 90), (25, 85), (40, 80), (45, 81), (49, 78)]
+        )
+        await session.commit()
+    today = (START + datetime.timedelta(days=50)).date()
+    queries.reset()
+    summary = await get_summary(session_maker, users[0].id, today=today)
+    assert len(queries) == 1
+    assert summary is not None
+    assert summary.records == 5
+    assert (summary.weight, summary.change) == (78, -12)
+    assert (summary.weight_min, summary.weight_max) == (78, 90)
+    assert summary.averages == {7: pytest.approx(79.5), 30: pytest.approx(81)}
+    far = today + datetime.timedelta(days=100)
+    summary = await get_summary(session_maker, users[0].id, today=far)
+    assert summary is not None and summary.averages == {7: None, 30: None}
+    assert await get_summary(session_maker, users[1].id) is None
+
+
+async def test_stats(users, session_maker, make_message, message_loader, make_record):
+    message = make_message("/stats")
+    response = await stats(message, users[0], session_maker, message_loader)
+    assert "no records yet" in response.text
+    await save_record(session_maker, make_record(users[0].id, at(0), 80))
+    await save_record(session_maker, make_record(users[0].id, at(24), 78.5))
+    response = await stats(message, users[0], session_maker, message_loader)
+    assert "<b>2</b> records" in response.text
+    assert "<b>78.5</b> kg on 02.01.2024 00:00, -1.5 kg" in response.text
+    assert "7-day average no records" in response.text
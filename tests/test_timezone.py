@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from aiogram.types import Location
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.services.timezone import TimezoneResolver
+from src.utils.cache import SingleFlight
+from src.utils.time import TimezoneApiError
+
+
+class StubTimezoneApi:
+    def __init__(self) -> None:
+        self.requests: list[dict[str, str]] = []
+        self.responses: list[web.Response] = []
+        self.delay: float = 0.0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.query))
+        await asyncio.sleep(self.delay)
+        if self.responses:
+            return self.responses.pop(0)
+        return web.json_response({"status": "OK", "timeZoneId": "Europe/Berlin"})
+
+
+@pytest.fixture
+async def stub_api():
+    api = StubTimezoneApi()
+    app = web.Application()
+    app.router.add_get("/timezone/json", api.handle)
+    server = TestServer(app)
+    await server.start_server()
+    yield api, str(server.make_url("/timezone/json"))
+    await server.close()
+
+
+@pytest.fixture
+async def resolver(stub_api):
+    _, url = stub_api
+    resolver = TimezoneResolver(api_key="key", api_url=url, timeout=0.5, retries=2)
+    yield resolver
+    await resolver.close()
+
+
+async def test_resolve(stub_api, resolver):
+    api, _ = stub_api
+    assert await resolver.resolve(Location(latitude=52.52, longitude=13.405)) == (
+        "Europe/Berlin"
+    )
+    assert api.requests[0]["location"] == "52.52,13.4"
+    assert api.requests[0]["key"] == "key"
+
+
+async def test_resolve_cached_by_rounded_coordinates(stub_api, resolver):
+    api, _ = stub_api
+    await resolver.resolve(Location(latitude=52.5201, longitude=13.4049))
+    await resolver.resolve(Location(latitude=52.5203, longitude=13.4001))
+    assert len(api.requests) == 1
+    assert resolver.cache.hits == 1
+
+
+async def test_concurrent_resolves_share_request(stub_api, resolver):
+    api, _ = stub_api
+    api.delay = 0.05
+    results = await asyncio.gather(
+        *(resolver.resolve(Location(latitude=1.0, longitude=2.0)) for _ in range(10))
+    )
+    assert set(results) == {"Europe/Berlin"}
+    assert len(api.requests) == 1
+
+
+async def test_cancelled_call_is_run_by_a_waiter():
+    single_flight: SingleFlight[str, int] = SingleFlight()
+    calls = 0
+
+    async def fn() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    leader = asyncio.create_task(single_flight.do("key", fn))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(single_flight.do("key", fn)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    # the waiters are not cancelled, one of them runs it again for all
+    assert await asyncio.gather(*waiters) == [2, 2, 2]
+    assert leader.cancelled()
+    assert "key" not in single_flight
+
+
+async def test_retries_server_errors(stub_api, resolver):
+    api, _ = stub_api
+    api.responses = [
+        web.Response(status=502),
+        web.json_response({"status": "UNKNOWN_ERROR"}),
+    ]
+    assert await resolver.resolve(Location(latitude=1.0, longitude=2.0)) == (
+        "Europe/Berlin"
+    )
+    assert len(api.requests) == 3
+
+
+async def test_retry_budget_exhausted(stub_api, resolver):
+    api, _ = stub_api
+    api.delay = 0.3
+    resolver.timeout = 0.1
+    with pytest.raises(TimezoneApiError):
+        await resolver.resolve(Location(latitude=1.0, longitude=2.0))
+    assert len(api.requests) == 3
+
+
+async def test_api_error_is_not_retried(stub_api, resolver):
+    api, _ = stub_api
+    api.responses = [web.json_response({"status": "REQUEST_DENIED"})]
+    with pytest.raises(TimezoneApiError) as e:
+        await resolver.resolve(Location(latitude=1.0, longitude=2.0))
+    assert e.value.status_code == "REQUEST_DENIED"
+    assert len(api.requests) == 1
+    assert (1.0, 2.0) not in resolver.cache
@@ -0,0 +1,149 @@
+import datetime
+import math
+
+import numpy as np
+import pytest
+
+from src.api.routers.stats import trend
+from src.models.stats import ParamRecord
+from src.models.user import User
+from src.services.trends import (
+    DAY,
+    WEEK,
+    Series,
+    compute_trend,
+    fetch_series,
+    moving_average,
+    smooth,
+    weekly_rate,
+)
+
+
+def irregular(n: int, seed: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    # a few readings a day, some days skipped and some long breaks
+    gaps = rng.choice([0.0, 3600.0, DAY / 2, DAY, 3 * DAY, 40 * DAY], size=n)
+    t = 1.7e9 + np.cumsum(gaps)
+    return t, 80 + rng.normal(0, 1, n).cumsum() * 0.1
+
+
+def test_moving_average():
+    t, values = irregular(500)
+    expected = [
+        np.mean(values[: i + 1][t[: i + 1] > ti - WEEK]) for i, ti in enumerate(t)
+    ]
+    assert moving_average(t, values, WEEK) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("tau", [10 * DAY, DAY / 24])
+def test_smooth(tau):
+    # the short time constant splits the series into many blocks
+    t, values = irregular(500)
+    expected = [values[0]]
+    for i in range(1, len(t)):
+        alpha = 1 - math.exp(-(t[i] - t[i - 1]) / tau)
+        expected.append(expected[-1] + alpha * (values[i] - expected[-1]))
+    assert smooth(t, values, tau) == pytest.approx(expected)
+
+
+def test_smooth_empty():
+    assert len(smooth(np.array([]), np.array([]), DAY)) == 0
+
+
+def test_weekly_rate():
+    t = np.array([0, 1, 2, 4, 8, 30, 31, 35.5]) * DAY
+    values = 80 - 0.5 * t / WEEK
+    assert weekly_rate(t, values, 4 * WEEK) == pytest.approx(-0.5)
+    assert weekly_rate(t[:1], values[:1], 4 * WEEK) is None
+    assert weekly_rate(np.array([DAY, DAY]), np.array([80.0, 81.0]), WEEK) is None
+    assert weekly_rate(np.array([]), np.array([]), WEEK) is None
+
+
+def test_masses_match_record_properties():
+    records = [
+        ParamRecord(
+            user_id=1, weight=80, height=180, fat_percent=fat, muscle_percent=muscle
+        )
+        for fat, muscle in [(0.2, None), (None, 0.4), (0.0, 0.0), (0.25, 0.35)]
+    ]
+    series = Series(
+        t=np.arange(len(records), dtype=float),
+        weight=np.array([r.weight for r in records], dtype=float),
+        fat_percent=np.array([r.fat_percent for r in records], dtype=float),
+        muscle_percent=np.array([r.muscle_percent for r in records], dtype=float),
+    )
+    for mass, records_mass in (
+        (series.fat_weight, [r.fat_weight for r in records]),
+        (series.muscle_weight, [r.muscle_weight for r in records]),
+    ):
+        assert [None if np.isnan(m) else float(m) for m in mass] == records_mass
+
+
+def test_compute_trend():
+    t = np.array([0, DAY, 2 * DAY, 9 * DAY])
+    series = Series(
+        t=t + 1.7e9,
+        weight=np.array([80.0, 81.0, 79.0, 78.0]),
+        fat_percent=np.array([np.nan, 0.2, np.nan, np.nan]),
+        muscle_percent=np.full(4, np.nan),
+    )
+    result = compute_trend(series)
+    assert result is not None
+    assert result.points == 4
+    assert result.first == datetime.datetime.fromtimestamp(1.7e9, datetime.UTC)
+    assert result.weight.value == 78
+    # the first three records are out of the week before the last one
+    assert result.weight.average == 78
+    assert result.weight.weekly_rate is not None and result.weight.weekly_rate < 0
+    assert result.fat_weight is not None
+    assert result.fat_weight.value == result.fat_weight.smoothed == 81 * 0.2
+    assert result.fat_weight.weekly_rate is None
+    assert result.muscle_weight is None
+    assert compute_trend(Series(*(np.array([]) for _ in range(4)))) is None
+
+
+def history(make_record, user: User) -> list[ParamRecord]:
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    return [
+        make_record(
+            user.id,
+            start + datetime.timedelta(days=i),
+            80 - i / 10,
+            fat_percent=0.2 if i % 2 else None,
+            deleted_at=start if i == 3 else None,
+        )
+        for i in reversed(range(30))
+    ]
+
+
+async def test_fetch_series(user, session_maker, queries, make_record, add_records):
+    await add_records(history(make_record, user))
+    queries.reset()
+    series = await fetch_series(session_maker, user.id)
+    assert len(queries) == 1
+    assert len(series) == 29
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC).timestamp()
+    days = [i for i in range(30) if i != 3]
+    assert list(series.t) == [start + i * DAY for i in days]
+    assert series.weight == pytest.approx([80 - i / 10 for i in days])
+    assert np.isnan(series.fat_percent[0]) and series.fat_percent[1] == 0.2
+    assert np.isnan(series.muscle_percent).all()
+    since = datetime.datetime(2024, 1, 21, tzinfo=datetime.UTC)
+    assert len(await fetch_series(session_maker, user.id, since=since)) == 10
+
+
+async def test_fetch_series_no_records(session_maker):
+    series = await fetch_series(session_maker, 1)
+    assert len(series) == 0
+    assert compute_trend(series) is None
+
+
+async def test_trend(
+    user, session_maker, make_message, message_loader, make_record, add_records
+):
+    await add_records(history(make_record, user))
+    response = await trend(make_message("/trend"), user, session_maker, message_loader)
+    assert "over <b>29</b> records" in response.text
+    assert "-0.70 kg/week" in response.text
+    assert "fat <b>" in response.text
+    assert "muscle" not in response.text
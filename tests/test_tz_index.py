@@ -0,0 +1,109 @@
+import math
+import random
+from array import array
+
+import pytest
+from aiogram.types import Location
+
+from src.services.timezone import TimezoneResolver
+from src.utils.tz_index import (
+    TimezoneIndex,
+    TimezoneIndexError,
+    build_index,
+    nautical_timezone,
+)
+
+
+def circle(x: float, y: float, r: float, n: int) -> list[tuple[float, float]]:
+    points = [
+        (x + r * math.cos(2 * math.pi * i / n), y + r * math.sin(2 * math.pi * i / n))
+        for i in range(n)
+    ]
+    return [*points, points[0]]
+
+
+FEATURES = [
+    # a polygon with a hole and an enclave inside of the hole
+    ("Europe/Berlin", [circle(10, 50, 3, 200), circle(10, 50, 1, 50)]),
+    ("Europe/Prague", [circle(10, 50, 0.9, 60)]),
+    ("Asia/Tokyo", [circle(140, 36, 5, 300)]),
+    ("America/New_York", [[(-80, 30), (-70, 30), (-70, 45), (-80, 45), (-80, 30)]]),
+    ("uninhabited", [[(0, -80), (10, -80), (10, -70), (0, -80)]]),
+]
+
+
+def brute_force(lat: float, lng: float) -> str | None:
+    for zone, rings in FEATURES:
+        if zone == "uninhabited":
+            continue
+        inside = False
+        for ring in rings:
+            points = [tuple(array("f", point)) for point in ring]
+            for (ax, ay), (bx, by) in zip(points, points[1:], strict=False):
+                if (ay > lat) != (by > lat) and ax + (lat - ay) * (bx - ax) / (
+                    by - ay
+                ) > lng:
+                    inside = not inside
+        if inside:
+            return zone
+    return None
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tz") / "tz_index.bin"
+    build_index(FEATURES, path, cell_deg=0.5)
+    with TimezoneIndex(path) as index:
+        yield index
+
+
+@pytest.mark.parametrize(
+    ("lat", "lng", "zone"),
+    [
+        (50, 12, "Europe/Berlin"),
+        (50, 10, "Europe/Prague"),
+        (50, 10.95, None),
+        (36, 140, "Asia/Tokyo"),
+        (40.7, -74, "America/New_York"),
+        (0, 0, None),
+        (-75, 2, None),
+    ],
+)
+def test_lookup(index, lat, lng, zone):
+    assert index.lookup(lat, lng) == zone
+
+
+def test_lookup_matches_brute_force(index):
+    rng = random.Random(42)
+    for zone, rings in FEATURES[:4]:
+        xs = [x for x, _ in rings[0]]
+        ys = [y for _, y in rings[0]]
+        for _ in range(500):
+            lat = rng.uniform(min(ys) - 1, max(ys) + 1)
+            lng = rng.uniform(min(xs) - 1, max(xs) + 1)
+            assert index.lookup(lat, lng) == brute_force(lat, lng), (zone, lat, lng)
+
+
+def test_not_an_index(tmp_path):
+    path = tmp_path / "tz_index.bin"
+    path.write_bytes(b"\0" * 128)
+    with pytest.raises(TimezoneIndexError):
+        TimezoneIndex(path)
+
+
+@pytest.mark.parametrize(
+    ("lng", "zone"),
+    [(0, "Etc/GMT"), (-75, "Etc/GMT+5"), (100, "Etc/GMT-7"), (180, "Etc/GMT-12")],
+)
+def test_nautical_timezone(lng, zone):
+    assert nautical_timezone(lng) == zone
+
+
+async def test_resolver_uses_index_without_network(index):
+    resolver = TimezoneResolver(
+        api_key="", api_url="http://127.0.0.1:1", index=index, api_fallback=False
+    )
+    assert await resolver.resolve(Location(latitude=36, longitude=140)) == (
+        "Asia/Tokyo"
+    )
+    assert await resolver.resolve(Location(latitude=0, longitude=-75)) == "Etc/GMT+5"
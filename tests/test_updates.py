@@ -0,0 +1,101 @@
+import json
+
+import pytest
+from aiogram import Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Message
+from aiogram_timepicker.main import TimePickerBuilder, TimeQuery
+
+from src.config import config
+from src.utils.updates import UpdateDecoder, resolve_callback_prefixes
+
+USER = {"id": 1, "is_bot": False, "first_name": "John"}
+MESSAGE = {
+    "message_id": 1,
+    "from": USER,
+    "chat": {"id": 1, "type": "private"},
+    "date": 0,
+    "text": "80",
+}
+
+
+def callback(data: str | None) -> dict:
+    return {"id": "1", "from": USER, "message": MESSAGE, "chat_instance": "1"} | (
+        {"data": data} if data is not None else {}
+    )
+
+
+def body(update_type: str, event: dict) -> bytes:
+    return json.dumps({"update_id": 1, update_type: event}).encode()
+
+
+@pytest.fixture
+def dispatcher() -> Dispatcher:
+    router = Router()
+    time_picker_builder = TimePickerBuilder(name="stats")
+
+    @router.message(F.text)
+    async def text(message: Message) -> None: ...
+
+    @router.callback_query(time_picker_builder.filter())
+    async def time(query: CallbackQuery) -> None: ...
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+@pytest.fixture
+def decoder(dispatcher: Dispatcher) -> UpdateDecoder:
+    return UpdateDecoder(dispatcher)
+
+
+def test_handled_update(decoder):
+    update = decoder.decode(body("message", MESSAGE))
+    assert update is not None and update.message is not None
+    assert update.message.text == "80"
+
+
+def test_unhandled_type_is_not_decoded(decoder):
+    # the event is not even valid, it is skipped before validation
+    assert decoder.decode(body("edited_message", {})) is None
+    assert decoder.decode(body("my_chat_member", {})) is None
+    assert decoder.skipped == {"edited_message": 1, "my_chat_member": 1}
+
+
+def test_callback_prefixes(decoder):
+    data = TimeQuery(name="stats", hour=8, minute=30).pack()
+    update = decoder.decode(body("callback_query", callback(data)))
+    assert update is not None and update.callback_query is not None
+    assert decoder.decode(body("callback_query", callback("old:1"))) is None
+    assert decoder.decode(body("callback_query", callback(None))) is None
+    assert decoder.skipped == {"callback_query": 2}
+
+
+def test_unusual_key_order(decoder):
+    raw = json.dumps({"message": MESSAGE, "update_id": 1}).encode()
+    assert decoder.decode(raw) is not None
+    raw = json.dumps({"edited_message": MESSAGE, "update_id": 1}).encode()
+    assert decoder.decode(raw) is None
+    raw = json.dumps({"callback_query": callback("old:1"), "update_id": 1}).encode()
+    assert decoder.decode(raw) is None
+
+
+def test_catch_all_callback_handler(dispatcher):
+    router = Router()
+
+    @router.callback_query()
+    async def any_callback(query: CallbackQuery) -> None: ...
+
+    dispatcher.include_router(router)
+    assert resolve_callback_prefixes(dispatcher) is None
+    decoder = UpdateDecoder(dispatcher)
+    assert decoder.decode(body("callback_query", callback("old:1"))) is not None
+
+
+def test_webhook_decoder(monkeypatch):
+    pytest.importorskip("fastapi")
+    monkeypatch.setattr(config, "bot_api_key", "42:TEST")
+    from src.webhook import update_decoder
+
+    assert update_decoder.update_types == {"callback_query", "message"}
+    assert update_decoder.callback_prefixes == ("time:",)
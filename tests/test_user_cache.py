@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import Message, Update
+from aiogram.types import User as TelegramUser
+
+from src.middleware.user import RegisteredUserMiddleware, UserMiddleware
+from src.models.user import User, UserNotRegisteredError
+from src.services.user import UserCache, create_user
+
+JOHN = TelegramUser(id=1, is_bot=False, first_name="John")
+
+
+async def register(session_maker, telegram_user: TelegramUser = JOHN) -> User:
+    return await create_user(
+        telegram_user, session_maker, logging.getLogger(), 180, "Europe/Berlin"
+    )
+
+
+async def test_hits_and_misses(session_maker, user_cache, queries):
+    await register(session_maker)
+    queries.reset()
+    for _ in range(5):
+        user = await user_cache.get(JOHN)
+        assert user is not None and user.telegram_id == JOHN.id
+    assert len(queries) == 1
+    assert user_cache.stats() == {"size": 1, "hits": 4, "misses": 1, "loads": 1}
+
+
+async def test_concurrent_lookups_share_one_query(session_maker, user_cache, queries):
+    await register(session_maker)
+    queries.reset()
+    users = await asyncio.gather(*(user_cache.get(JOHN) for _ in range(20)))
+    assert len({id(user) for user in users}) == 1
+    assert len(queries) == 1
+    assert user_cache.loads == 1
+
+
+async def test_unregistered_user_is_cached_until_created(
+    session_maker, user_cache, queries
+):
+    assert await user_cache.get(JOHN) is None
+    assert await user_cache.get(JOHN) is None
+    assert len(queries) == 1
+    user_cache.set(await register(session_maker))
+    queries.reset()
+    user = await user_cache.get(JOHN)
+    assert user is not None and user.telegram_id == JOHN.id
+    assert len(queries) == 0
+
+
+async def test_negative_entries_expire(session_maker):
+    user_cache = UserCache(session_maker, negative_ttl=0)
+    assert await user_cache.get(JOHN) is None
+    await register(session_maker)
+    assert await user_cache.get(JOHN) is not None
+
+
+async def test_invalidate(session_maker, user_cache, queries):
+    await register(session_maker)
+    await user_cache.get(JOHN)
+    user_cache.invalidate(JOHN.id)
+    await user_cache.get(JOHN)
+    assert user_cache.loads == 2
+
+
+async def test_invalidate_during_load_discards_stale_result(session_maker, user_cache):
+    lookup = asyncio.create_task(user_cache.get(JOHN))
+    await asyncio.sleep(0)
+    user_cache.invalidate(JOHN.id)
+    assert await lookup is None
+    assert JOHN.id not in user_cache.cache
+
+
+@pytest.fixture
+def dispatcher(user_cache) -> Dispatcher:
+    router = Router()
+    router.message.middleware(RegisteredUserMiddleware())
+
+    @router.message(Command("me"))
+    async def me(message: Message, user: User) -> str:
+        return user.first_name
+
+    dp = Dispatcher(user_cache=user_cache)
+    dp.message.outer_middleware(UserMiddleware())
+    dp.include_router(router)
+    return dp
+
+
+def update(text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": JOHN.id, "type": "private"},
+                "from": JOHN.model_dump(),
+                "text": text,
+            },
+        }
+    )
+
+
+async def test_middleware_injects_user(session_maker, dispatcher, queries):
+    await register(session_maker)
+    bot = Bot("42:TEST")
+    queries.reset()
+    assert await dispatcher.feed_update(bot, update("/me")) == "John"
+    assert await dispatcher.feed_update(bot, update("/me")) == "John"
+    assert len(queries) == 1
+
+
+async def test_middleware_requires_registered_user(dispatcher):
+    with pytest.raises(UserNotRegisteredError):
+        await dispatcher.feed_update(Bot("42:TEST"), update("/me"))
@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import logging
+
+import pytest
+from aiogram.types import User as TelegramUser
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlmodel import select
+
+from src.api.routers.start import start
+from src.api.routers.stats import add_record
+from src.models.stats import ParamRecord
+from src.models.user import User, UserAlreadyExistsError
+from src.services.stats import get_records, save_record
+from src.services.user import create_user
+
+HISTORY = 1000
+
+
+class LoadedRows:
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {"User": 0, "ParamRecord": 0}
+        event.listen(User, "load", self._on_load)
+        event.listen(ParamRecord, "load", self._on_load)
+
+    def _on_load(self, target, context) -> None:
+        self.counts[type(target).__name__] += 1
+
+    def remove(self) -> None:
+        event.remove(User, "load", self._on_load)
+        event.remove(ParamRecord, "load", self._on_load)
+
+
+@pytest.fixture
+def loaded_rows():
+    rows = LoadedRows()
+    yield rows.counts
+    rows.remove()
+
+
+def history(make_record, user: User) -> list[ParamRecord]:
+    """a record a day, every hundredth of them deleted"""
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+    return [
+        make_record(
+            user.id,
+            start + datetime.timedelta(days=i),
+            80 + i % 10,
+            deleted_at=start if i % 100 == 0 else None,
+        )
+        for i in range(HISTORY)
+    ]
+
+
+async def test_start_registered_user(
+    user,
+    user_cache,
+    state,
+    make_message,
+    message_loader,
+    queries,
+    loaded_rows,
+    make_record,
+    add_records,
+):
+    await add_records(history(make_record, user))
+    message = make_message("/start")
+    queries.reset()
+    for _ in range(3):
+        cached_user = await user_cache.get(message.from_user)
+        response = await start(message, cached_user, state, message_loader)
+        assert response.text == message_loader.render_msg("hello_user", name="John")
+    assert len(queries) == 1
+    assert loaded_rows == {"User": 1, "ParamRecord": 0}
+
+
+async def test_add_record(
+    user,
+    user_cache,
+    state,
+    make_message,
+    message_loader,
+    queries,
+    loaded_rows,
+    make_record,
+    add_records,
+):
+    await add_records(history(make_record, user))
+    message = make_message("/add_record")
+    queries.reset()
+    for _ in range(3):
+        cached_user = await user_cache.get(message.from_user)
+        await add_record(message, state, cached_user, message_loader)
+    assert len(queries) == 1
+    assert loaded_rows == {"User": 1, "ParamRecord": 0}
+    assert (await state.get_data())["user_id"] == user.id
+
+
+async def test_records_are_not_loaded_implicitly(user, session_maker):
+    async with session_maker() as session:
+        db_user = await session.get(User, user.id)
+        with pytest.raises(InvalidRequestError):
+            db_user.records  # noqa: B018
+
+
+async def test_get_records_pages(
+    user, session_maker, queries, loaded_rows, make_record, add_records
+):
+    await add_records(history(make_record, user))
+    queries.reset()
+    pages: list[list[ParamRecord]] = []
+    after = None
+    while page := await get_records(session_maker, user.id, limit=64, after=after):
+        pages.append(page)
+        after = page[-1]
+    records = [record for page in pages for record in page]
+    assert len(queries) == len(pages) + 1
+    assert max(len(page) for page in pages) == 64
+    assert loaded_rows["ParamRecord"] == len(records) == HISTORY - HISTORY // 100
+    assert all(record.deleted_at is None for record in records)
+    assert records == sorted(records, key=lambda r: r.measured_at, reverse=True)
+
+
+async def test_get_records_window(user, session_maker, make_record, add_records):
+    await add_records(history(make_record, user))
+    since = datetime.datetime(2021, 1, 1, tzinfo=datetime.UTC)
+    until = since + datetime.timedelta(days=30)
+    records = await get_records(
+        session_maker, user.id, limit=100, since=since, until=until
+    )
+    assert len(records) == 30
+    assert all(since <= record.measured_at < until for record in records)
+
+
+async def register(session_maker, telegram_id: int = 2) -> User:
+    return await create_user(
+        TelegramUser(id=telegram_id, is_bot=False, first_name="Jane"),
+        session_maker,
+        logging.getLogger(),
+        170,
+        "Europe/Berlin",
+    )
+
+
+async def test_create_user_is_one_statement(session_maker, queries):
+    queries.reset()
+    user = await register(session_maker)
+    assert user.id is not None and user.created_at is not None
+    assert len(queries) == 1
+    queries.reset()
+    with pytest.raises(UserAlreadyExistsError) as e:
+        await register(session_maker)
+    assert len(queries) == 1
+    assert e.value.user is not None and e.value.user.id == user.id
+
+
+async def test_concurrent_registrations(session_maker):
+    results = await asyncio.gather(
+        *(register(session_maker) for _ in range(50)), return_exceptions=True
+    )
+    created = [r for r in results if isinstance(r, User)]
+    assert len(created) == 1
+    conflicts = [r for r in results if isinstance(r, UserAlreadyExistsError)]
+    assert len(conflicts) == 49
+    assert {conflict.user.id for conflict in conflicts} == {created[0].id}
+    async with session_maker() as session:
+        res = await session.execute(select(User).where(User.telegram_id == 2))
+        assert len(res.all()) == 1
+
+
+async def test_inactive_user_is_registered_again(session_maker):
+    user = await register(session_maker)
+    async with session_maker() as session:
+        db_user = await session.get(User, user.id)
+        db_user.is_active = False
+        await session.commit()
+    assert (await register(session_maker)).id != user.id
+
+
+async def test_save_record_is_one_statement(user, session_maker, queries, make_record):
+    measured_at = datetime.datetime(2025, 1, 1, 8, 30, tzinfo=datetime.UTC)
+    queries.reset()
+    record = await save_record(
+        session_maker, make_record(user.id, measured_at, 80.5, fat_percent=0.2)
+    )
+    assert len(queries) == 1
+    assert queries.statements[0].startswith("INSERT INTO paramrecord")
+    assert record.id is not None
+    assert (record.measured_at, record.weight, record.fat_percent) == (
+        measured_at,
+        80.5,
+        0.2,
+    )
+    async with session_maker() as session:
+        assert (await session.get(ParamRecord, record.id)).weight == 80.5
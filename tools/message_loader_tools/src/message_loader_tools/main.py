@@ -1,10 +1,8 @@
 from pathlib import Path
 from typing import Annotated
 
-import jinja2
 import rich
 import typer
-from jinja2 import meta
 from message_loader import (
     MessageLoader,
     MessagesFileExtensionError,
@@ -35,8 +33,7 @@ def get_vars(
         rich.print(f"[red]ERROR[/red]: there is no message with id {msg_id}")
         return typer.Exit()
 
-    env = jinja2.Environment()
-    variables = meta.find_undeclared_variables(env.parse(messages[msg_id]))
+    variables = message_loader.get_vars(msg_id)
     rich.print("Variables:")
     for var in variables:
         rich.print(f"- [blue bold]{var}[/blue bold]")